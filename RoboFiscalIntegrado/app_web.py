@@ -1,6 +1,7 @@
 #--------------------------------------------------------------------------
-# app_web.py - v1.9 FINAL ESTÁVEL COM TODAS AS ROTAS
+# app_web.py - v2.1 INTERVALO DE COMPETÊNCIAS NA BAIXA DE LIVROS
 #--------------------------------------------------------------------------
+import os
 import threading
 import sys
 from datetime import datetime
@@ -13,7 +14,7 @@ import io
 import gestor_db as db
 import gestor_config as config
 import robo_core
-from modulos import logger
+from modulos import logger, pool_navegadores, competencias
 import municipios
 
 app = Flask(__name__)
@@ -79,7 +80,8 @@ def executar_rotina_completa():
     if not ids_selecionados:
         return jsonify({"status": "error", "message": "Nenhum cliente selecionado."}), 400
 
-    competencia = request.form.get('competencia')
+    # Competência final opcional: a baixa percorre o intervalo com uma seleção de empresa por cliente
+    competencia = competencias.de_formulario(request.form.get('competencia'), request.form.get('competencia_fim'))
     data_inicio = request.form.get('data_inicio')
     data_fim = request.form.get('data_fim')
     headful_mode = request.form.get('headful_mode') == 'true'
@@ -99,7 +101,8 @@ def executar_baixa_livros():
     if not ids_selecionados:
         return jsonify({"status": "error", "message": "Nenhum cliente selecionado."}), 400
 
-    competencia = request.form.get('competencia')
+    # Competência final opcional: a baixa percorre o intervalo com uma seleção de empresa por cliente
+    competencia = competencias.de_formulario(request.form.get('competencia'), request.form.get('competencia_fim'))
     headful_mode = request.form.get('headful_mode') == 'true'
     configuracoes = config.load()
     clientes_para_rodar = [dict(c) for c in db.get_all_clients() if c['id'] in ids_selecionados]
@@ -215,7 +218,9 @@ def _processar_importacao_csv(rows, update_existing):
 def configuracoes():
     if request.method == 'POST':
         try:
-            novas_configs = request.form.to_dict()
+            # Mescla com o que já existe para não perder chaves que não estão no formulário
+            novas_configs = config.load()
+            novas_configs.update(request.form.to_dict())
             config.save(novas_configs)
             flash("Configurações salvas com sucesso!", "success")
         except Exception as e:
@@ -227,4 +232,7 @@ def configuracoes():
 
 # --- Ponto de Entrada da Aplicação ---
 if __name__ == '__main__':
+    # Com o reloader do modo debug, só o processo filho (o que atende as requisições) aquece os navegadores
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        pool_navegadores.iniciar(config.load())
     app.run(host='127.0.0.1', port=5000, debug=True)
\ No newline at end of file
@@ -16,9 +16,85 @@ DEFAULTS = {
     "pfx_padrao_pwd": "",
     "crc": "",
     "crc_senha": "",
+    # Login do escritório no portal de São José dos Campos (usado quando o cliente não traz o seu)
+    "sjc_usuario": "",
+    "sjc_senha": "",
     # Pasta de saída padrão para todos os ficheiros gerados pelo robô
     # Por padrão aponta para uma pasta 'downloads' no diretório atual de trabalho
-    "pasta_saida_padrao": os.path.join(os.getcwd(), "downloads")
+    "pasta_saida_padrao": os.path.join(os.getcwd(), "downloads"),
+    # Captura de NFS-e: quantos clientes processar ao mesmo tempo e
+    # quantas requisições simultâneas permitir por host do portal
+    "captura_max_clientes": 4,
+    "captura_max_por_host": 8,
+    # Pipeline de cada captura: workers de gravação de XML e de download de PDF
+    # e tamanho máximo das filas entre os estágios
+    "captura_workers_xml": 1,
+    "captura_workers_pdf": 4,
+    "captura_fila_max": 100,
+    # Downloads de PDF simultâneos no processo inteiro e tentativas por PDF
+    "pdf_max_concorrencia": 8,
+    "pdf_tentativas": 3,
+    # Períodos longos: tamanho inicial da janela, notas desejadas por janela e janelas em paralelo
+    "captura_janela_dias": 31,
+    "captura_notas_por_janela": 500,
+    "captura_janelas_paralelas": 3,
+    # Governador de tráfego por host: taxa inicial/mínima/máxima (req/s) e latência
+    # abaixo da qual o portal nunca é considerado congestionado
+    "governador_taxa_inicial": 1.0,
+    "governador_taxa_min": 0.2,
+    "governador_taxa_max": 10.0,
+    "governador_latencia_alvo_s": 3.0,
+    # Páginas SOAP lentas além do p95 recebem uma requisição duplicada, limitada a
+    # esta fração das requisições originais
+    "soap_hedge": True,
+    "soap_hedge_orcamento": 0.05,
+    # Baixa de livros de Taubaté: navegadores logados em paralelo (cada um faz o próprio login)
+    "livros_contextos": 1,
+    # Depois do login, percorre empresa/movimento/competência/encerramento por HTTP direto,
+    # sem renderizar páginas (volta ao navegador se a página vier com outra estrutura)
+    "livros_modo_http": True,
+    # Captura de São José dos Campos: contextos em paralelo, cada um com login,
+    # perfil e pasta de downloads próprios
+    "sjc_contextos": 1,
+    # Índice CNPJ -> linha do grid de empresas de SJC: lido uma vez e reaproveitado por N minutos
+    "sjc_indice_empresas": True,
+    "sjc_indice_empresas_ttl_min": 720,
+    # XML de SJC exportado por postback JSF direto com os cookies do navegador
+    # (volta ao navegador se a página vier com outra estrutura)
+    "sjc_xml_http": True,
+    # Rotinas com clientes de vários municípios: cada modelo (Taubaté, SJC, ...) roda
+    # no seu próprio executor ao mesmo tempo, em vez de um grupo depois do outro
+    "despacho_municipios_paralelo": True,
+    # Pool de Chromium aquecidos compartilhado pelas tarefas do app web / interface:
+    # quantos navegadores, vida máxima de cada um e reciclagem após N clientes
+    "pool_navegadores": True,
+    "pool_navegadores_tamanho": 2,
+    "pool_navegadores_vida_max_min": 60,
+    "pool_navegadores_reciclar_clientes": 50,
+    # Perfil enxuto: Chromium sobe num perfil temporário semeado só com cookies e localStorage
+    # (snapshot válido por N dias); caches dos perfis persistentes podados a cada N horas
+    "perfil_enxuto": True,
+    "perfil_enxuto_ttl_dias": 30,
+    "perfil_podar_cache_horas": 24,
+    # Bloqueio de recursos pesados nos navegadores: tipos bloqueados e trechos de URL sempre
+    # liberados, por portal (o captcha de Taubaté vem de imagem.php), e hosts de analytics
+    "bloqueio_recursos": True,
+    "bloqueio_tipos_taubate": "image,font,stylesheet,media",
+    "bloqueio_permitir_taubate": "imagem.php",
+    "bloqueio_tipos_sjc": "image,font,media",
+    "bloqueio_permitir_sjc": "",
+    "bloqueio_hosts": "google-analytics.com,googletagmanager.com,doubleclick.net,hotjar.com,facebook.net",
+    # Captcha do portal do contador: abaixo desta confiança o classificador cede ao Tesseract
+    "captcha_confianca_minima": 0.25,
+    # Certificados A1 decifrados e sessões TLS em cache: máximo de entradas e minutos ociosos até fechar
+    "cert_cache_max": 16,
+    "cert_cache_ttl_min": 30,
+    # Sessões dos portais (contador de Taubaté, SJC) guardadas cifradas e reaproveitadas
+    # entre execuções enquanto o portal as aceitar, por no máximo este tempo
+    "sessoes_reutilizar": True,
+    "sessoes_ttl_min": 240,
+    # Captura incremental: pula notas já gravadas e períodos já capturados por completo
+    "captura_incremental": True
 }
 
 def load() -> dict:
@@ -44,4 +120,34 @@ def save(settings: dict) -> None:
         with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
             json.dump(settings, f, ensure_ascii=False, indent=2)
     except IOError as e:
-        print(f"Erro ao guardar as configurações: {e}")
\ No newline at end of file
+        print(f"Erro ao guardar as configurações: {e}")
+
+def get_int(settings: dict, key: str) -> int:
+    """Lê uma configuração inteira (o formulário web grava tudo como texto)."""
+    try:
+        return int(str(settings.get(key, DEFAULTS.get(key))).strip())
+    except (TypeError, ValueError):
+        return int(DEFAULTS.get(key) or 0)
+
+def get_float(settings: dict, key: str) -> float:
+    """Lê uma configuração decimal (aceita vírgula como separador)."""
+    try:
+        return float(str(settings.get(key, DEFAULTS.get(key))).strip().replace(',', '.'))
+    except (TypeError, ValueError):
+        return float(DEFAULTS.get(key) or 0)
+
+def get_bool(settings: dict, key: str) -> bool:
+    """Lê uma configuração booleana aceitando 'true', '1', 'sim', 'on'."""
+    value = settings.get(key, DEFAULTS.get(key))
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "sim", "on", "yes")
+
+def get_lista(settings: dict, key: str) -> list:
+    """Lê uma lista gravada como texto separado por vírgulas (ou já como lista no JSON)."""
+    value = settings.get(key, DEFAULTS.get(key))
+    if isinstance(value, (list, tuple)):
+        itens = value
+    else:
+        itens = str(value or "").split(",")
+    return [str(i).strip() for i in itens if str(i).strip()]
@@ -1,5 +1,5 @@
 #--------------------------------------------------------------------------
-# interface_principal.py - v2.3 (Refatorado para usar robo_core)
+# interface_principal.py - v2.6 (Login do portal de São José dos Campos nas configurações)
 #--------------------------------------------------------------------------
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
@@ -14,7 +14,7 @@ import re
 
 # Módulos do projeto
 import robo_core # <- NOSSA GRANDE MUDANÇA!
-from modulos import logger
+from modulos import logger, pool_navegadores
 from modulos.logger import log_queue
 import gestor_db as db
 import gestor_config as config
@@ -114,7 +114,7 @@ class App:
     def setup_baixa_livros_tab(self):
         baixa_frame = ttk.Frame(self.tab_baixa_livros)
         baixa_frame.pack(pady=20, padx=10, fill="x")
-        ttk.Label(baixa_frame, text="Competência (AAAA-MM):").pack(pady=(10, 0))
+        ttk.Label(baixa_frame, text="Competência (AAAA-MM, ou intervalo AAAA-MM..AAAA-MM):").pack(pady=(10, 0))
         self.competencia_var = tk.StringVar(value=datetime.now().strftime("%Y-%m"))
         ttk.Entry(baixa_frame, textvariable=self.competencia_var).pack(pady=5)
         
@@ -138,11 +138,13 @@ class App:
         self.config_vars = {
             "pfx_padrao_path": tk.StringVar(), "pfx_padrao_pwd": tk.StringVar(),
             "crc": tk.StringVar(), "crc_senha": tk.StringVar(),
+            "sjc_usuario": tk.StringVar(), "sjc_senha": tk.StringVar(),
             "pasta_saida_padrao": tk.StringVar()
         }
         labels = {
             "pfx_padrao_path": "Certificado Padrão (.pfx)", "pfx_padrao_pwd": "Senha do Certificado",
             "crc": "Login CRC", "crc_senha": "Senha CRC",
+            "sjc_usuario": "Login Portal SJC", "sjc_senha": "Senha Portal SJC",
             "pasta_saida_padrao": "Pasta de Saída Padrão"
         }
         for i, (key, label_text) in enumerate(labels.items()):
@@ -526,6 +528,7 @@ if __name__ == "__main__":
         db.initialize_db()
         
         logger.log_info("Aplicação iniciada.")
+        pool_navegadores.iniciar(config.load())
         root = tk.Tk()
         app = App(root)
         root.mainloop()
@@ -0,0 +1,66 @@
+#--------------------------------------------------------------------------
+# modulos/bloqueio_recursos.py - v1.0 BLOQUEIO DE RECURSOS PESADOS NO NAVEGADOR
+# Intercepta as requisições de um contexto do Playwright e aborta os tipos
+# que a automação não usa (imagens, fontes, CSS, mídia) e os hosts de
+# analytics, com regras por portal vindas da configuração. Trechos de URL da
+# lista de permissão (ex.: imagem.php do captcha) passam sempre.
+#--------------------------------------------------------------------------
+import threading
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+import gestor_config
+from modulos.logger import log_info
+
+# Tamanho típico por tipo, usado só para estimar os bytes economizados (o corpo bloqueado nunca é baixado)
+TAMANHO_ESTIMADO = {"image": 25_000, "font": 40_000, "stylesheet": 30_000, "media": 300_000, "script": 60_000}
+
+_lock = threading.Lock()
+_contadores: Dict[str, Dict[str, int]] = {}
+
+def _contar(portal: str, tipo: str) -> None:
+    with _lock:
+        c = _contadores.setdefault(portal, {"requisicoes": 0, "bytes_estimados": 0})
+        c["requisicoes"] += 1
+        c["bytes_estimados"] += TAMANHO_ESTIMADO.get(tipo, 10_000)
+        c[tipo] = c.get(tipo, 0) + 1
+
+def _host_bloqueado(url: str, hosts: List[str]) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    return any(host == h or host.endswith("." + h) for h in hosts)
+
+def aplicar(contexto, portal: str, config_geral: Dict) -> bool:
+    """Instala a interceptação em `contexto` (vale para todas as páginas dele)."""
+    if not gestor_config.get_bool(config_geral, 'bloqueio_recursos'):
+        return False
+    tipos = set(gestor_config.get_lista(config_geral, f'bloqueio_tipos_{portal}'))
+    permitidos = gestor_config.get_lista(config_geral, f'bloqueio_permitir_{portal}')
+    hosts = [h.lower() for h in gestor_config.get_lista(config_geral, 'bloqueio_hosts')]
+    if not tipos and not hosts:
+        return False
+
+    def _rota(route):
+        requisicao = route.request
+        url = requisicao.url
+        if any(trecho in url for trecho in permitidos):
+            route.continue_()
+            return
+        tipo = requisicao.resource_type
+        if tipo in tipos or _host_bloqueado(url, hosts):
+            _contar(portal, tipo)
+            route.abort("blockedbyclient")
+            return
+        route.continue_()
+
+    contexto.route("**/*", _rota)
+    log_info(f"Bloqueio de recursos ativo para {portal}: tipos {sorted(tipos)}, liberados {permitidos or '-'}.")
+    return True
+
+def estatisticas() -> Dict[str, Dict[str, int]]:
+    with _lock:
+        return {portal: dict(c) for portal, c in _contadores.items()}
+
+def registrar_resumo(portal: str) -> None:
+    c = estatisticas().get(portal)
+    if c:
+        log_info(f"Recursos bloqueados em {portal}: {c['requisicoes']} requisições, ~{c['bytes_estimados'] / 1e6:.1f} MB economizados.")
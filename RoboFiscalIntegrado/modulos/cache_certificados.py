@@ -0,0 +1,136 @@
+#--------------------------------------------------------------------------
+# modulos/cache_certificados.py - v1.1 CACHE DE CERTIFICADOS E SESSÕES
+# O PFX é decifrado uma única vez por processo e a sessão de requests
+# (com o pool de conexões TLS já abertas) é reaproveitada por todos os
+# clientes que usam o mesmo certificado e senha. Sessão reservada por uma
+# captura em andamento não é fechada por inatividade nem pelo limite.
+#--------------------------------------------------------------------------
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import requests
+from modulos.logger import log_info
+
+try:
+    from requests_pkcs12 import Pkcs12Adapter
+except ImportError:
+    Pkcs12Adapter = None
+
+MAX_ENTRADAS   = 16
+TTL_OCIOSO_S   = 30 * 60
+POOL_CONEXOES  = 10
+
+class _Entrada:
+    def __init__(self, sessao: requests.Session):
+        self.sessao = sessao
+        self.ultimo_uso = time.monotonic()
+        self.em_uso = 0     # reservas abertas (reservar_sessao sem liberar_sessao)
+
+_lock = threading.Lock()
+_entradas: "OrderedDict[Tuple[str, str], _Entrada]" = OrderedDict()
+# (caminho, mtime, tamanho) -> (impressão digital, bytes do PFX)
+_arquivos: dict = {}
+
+def _ler_pfx(pfx_path: str) -> Tuple[str, bytes]:
+    st = os.stat(pfx_path)
+    chave_arquivo = (os.path.abspath(pfx_path), st.st_mtime, st.st_size)
+    cache = _arquivos.get(chave_arquivo)
+    if cache is None:
+        with open(pfx_path, 'rb') as f:
+            dados = f.read()
+        cache = (hashlib.sha256(dados).hexdigest(), dados)
+        _arquivos[chave_arquivo] = cache
+    return cache
+
+def _hash_senha(pfx_pwd) -> str:
+    if isinstance(pfx_pwd, str):
+        pfx_pwd = pfx_pwd.encode('utf-8')
+    return hashlib.sha256(pfx_pwd or b"").hexdigest()
+
+def _despejar_ociosos(agora: float, ttl_s: float):
+    for chave in [k for k, e in _entradas.items() if not e.em_uso and agora - e.ultimo_uso > ttl_s]:
+        _entradas.pop(chave).sessao.close()
+        log_info(f"Sessão de certificado {chave[0][:12]}... removida do cache por inatividade.")
+
+def _despejar_excedentes(max_entradas: int, manter):
+    # Mais antigas primeiro, pulando as reservadas; se todas estão em uso, o cache passa do limite
+    livres = [k for k, e in _entradas.items() if not e.em_uso and k != manter]
+    for chave in livres[:max(0, len(_entradas) - max(1, max_entradas))]:
+        _entradas.pop(chave).sessao.close()
+
+def obter_sessao(pfx_path: Optional[str], pfx_pwd=None, pool_maxsize: int = POOL_CONEXOES, max_entradas: int = MAX_ENTRADAS,
+                 ttl_ocioso_s: float = TTL_OCIOSO_S) -> requests.Session:
+    """Devolve a sessão compartilhada para o certificado (ou uma sessão sem certificado).
+
+    A chave é a impressão digital SHA-256 do arquivo PFX mais o hash da senha, então
+    clientes diferentes apontando para o mesmo certificado reaproveitam a mesma
+    sessão, o mesmo SSLContext e as conexões keep-alive do pool. Quem vai usar a
+    sessão por mais tempo que `ttl_ocioso_s` deve usar reservar_sessao().
+    """
+    return _obter(pfx_path, pfx_pwd, pool_maxsize, max_entradas, ttl_ocioso_s, reservar=False)
+
+def reservar_sessao(pfx_path: Optional[str], pfx_pwd=None, pool_maxsize: int = POOL_CONEXOES, max_entradas: int = MAX_ENTRADAS,
+                    ttl_ocioso_s: float = TTL_OCIOSO_S) -> requests.Session:
+    """Como obter_sessao(), mas a sessão fica protegida do despejo até liberar_sessao()."""
+    return _obter(pfx_path, pfx_pwd, pool_maxsize, max_entradas, ttl_ocioso_s, reservar=True)
+
+def liberar_sessao(sessao: requests.Session) -> None:
+    """Encerra uma reserva; a inatividade da sessão passa a contar a partir daqui."""
+    with _lock:
+        for entrada in _entradas.values():
+            if entrada.sessao is sessao and entrada.em_uso:
+                entrada.em_uso -= 1
+                entrada.ultimo_uso = time.monotonic()
+                return
+
+def _obter(pfx_path: Optional[str], pfx_pwd, pool_maxsize: int, max_entradas: int, ttl_ocioso_s: float,
+           reservar: bool) -> requests.Session:
+    if pfx_path and pfx_pwd and Pkcs12Adapter is None:
+        raise ImportError("A biblioteca 'requests-pkcs12' é necessária.")
+
+    with _lock:
+        agora = time.monotonic()
+        _despejar_ociosos(agora, ttl_ocioso_s)
+
+        if pfx_path and pfx_pwd:
+            impressao, dados = _ler_pfx(pfx_path)
+            chave = (impressao, _hash_senha(pfx_pwd))
+        else:
+            impressao, dados, chave = None, None, ("sem-certificado", "")
+
+        entrada = _entradas.get(chave)
+        if entrada is None:
+            sessao = requests.Session()
+            if dados is not None:
+                adaptador = Pkcs12Adapter(pkcs12_data=dados, pkcs12_password=pfx_pwd,
+                                          pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+                log_info(f"Certificado {impressao[:12]}... carregado e adicionado ao cache.")
+            else:
+                adaptador = requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+            sessao.mount('https://', adaptador)
+            entrada = _Entrada(sessao)
+            _entradas[chave] = entrada
+
+        entrada.ultimo_uso = agora
+        if reservar:
+            entrada.em_uso += 1
+        _entradas.move_to_end(chave)
+        _despejar_excedentes(max_entradas, chave)
+        return entrada.sessao
+
+def obter_ssl_context(pfx_path: str, pfx_pwd):
+    """SSLContext já decifrado do certificado (útil para clientes que não usam requests)."""
+    sessao = obter_sessao(pfx_path, pfx_pwd)
+    return getattr(sessao.get_adapter('https://'), 'ssl_context', None)
+
+def limpar() -> None:
+    """Fecha e descarta todas as sessões em cache."""
+    with _lock:
+        while _entradas:
+            _, entrada = _entradas.popitem()
+            entrada.sessao.close()
+        _arquivos.clear()
@@ -1,13 +1,13 @@
 #--------------------------------------------------------------------------
-# modulos/captador_SJC.py - v5.7 (Retentativas e Pausas Aprimoradas)
+# modulos/captador_SJC.py - v5.8 (Pausas de Acomodação da Página + Governador)
 #--------------------------------------------------------------------------
 import os
 import re
 import sys
 import time
+import random
 from pathlib import Path
 from typing import List, Dict, Optional
-import random
 
 # --- Bloco para correção de importação em modo de teste ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -17,6 +17,7 @@ if PROJECT_DIR not in sys.path:
 # --- Fim da correção ---
 
 from modulos.logger import log_info, log_error
+from modulos import controle_hosts
 
 try:
     from playwright.sync_api import sync_playwright, Page, TimeoutError as PWTimeoutError
@@ -30,6 +31,17 @@ URL_LIVROS_FISCAIS = "https://notajoseense.sjc.sp.gov.br/notafiscal/paginas/livr
 URL_SELECIONA_CADASTRO = "https://notajoseense.sjc.sp.gov.br/notafiscal/paginas/selecionacadastro/selecionaCadastro.jsf"
 URL_BEM_VINDO = "https://notajoseense.sjc.sp.gov.br/notafiscal/paginas/login/bemVindo.jsf"
 
+# Pausas (s) para a página/AJAX do JSF acomodar; o governador do host soma o ritmo dele depois
+PAUSA_CAMPO_S = (0.5, 1.0)
+PAUSA_ENTRE_PREENCHIMENTOS_S = (1.0, 1.5)
+PAUSA_CLIQUE_S = (1.0, 1.0)
+PAUSA_NOVA_TENTATIVA_S = (2.0, 2.0)
+
+def _acomodar(pagina: Page, pausa_s, url: Optional[str] = None):
+    """Pausa mínima para a página acomodar e, em seguida, a vez do governador do host."""
+    time.sleep(random.uniform(*pausa_s))
+    controle_hosts.aguardar(url or pagina.url)
+
 # --- Função para Selecionar a Empresa ---
 def selecionar_empresa(pagina: Page, cnpj: str):
     log_info(f"Iniciando a busca pelo CNPJ: {cnpj}...")
@@ -38,7 +50,7 @@ def selecionar_empresa(pagina: Page, cnpj: str):
         pagina.wait_for_load_state("networkidle", timeout=20000)
         campo_cnpj = pagina.locator(seletor_campo_cnpj)
         campo_cnpj.fill(cnpj)
-        time.sleep(random.uniform(0.5, 1.0))
+        _acomodar(pagina, PAUSA_CAMPO_S)
         
         botao_pesquisar = pagina.get_by_role("link", name="Pesquisar")
         botao_pesquisar.click()
@@ -59,14 +71,14 @@ def baixar_livros_fiscais(pagina: Page, competencia: str, cliente_id: str, confi
     log_info(f"Iniciando processo de download dos livros para a competência: {competencia}")
     try:
         log_info(f"Navegando para a página de relatórios...")
-        pagina.goto(URL_LIVROS_FISCAIS, wait_until="networkidle")
+        controle_hosts.navegar(pagina, URL_LIVROS_FISCAIS, wait_until="networkidle")
         
         try:
             toast = pagina.locator("#toast-container")
             toast.wait_for(state="visible", timeout=3000)
             if "Inscrição Municipal Obrigatória" in toast.inner_text():
                 log_info(f"Cliente {cliente_id} não possui Inscrição Municipal. Pulando download.")
-                pagina.goto(URL_SELECIONA_CADASTRO, wait_until="networkidle")
+                controle_hosts.navegar(pagina, URL_SELECIONA_CADASTRO, wait_until="networkidle")
                 return
         except PWTimeoutError:
             log_info("Nenhuma notificação de erro de IM encontrada.")
@@ -81,7 +93,7 @@ def baixar_livros_fiscais(pagina: Page, competencia: str, cliente_id: str, confi
         
         log_info(f"Preenchendo competência inicial: {competencia_formatada}")
         pagina.locator(seletor_data_inicio).fill(competencia_formatada)
-        time.sleep(random.uniform(1.0, 1.5)) # Pausa maior entre os preenchimentos
+        _acomodar(pagina, PAUSA_ENTRE_PREENCHIMENTOS_S)
         
         log_info(f"Preenchendo competência final: {competencia_formatada}")
         pagina.locator(seletor_data_fim).fill(competencia_formatada)
@@ -99,7 +111,7 @@ def baixar_livros_fiscais(pagina: Page, competencia: str, cliente_id: str, confi
             log_info(f"Gerando relatório para: {tipo_nota} - Situação {tipo_situacao}")
             seletor_situacao = seletor_situacao_normal if tipo_situacao == "Normal" else seletor_situacao_cancelada
             pagina.locator(seletor_situacao).click()
-            time.sleep(1)
+            _acomodar(pagina, PAUSA_CLIQUE_S)
             try:
                 with pagina.expect_download(timeout=15000) as download_info:
                     pagina.locator(seletor_botao_gerar).click()
@@ -125,7 +137,7 @@ def baixar_livros_fiscais(pagina: Page, competencia: str, cliente_id: str, confi
         gerar_e_salvar_relatorio("Prestadas", "Normal")
         log_info("Desmarcando a situação 'Normal' para a próxima captura.")
         pagina.locator(seletor_situacao_normal).click()
-        time.sleep(1)
+        _acomodar(pagina, PAUSA_CLIQUE_S)
         gerar_e_salvar_relatorio("Prestadas", "Cancelada")
         
     except Exception as e:
@@ -149,9 +161,10 @@ def executar_captura_sjc(clientes: List[Dict], config_geral: Dict, competencia:
         try:
             contexto = p.chromium.launch_persistent_context("", headless=False)
             pagina = contexto.new_page()
+            controle_hosts.observar_pagina(pagina)
             
             log_info(f"Acessando o portal de SJC...")
-            pagina.goto(SJC_LOGIN_URL, wait_until="networkidle")
+            controle_hosts.navegar(pagina, SJC_LOGIN_URL, wait_until="networkidle")
             pagina.get_by_label("CPF/CNPJ").press_sequentially(usuario, delay=100)
             pagina.get_by_label("Senha de acesso").press_sequentially(senha, delay=100)
             frame_captcha = pagina.frame_locator("iframe[title='reCAPTCHA']")
@@ -164,7 +177,7 @@ def executar_captura_sjc(clientes: List[Dict], config_geral: Dict, competencia:
                 log_info(f"--- Processando cliente {i+1}/{len(clientes)}: ID {cliente_alvo.get('id')} ---")
                 
                 if i > 0:
-                    pagina.goto(URL_SELECIONA_CADASTRO, wait_until="domcontentloaded")
+                    controle_hosts.navegar(pagina, URL_SELECIONA_CADASTRO, wait_until="domcontentloaded")
                 cnpj_alvo = cliente_alvo.get("cnpj")
                 if not cnpj_alvo:
                     log_error(f"Cliente {cliente_alvo.get('id')} está sem CNPJ. Pulando.")
@@ -181,9 +194,9 @@ def executar_captura_sjc(clientes: List[Dict], config_geral: Dict, competencia:
                     except PWTimeoutError:
                         log_error(f"Falha na tentativa {tentativa}. Resetando o fluxo para tentar novamente...")
                         # <<< MUDANÇA: Navega para a página de boas-vindas e depois para a seleção >>>
-                        pagina.goto(URL_BEM_VINDO, wait_until="networkidle")
-                        pagina.goto(URL_SELECIONA_CADASTRO, wait_until="networkidle")
-                        time.sleep(2) # Pausa extra
+                        controle_hosts.navegar(pagina, URL_BEM_VINDO, wait_until="networkidle")
+                        controle_hosts.navegar(pagina, URL_SELECIONA_CADASTRO, wait_until="networkidle")
+                        _acomodar(pagina, PAUSA_NOVA_TENTATIVA_S, URL_SELECIONA_CADASTRO)  # Pausa extra
                 
                 if not sucesso_selecao:
                     log_error(f"Não foi possível selecionar a empresa {cliente_alvo.get('id')} após {MAX_TENTATIVAS_SELECAO} tentativas. Pulando.")
@@ -204,7 +217,7 @@ def executar_captura_sjc(clientes: List[Dict], config_geral: Dict, competencia:
                         log_error(f"Falha na tentativa {tentativa_livro} de baixar os livros: {e}")
                         if tentativa_livro < MAX_TENTATIVAS_LIVROS:
                             log_info("Retornando à página de 'Bem-vindo' para tentar novamente...")
-                            pagina.goto(URL_BEM_VINDO, wait_until="networkidle")
+                            controle_hosts.navegar(pagina, URL_BEM_VINDO, wait_until="networkidle")
                 
                 if not sucesso_livros:
                     log_error(f"Não foi possível baixar os livros para o cliente {cliente_alvo.get('id')} após {MAX_TENTATIVAS_LIVROS} tentativas.")
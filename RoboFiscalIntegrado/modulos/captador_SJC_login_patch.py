@@ -1,5 +1,17 @@
 #---------------------------------------------------------------------------
-# modulos/captador_SJC_login_patch.py - v10.1
+# modulos/captador_SJC_login_patch.py - v11.3
+#  - Navegador do pool reciclado entre clientes quando passa do limite (novo login no seguinte)
+#  - Várias competências por cliente com uma única seleção da empresa
+#  - Toast, grid, checkboxes e campos de emissão lidos com uma consulta do DOM em lote
+#  - Espera de ociosidade num único round-trip (monitor injetado) e latência por clique; sem pausas fixas
+#  - XML exportado por postback JSF direto (ViewState + requisição parcial do PrimeFaces), navegador como reserva
+#  - Índice CNPJ -> linha do grid de empresas, lido uma vez (cópia cifrada em disco com validade)
+#  - Clientes distribuídos entre N contextos (login, perfil e pasta de downloads próprios)
+#  - Downloads detectados por evento do Playwright + inotify na pasta de downloads (sem varrer o perfil)
+#  - Perfil enxuto (temporário, semeado por snapshot) e poda de cache do perfil
+#  - Usa um navegador do pool aquecido quando o app o iniciou
+#  - Imagens, fontes, mídia e analytics bloqueados no navegador
+#  - Sessão do portal guardada entre execuções (login só quando expira)
 #  - Livros (Prestados/Tomados) estável
 #  - Talão (Emitidas/Recebidas) com confirmação
 #  - XML (Emitidas/Recebidas) na página oficial exportacaonota/exportacaoNota.jsf
@@ -7,12 +19,20 @@
 #    * Salvamento via FS scanning (zip/xml), print em "Nenhuma nota..."
 #---------------------------------------------------------------------------
 
+import html
 import os
 import re
 import sys
+import threading
 import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional, Iterable, Tuple, Set
+from typing import List, Dict, Optional, Tuple, Union
+
+import lxml.html
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin
 
 # --- sys.path ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -21,6 +41,8 @@ if PROJECT_DIR not in sys.path:
     sys.path.insert(0, PROJECT_DIR)
 
 from modulos.logger import log_info, log_error
+from modulos import controle_hosts, sessoes_portal, bloqueio_recursos, pool_navegadores, perfil_enxuto, captura_downloads, fila_trabalho, monitor_ociosidade, instantaneo_dom, competencias
+import gestor_config
 
 try:
     from playwright.sync_api import (
@@ -41,17 +63,10 @@ URL_XML_EXPORT           = "https://notajoseense.sjc.sp.gov.br/notafiscal/pagina
 
 # --- Timeouts (ms) — ajustáveis via ENV ---
 CLICK_WAIT_OVERLAY_MS = int(os.getenv("SJC_CLICK_OVERLAY_MS", "700"))
-POST_CLICK_PAUSE_MS   = int(os.getenv("SJC_POST_CLICK_MS", "120"))
+CLICK_IDLE_MAX_MS     = int(os.getenv("SJC_CLICK_IDLE_MAX_MS", "1500"))
 
 TOAST_FAST_MS         = int(os.getenv("SJC_TOAST_FAST_MS", "3500"))
 FS_FALLBACK_WAIT_MS   = int(os.getenv("SJC_FS_FALLBACK_WAIT_MS", "22000"))
-FS_POLL_INTERVAL_MS   = int(os.getenv("SJC_FS_POLL_INTERVAL_MS", "200"))
-
-OVERLAY_SELECTORS = [
-    ".ui-widget-overlay", ".ui-dialog-mask", ".ui-blockui",
-    "[aria-busy='true']",
-    "div:has-text('Processando')", "div:has-text('Processando...')",
-]
 
 # Mensagens conhecidas
 MSG_SEM_REGISTRO         = "Nenhum registro encontrado no período informado para a geração do livro fiscal"
@@ -63,61 +78,45 @@ MSG_NENHUMA_NOTA         = "Nenhuma nota fiscal foi encontrada com o filtro info
 # Utilitários visuais/ajax
 # =========================
 
+_CONSULTA_TOAST = {
+    "toast": instantaneo_dom.consulta(css="#toast-container .toast-message", texto=True, limite=1),
+    "mensagens": instantaneo_dom.consulta(
+        css="#toast-container, .ui-growl-item-container, .ui-growl-message, "
+            ".ui-messages-error, .ui-message-error, .ui-messages-warn, .ui-messages-info",
+        texto=True, limite=1),
+}
+
 def _toast_text(pagina: Page, timeout: int = TOAST_FAST_MS) -> Optional[str]:
-    try:
-        msg = pagina.locator("#toast-container .toast-message")
-        if msg.count() > 0:
-            msg.first.wait_for(state="visible", timeout=timeout)
-            return (msg.first.inner_text() or "").strip()
-    except PWTimeoutError:
-        pass
-    try:
-        t = pagina.locator("#toast-container, .ui-growl-item-container, .ui-growl-message, "
-                           ".ui-messages-error, .ui-message-error, .ui-messages-warn, .ui-messages-info")
-        if t.count() > 0:
-            t.first.wait_for(state="visible", timeout=timeout)
-            return (t.first.inner_text() or "").strip()
-    except PWTimeoutError:
-        pass
+    achados = instantaneo_dom.capturar(pagina, _CONSULTA_TOAST)
+    for nome in ("toast", "mensagens"):
+        el = instantaneo_dom.primeiro(achados, nome)
+        if el is None:
+            continue
+        if el.visivel:
+            return el.texto
+        try:
+            loc = el.locator(pagina)
+            loc.wait_for(state="visible", timeout=timeout)
+            return (loc.inner_text() or "").strip()
+        except PWTimeoutError:
+            pass
     return None
 
 def _esperar_ajax_quieto(pagina: Page, timeout_ms: int = 1500):
-    try:
-        pagina.wait_for_function(
-            """() => {
-                const pfOk = !!(window.PrimeFaces && PrimeFaces.ajax?.Queue?.isEmpty?.());
-                const jqOk = !!(window.jQuery && jQuery.active === 0);
-                return pfOk || jqOk;
-            }""",
-            timeout=timeout_ms
-        )
-    except PWTimeoutError:
-        pagina.wait_for_timeout(60)
-
-def _overlay_visivel(pagina: Page) -> bool:
-    for sel in OVERLAY_SELECTORS:
-        try:
-            loc = pagina.locator(sel)
-            if loc.count() > 0 and loc.first.is_visible():
-                return True
-        except Exception:
-            continue
-    return False
+    # Ajax do PrimeFaces/jQuery, overlays e DOM assentado, tudo no monitor da página
+    monitor_ociosidade.esperar(pagina, timeout_ms)
 
 def _esperar_overlay_sumir(pagina: Page, timeout_ms: int = CLICK_WAIT_OVERLAY_MS):
-    fim = time.time() + timeout_ms/1000
-    while time.time() < fim:
-        if not _overlay_visivel(pagina):
-            return
-        pagina.wait_for_timeout(50)
+    monitor_ociosidade.esperar(pagina, timeout_ms)
 
 def _safe_click(pagina: Page, locator, descricao: str = "elemento", timeout: int = 6000):
     locator.scroll_into_view_if_needed()
     locator.wait_for(state="visible", timeout=timeout)
     _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS)
-    _esperar_ajax_quieto(pagina, 500)
+    inicio = time.monotonic()
     locator.click()
-    pagina.wait_for_timeout(POST_CLICK_PAUSE_MS)
+    detalhe = monitor_ociosidade.esperar(pagina, CLICK_IDLE_MAX_MS)
+    monitor_ociosidade.registrar(descricao, (time.monotonic() - inicio) * 1000, detalhe)
 
 def _limpar_sessao(contexto, url_base: str = SJC_LOGIN_URL):
     try:
@@ -126,7 +125,7 @@ def _limpar_sessao(contexto, url_base: str = SJC_LOGIN_URL):
         log_info(f"Não foi possível limpar cookies: {e}")
     try:
         tmp = contexto.new_page()
-        tmp.goto(url_base, wait_until="domcontentloaded")
+        controle_hosts.navegar(tmp, url_base, wait_until="domcontentloaded")
         tmp.evaluate("""() => {
             try { localStorage.clear(); } catch(e) {}
             try { sessionStorage.clear(); } catch(e) {}
@@ -210,19 +209,27 @@ def preencher_competencia_xml(pagina: Page, competencia: str):
 
 def login_sjc(pagina: Page, usuario: str, senha: str):
     log_info("Abrindo tela de login (sem captcha)…")
-    pagina.goto(SJC_LOGIN_URL, wait_until="domcontentloaded")
+    controle_hosts.navegar(pagina, SJC_LOGIN_URL, wait_until="domcontentloaded")
     pagina.fill("#inputLogin", usuario)
     pagina.fill("#inputPassword", senha)
     _safe_click(pagina, pagina.locator("#formLogin\\:buttonLogin"), "Entrar")
     try: pagina.wait_for_load_state("networkidle", timeout=6000)
     except PWTimeoutError: pass
 
+def _sessao_sjc_valida(url_final: str, corpo: str) -> bool:
+    # Sessão expirada cai de volta na tela de login
+    return "login.jsf" not in url_final and "inputLogin" not in corpo
+
+_GRID_EMPRESAS_CSS = ["tbody.ui-datatable-data[id$='_data']",
+                      "[id$=':dtResultado_data']",
+                      "table.ui-datatable > tbody.ui-datatable-data"]
+
 def _resolver_grid_empresas(pagina: Page):
-    for css in ["tbody.ui-datatable-data[id$='_data']",
-                "[id$=':dtResultado_data']",
-                "table.ui-datatable > tbody.ui-datatable-data"]:
-        tb = pagina.locator(css).first
-        if tb.count() > 0:
+    achados = instantaneo_dom.capturar(
+        pagina, {css: instantaneo_dom.consulta(css=css, limite=1) for css in _GRID_EMPRESAS_CSS})
+    for css in _GRID_EMPRESAS_CSS:
+        if achados[css]:
+            tb = pagina.locator(css).first
             rows = tb.locator(":scope > tr, :scope tr[role='row']")
             return tb, rows
     raise PWTimeoutError("Grid de empresas não encontrado.")
@@ -246,23 +253,119 @@ def _cnpj_mask(cnpj: str) -> str:
     d = _cnpj_norm(cnpj)
     return f"{d[0:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:14]}" if len(d) == 14 else cnpj
 
-def selecionar_empresa(pagina: Page, cnpj: str):
-    log_info(f"Selecionando empresa SEM usar pesquisa. CNPJ: {cnpj}")
-    pagina.goto(URL_SELECIONA_CADASTRO, wait_until="domcontentloaded")
-    _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS)
-    _esperar_ajax_quieto(pagina, 700)
-    _, rows = _resolver_grid_empresas(pagina)
+_INDEXAR_GRID_JS = """tb => Array.from(tb.querySelectorAll(':scope > tr')).map((tr, pos) => {
+    const m = tr.textContent.match(/\\d{2}\\.?\\d{3}\\.?\\d{3}\\/?\\d{4}-?\\d{2}/);
+    return [tr.getAttribute('data-ri') || String(pos), m ? m[0].replace(/\\D/g, '') : ''];
+})"""
+
+# Pagina o DataTable do PrimeFaces direto para a página da linha (carrega só aquela página)
+_PAGINAR_ATE_LINHA_JS = """ri => {
+    const pf = window.PrimeFaces;
+    if (!pf || !pf.widgets) return false;
+    for (const w of Object.values(pf.widgets)) {
+        if (w && w.paginator && typeof w.paginator.setPage === 'function'
+                && w.jq && w.jq.find('tbody.ui-datatable-data').length) {
+            w.paginator.setPage(Math.floor(ri / w.paginator.cfg.rows));
+            return true;
+        }
+    }
+    return false;
+}"""
+
+class IndiceEmpresas:
+    """CNPJ -> linha (data-ri) do grid de selecionaCadastro, compartilhado pelos contextos da execução.
+
+    O grid completo só é lido quando um CNPJ não está no índice ou a linha
+    indicada não confere mais; a cópia em disco vai cifrada junto das sessões.
+    """
+    def __init__(self, usuario: str, ttl_min: float):
+        self.usuario = usuario
+        self.ttl_min = ttl_min
+        self._linhas: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.geracao = 0
+        guardado = sessoes_portal.carregar("sjc_empresas", usuario, ttl_min)
+        if guardado:
+            self._linhas = {k: int(v) for k, v in guardado.get("linhas", {}).items()}
+
+    def linha(self, cnpj: str) -> Optional[int]:
+        return self._linhas.get(_cnpj_norm(cnpj))
+
+    def reindexar(self, pagina: Page, geracao: int) -> None:
+        """Relê o grid inteiro, a menos que outro contexto já o tenha relido depois de `geracao`."""
+        with self._lock:
+            if self.geracao != geracao:
+                return
+            _definir_rpp_1000(pagina)
+            _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS)
+            _esperar_ajax_quieto(pagina, 700)
+            tb, _ = _resolver_grid_empresas(pagina)
+            self._linhas = {cnpj: int(ri) for ri, cnpj in tb.evaluate(_INDEXAR_GRID_JS) if cnpj and ri.isdigit()}
+            self.geracao += 1
+            sessoes_portal.salvar("sjc_empresas", self.usuario, {"linhas": self._linhas})
+        log_info(f"Grid de empresas indexado: {len(self._linhas)} CNPJ(s).")
+
+def _linha_indexada(pagina: Page, ri: int, cnpj: str):
+    """Linha `ri` do grid, paginando até ela se preciso; None se não está lá ou é de outro CNPJ."""
+    tb, rows = _resolver_grid_empresas(pagina)
+    if tb.locator(":scope > tr[data-ri]").count() == 0:
+        # Grid sem data-ri: o índice guarda a posição na página de 1000 linhas
+        linha = rows.nth(ri)
+        if linha.count() == 0:
+            _definir_rpp_1000(pagina)
+            _esperar_ajax_quieto(pagina, 700)
+            _, rows = _resolver_grid_empresas(pagina)
+            linha = rows.nth(ri)
+        return linha if linha.count() > 0 and _cnpj_norm(cnpj) in _cnpj_norm(linha.inner_text()) else None
+    linha = tb.locator(f":scope > tr[data-ri='{ri}']")
+    if linha.count() == 0:
+        try:
+            if not pagina.evaluate(_PAGINAR_ATE_LINHA_JS, ri):
+                return None
+        except Exception:
+            return None
+        _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS)
+        _esperar_ajax_quieto(pagina, 700)
+        tb, _ = _resolver_grid_empresas(pagina)
+        linha = tb.locator(f":scope > tr[data-ri='{ri}']")
+        if linha.count() == 0:
+            return None
+    linha = linha.first
+    return linha if _cnpj_norm(cnpj) in _cnpj_norm(linha.inner_text()) else None
+
+def _linha_por_texto(pagina: Page, cnpj: str):
     _definir_rpp_1000(pagina)
     _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS)
     _esperar_ajax_quieto(pagina, 700)
     _, rows = _resolver_grid_empresas(pagina)
-
-    alvo = None
     for txt in (_cnpj_mask(cnpj), _cnpj_norm(cnpj)):
         if txt:
             cand = rows.filter(has_text=txt)
             if cand.count() > 0:
-                alvo = cand.first; break
+                return cand.first
+    return None
+
+def selecionar_empresa(pagina: Page, cnpj: str, indice: Optional[IndiceEmpresas] = None):
+    log_info(f"Selecionando empresa SEM usar pesquisa. CNPJ: {cnpj}")
+    controle_hosts.navegar(pagina, URL_SELECIONA_CADASTRO, wait_until="domcontentloaded")
+    _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS)
+    _esperar_ajax_quieto(pagina, 700)
+    _resolver_grid_empresas(pagina)
+
+    alvo = None
+    if indice is None:
+        alvo = _linha_por_texto(pagina, cnpj)
+    else:
+        geracao = indice.geracao
+        ri = indice.linha(cnpj)
+        if ri is not None:
+            alvo = _linha_indexada(pagina, ri, cnpj)
+        if alvo is None:
+            # CNPJ novo ou grid mudou desde a indexação
+            indice.reindexar(pagina, geracao)
+            ri = indice.linha(cnpj)
+            if ri is not None:
+                alvo = _linha_indexada(pagina, ri, cnpj)
     if not alvo: raise PWTimeoutError("CNPJ não encontrado no grid.")
 
     btn = alvo.locator("a[title='Selecionar'], a:has-text('Selecionar'), button:has-text('Selecionar')").first
@@ -276,51 +379,50 @@ def selecionar_empresa(pagina: Page, cnpj: str):
 # Situação / Tipo / Livro Fiscal / Talão / XML
 # =========================
 
+# A partir do rótulo: input oculto do PrimeFaces e a caixa clicável, nos três layouts da página
+_CHECKBOX_RELATIVOS = {
+    "oculto":        "id(string(@for))",
+    "caixa_td":      "parent::td//div[contains(@class,'ui-chkbox')]//div[contains(@class,'ui-chkbox-box')]",
+    "caixa_irma":    "preceding-sibling::div[contains(@class,'ui-chkbox')][1]//div[contains(@class,'ui-chkbox-box')]",
+    "td_input":      "ancestor::td[1]//input[@type='checkbox']",
+    "td_caixa":      "ancestor::td[1]//*[contains(@class,'ui-chkbox-box')]",
+    "wrapper":       "following::div[contains(@class,'ui-selectbooleancheckbox')][1]",
+    "wrapper_input": "following::div[contains(@class,'ui-selectbooleancheckbox')][1]//input[@type='checkbox']",
+    "wrapper_caixa": "following::div[contains(@class,'ui-selectbooleancheckbox')][1]//*[contains(@class,'ui-chkbox-box')]",
+}
+
 def _find_checkbox_elements(pagina: Page, label_text: str):
-    lab = pagina.locator(f"label:has-text('{label_text}')").first
-    if lab.count() == 0:
-        lab = pagina.locator(f"span.ui-outputlabel-label:has-text('{label_text}')").first
-    if lab.count() == 0:
-        lab = pagina.locator(f"text={label_text}").first
-    if lab.count() == 0:
+    """(clicável, input oculto, marcado agora) para o checkbox do rótulo, numa única consulta ao DOM."""
+    comum = dict(contem=label_text, atributos=["for"], relativos=_CHECKBOX_RELATIVOS, limite=1)
+    achados = instantaneo_dom.capturar(pagina, {
+        "label": instantaneo_dom.consulta(css="label", **comum),
+        "span":  instantaneo_dom.consulta(css="span.ui-outputlabel-label", **comum),
+        "texto": instantaneo_dom.consulta(
+            xpath=f"//body//*[not(self::script)][text()[contains(normalize-space(.), '{label_text}')]]", **comum),
+    })
+    rotulo = instantaneo_dom.primeiro(achados, "label", "span", "texto")
+    if rotulo is None:
         raise PWTimeoutError(f"Label '{label_text}' não encontrado.")
+    r = rotulo.relativos
 
-    for_attr = (lab.get_attribute("for") or "").strip()
-    if for_attr:
-        hidden = pagina.locator(f"id={for_attr}").first
-        box = pagina.locator(
-            f"xpath=//label[@for='{for_attr}']/parent::td//div[contains(@class,'ui-chkbox')]"
-            f"//div[contains(@class,'ui-chkbox-box')]"
-        ).first
-        if box.count() == 0:
-            box = pagina.locator(
-                f"xpath=//label[@for='{for_attr}']/preceding-sibling::div[contains(@class,'ui-chkbox')][1]"
-                f"//div[contains(@class,'ui-chkbox-box')]"
-            ).first
-        clicavel = box if box.count() > 0 else lab
-        if hidden.count() > 0:
-            return clicavel, hidden
-
-    td = lab.locator("xpath=ancestor::td[1]").first
-    if td.count() > 0:
-        hidden = td.locator("input[type='checkbox']").first
-        box    = td.locator(".ui-chkbox-box").first
-        if hidden.count() > 0 and (box.count() > 0 or lab.count() > 0):
-            return (box if box.count() > 0 else lab), hidden
-
-    wrapper = lab.locator("xpath=following::div[contains(@class,'ui-selectbooleancheckbox')][1]").first
-    if wrapper.count() > 0:
-        hidden = wrapper.locator("input[type='checkbox']").first
-        box    = wrapper.locator(".ui-chkbox-box").first
-        if hidden.count() > 0:
-            return (box if box.count() > 0 else wrapper), hidden
+    if (rotulo.atributos.get("for") or "").strip() and r.get("oculto"):
+        caixa = r.get("caixa_td") or r.get("caixa_irma") or rotulo
+        return caixa.locator(pagina), r["oculto"].locator(pagina), r["oculto"].marcado
+
+    if r.get("td_input"):
+        caixa = r.get("td_caixa") or rotulo
+        return caixa.locator(pagina), r["td_input"].locator(pagina), r["td_input"].marcado
+
+    if r.get("wrapper_input"):
+        caixa = r.get("wrapper_caixa") or r["wrapper"]
+        return caixa.locator(pagina), r["wrapper_input"].locator(pagina), r["wrapper_input"].marcado
 
     raise PWTimeoutError(f"Checkbox para '{label_text}' não encontrado.")
 
 def set_checkbox_by_label(pagina: Page, label_text: str, checked: bool,
                           wait_overlay_ms: int = CLICK_WAIT_OVERLAY_MS,
                           wait_ajax_ms: int = 600):
-    clicavel, hidden = _find_checkbox_elements(pagina, label_text)
+    clicavel, hidden, estado_atual = _find_checkbox_elements(pagina, label_text)
 
     def _is_checked():
         try:
@@ -329,7 +431,6 @@ def set_checkbox_by_label(pagina: Page, label_text: str, checked: bool,
             v = (hidden.get_attribute("checked") or "").lower()
             return v in ("true", "checked", "1")
 
-    estado_atual = _is_checked()
     if estado_atual == checked:
         return
 
@@ -343,7 +444,6 @@ def set_checkbox_by_label(pagina: Page, label_text: str, checked: bool,
         pass
 
     clicavel.click()
-    pagina.wait_for_timeout(POST_CLICK_PAUSE_MS)
 
     try:
         _esperar_overlay_sumir(pagina, wait_overlay_ms)
@@ -353,7 +453,6 @@ def set_checkbox_by_label(pagina: Page, label_text: str, checked: bool,
 
     if _is_checked() != checked:
         clicavel.click()
-        pagina.wait_for_timeout(POST_CLICK_PAUSE_MS)
         try:
             _esperar_overlay_sumir(pagina, wait_overlay_ms)
             _esperar_ajax_quieto(pagina, wait_ajax_ms + 200)
@@ -388,67 +487,6 @@ def set_servico_radio_talao(pagina: Page, label: str):
 # Download helpers (FS)
 # =========================
 
-def _candidate_download_dirs(perfil_dir: Path, downloads_tmp_dir: Path) -> list[Path]:
-    cands: list[Path] = []
-    for p in [downloads_tmp_dir, perfil_dir / "Downloads", perfil_dir / "Default" / "Downloads"]:
-        try:
-            if p and p.exists():
-                cands.append(p.resolve())
-        except Exception:
-            pass
-    try:
-        for p in perfil_dir.glob("**/Downloads"):
-            rp = p.resolve()
-            if rp not in cands:
-                cands.append(rp)
-    except Exception:
-        pass
-    seen = set(); uniq = []
-    for p in cands:
-        if p not in seen:
-            seen.add(p); uniq.append(p)
-    return uniq
-
-def _snapshot_all(dirs: Iterable[Path]) -> Tuple[Set[Path], float]:
-    before: Set[Path] = set()
-    ts = time.time()
-    for d in dirs:
-        try:
-            for p in d.glob("*"):
-                before.add(p.resolve())
-        except Exception:
-            continue
-    return before, ts
-
-def _pick_new_file_any(dirs: Iterable[Path], before: Set[Path], start_ts: float,
-                       timeout_ms: int, poll_ms: int = FS_POLL_INTERVAL_MS) -> Optional[Path]:
-    deadline = time.time() + timeout_ms / 1000
-    while time.time() < deadline:
-        for d in dirs:
-            try:
-                for p in d.glob("*"):
-                    try:
-                        rp = p.resolve()
-                        if rp in before:
-                            continue
-                        st = p.stat()
-                        if st.st_mtime + 0.3 < start_ts:
-                            continue
-                        sz1 = st.st_size
-                        time.sleep(0.12)
-                        if not rp.exists():
-                            continue
-                        sz2 = rp.stat().st_size
-                        if sz2 == 0 or sz1 != sz2:
-                            continue
-                        return rp
-                    except Exception:
-                        continue
-            except Exception:
-                continue
-        time.sleep(poll_ms / 1000)
-    return None
-
 def _move_to_dest_force_pdf(src: Path, dest: Path) -> Path:
     dest.parent.mkdir(parents=True, exist_ok=True)
     if dest.suffix.lower() != ".pdf":
@@ -527,16 +565,14 @@ def click_download_and_wait_fast(pagina: Page, destino: Path,
     if btn.count() == 0:
         raise PWTimeoutError("Botão de download/geração não encontrado.")
 
-    cand_dirs = _candidate_download_dirs(perfil_dir, downloads_tmp_dir)
-    before_set, start_ts = _snapshot_all(cand_dirs)
+    with captura_downloads.EsperaDownload(pagina, downloads_tmp_dir) as espera:
+        _safe_click(pagina, btn, "Download/Gerar")
 
-    _safe_click(pagina, btn, "Download/Gerar")
+        msg = _toast_text(pagina, timeout=TOAST_FAST_MS)
+        if msg:
+            return False
 
-    msg = _toast_text(pagina, timeout=TOAST_FAST_MS)
-    if msg:
-        return False
-
-    novo = _pick_new_file_any(cand_dirs, before_set, start_ts, timeout_ms=FS_FALLBACK_WAIT_MS)
+        novo = espera.resultado(FS_FALLBACK_WAIT_MS)
     if novo:
         _move_to_dest_force_pdf(novo, destino)  # Livros => PDF
         return True
@@ -549,12 +585,12 @@ def click_download_and_wait_fast(pagina: Page, destino: Path,
             "a[id$=':btnDownload'], button[id$=':btnDownload']"
         ).first
         if btn_dlg.count() > 0 and btn_dlg.is_visible():
-            before_set2, start_ts2 = _snapshot_all(cand_dirs)
-            _safe_click(pagina, btn_dlg, "Download (diálogo)")
-            msg2 = _toast_text(pagina, timeout=TOAST_FAST_MS)
-            if msg2:
-                return False
-            novo2 = _pick_new_file_any(cand_dirs, before_set2, start_ts2, timeout_ms=int(FS_FALLBACK_WAIT_MS*0.7))
+            with captura_downloads.EsperaDownload(pagina, downloads_tmp_dir) as espera2:
+                _safe_click(pagina, btn_dlg, "Download (diálogo)")
+                msg2 = _toast_text(pagina, timeout=TOAST_FAST_MS)
+                if msg2:
+                    return False
+                novo2 = espera2.resultado(int(FS_FALLBACK_WAIT_MS*0.7))
             if novo2:
                 _move_to_dest_force_pdf(novo2, destino)
                 return True
@@ -633,26 +669,24 @@ def gerar_relacao_talao_combined(pagina: Page, pasta_saida: Path,
     nome_base = f"{cliente_id}_Talao_{servico_label}_AtivaCancelada_{mes}-{ano}"
     destino   = pasta_saida / f"{nome_base}.pdf"
 
-    cand_dirs = _candidate_download_dirs(perfil_dir, downloads_tmp_dir)
-    before_set, start_ts = _snapshot_all(cand_dirs)
-
-    confirmou = _click_gerar_relacao_e_confirmar(pagina)
+    with captura_downloads.EsperaDownload(pagina, downloads_tmp_dir) as espera:
+        confirmou = _click_gerar_relacao_e_confirmar(pagina)
 
-    msg = _toast_text(pagina, timeout=TOAST_FAST_MS)
-    if msg and (MSG_NENHUMA_NOTA in msg or MSG_SEM_DADOS_IMPRESSAO in msg or MSG_ERRO_IMPREVISTO in msg):
-        img = pasta_saida / f"{nome_base}_SEM_REGISTRO.png"
-        pagina.screenshot(path=str(img), full_page=True)
-        log_info(f"Mensagem detectada ('{msg}'). Print salvo: {img}")
-        return
+        msg = _toast_text(pagina, timeout=TOAST_FAST_MS)
+        if msg and (MSG_NENHUMA_NOTA in msg or MSG_SEM_DADOS_IMPRESSAO in msg or MSG_ERRO_IMPREVISTO in msg):
+            img = pasta_saida / f"{nome_base}_SEM_REGISTRO.png"
+            pagina.screenshot(path=str(img), full_page=True)
+            log_info(f"Mensagem detectada ('{msg}'). Print salvo: {img}")
+            return
 
-    if not confirmou:
-        btn_fallback = pagina.locator(
-            "a:has-text('Download'), button:has-text('Download'), a[id$=':btnDownload']"
-        ).first
-        if btn_fallback.count() > 0 and btn_fallback.is_visible():
-            _safe_click(pagina, btn_fallback, "Download (fallback sem diálogo)")
+        if not confirmou:
+            btn_fallback = pagina.locator(
+                "a:has-text('Download'), button:has-text('Download'), a[id$=':btnDownload']"
+            ).first
+            if btn_fallback.count() > 0 and btn_fallback.is_visible():
+                _safe_click(pagina, btn_fallback, "Download (fallback sem diálogo)")
 
-    novo = _pick_new_file_any(cand_dirs, before_set, start_ts, timeout_ms=FS_FALLBACK_WAIT_MS)
+        novo = espera.resultado(FS_FALLBACK_WAIT_MS)
     if novo:
         _move_to_dest_force_pdf(novo, destino)
         return
@@ -665,26 +699,25 @@ def gerar_relacao_talao_combined(pagina: Page, pasta_saida: Path,
 # Geração/Print - XML (Emitidas/Recebidas) — PÁGINA NOVA
 # =========================
 
+def _limpar_campos(pagina: Page, consultas: Dict[str, Dict]):
+    """Esvazia os campos achados (visíveis) numa só consulta; cada campo é limpo uma vez."""
+    achados = instantaneo_dom.capturar(pagina, consultas)
+    limpos = set()
+    for nome in consultas:
+        for el in achados[nome]:
+            if not el.visivel or el.ref in limpos:
+                continue
+            limpos.add(el.ref)
+            try: el.locator(pagina).fill("", timeout=1500)
+            except Exception: continue
+    _esperar_ajax_quieto(pagina, 400)
+
 def limpar_emissao_xml(pagina: Page):
     # exatamente como no HTML enviado
-    alvos = [
-        pagina.locator("#j_idt92\\:j_idt109\\:idStart_input"),
-        pagina.locator("#j_idt92\\:j_idt109\\:idEnd_input"),
-    ]
-    for loc in alvos:
-        try:
-            el = loc.first if loc.count() > 0 else None
-            if not el: continue
-            el.scroll_into_view_if_needed()
-            el.wait_for(state="visible", timeout=1500)
-            el.click()
-            try: el.clear()
-            except Exception:
-                el.press("Control+A"); el.press("Delete")
-            pagina.wait_for_timeout(40)
-        except Exception:
-            continue
-    _esperar_ajax_quieto(pagina, 400)
+    _limpar_campos(pagina, {
+        "inicio": instantaneo_dom.consulta(css="[id='j_idt92:j_idt109:idStart_input']", limite=1),
+        "fim":    instantaneo_dom.consulta(css="[id='j_idt92:j_idt109:idEnd_input']", limite=1),
+    })
 
 def _click_gerar_xml_e_confirmar(pagina: Page) -> bool:
     # Botão "Gerar Relação Notas" com id j_idt92:j_idt160
@@ -734,29 +767,27 @@ def gerar_xml_combined(pagina: Page, pasta_saida: Path,
     nome_base = f"{cliente_id}_XML_{servico_label}_AtivaCancelada_{mes}-{ano}"
     dest_base = pasta_saida / f"{nome_base}"  # extensão dinâmica (.zip/.xml/.pdf)
 
-    cand_dirs = _candidate_download_dirs(perfil_dir, downloads_tmp_dir)
-    before_set, start_ts = _snapshot_all(cand_dirs)
-
-    confirmou = _click_gerar_xml_e_confirmar(pagina)
+    with captura_downloads.EsperaDownload(pagina, downloads_tmp_dir) as espera:
+        confirmou = _click_gerar_xml_e_confirmar(pagina)
 
-    # Toast de "Nenhuma nota..." -> print e return
-    msg = _toast_text(pagina, timeout=TOAST_FAST_MS)
-    if msg and (MSG_NENHUMA_NOTA in msg or MSG_SEM_DADOS_IMPRESSAO in msg or MSG_ERRO_IMPREVISTO in msg):
-        img = pasta_saida / f"{nome_base}_SEM_REGISTRO.png"
-        pagina.screenshot(path=str(img), full_page=True)
-        log_info(f"Mensagem detectada ('{msg}'). Print salvo: {img}")
-        return
+        # Toast de "Nenhuma nota..." -> print e return
+        msg = _toast_text(pagina, timeout=TOAST_FAST_MS)
+        if msg and (MSG_NENHUMA_NOTA in msg or MSG_SEM_DADOS_IMPRESSAO in msg or MSG_ERRO_IMPREVISTO in msg):
+            img = pasta_saida / f"{nome_base}_SEM_REGISTRO.png"
+            pagina.screenshot(path=str(img), full_page=True)
+            log_info(f"Mensagem detectada ('{msg}'). Print salvo: {img}")
+            return
 
-    # Fallback: botão “Download” direto (se o diálogo sumiu rápido)
-    if not confirmou:
-        btn_fallback = pagina.locator(
-            "a:has-text('Download'), button:has-text('Download'), a[id$=':btnDownload'], a.btn-download-final"
-        ).first
-        if btn_fallback.count() > 0 and btn_fallback.is_visible():
-            _safe_click(pagina, btn_fallback, "Download XML (fallback)")
+        # Fallback: botão “Download” direto (se o diálogo sumiu rápido)
+        if not confirmou:
+            btn_fallback = pagina.locator(
+                "a:has-text('Download'), button:has-text('Download'), a[id$=':btnDownload'], a.btn-download-final"
+            ).first
+            if btn_fallback.count() > 0 and btn_fallback.is_visible():
+                _safe_click(pagina, btn_fallback, "Download XML (fallback)")
 
-    # Espera arquivo aparecer na(s) pasta(s) de download
-    novo = _pick_new_file_any(cand_dirs, before_set, start_ts, timeout_ms=FS_FALLBACK_WAIT_MS)
+        # Espera o download terminar (evento do Playwright ou arquivo fechado na pasta)
+        novo = espera.resultado(FS_FALLBACK_WAIT_MS)
     if novo:
         _move_to_dest_dynamic_ext(novo, dest_base, prefer_exts=(".zip", ".xml", ".pdf"))
         return
@@ -765,10 +796,192 @@ def gerar_xml_combined(pagina: Page, pasta_saida: Path,
     pagina.screenshot(path=str(img), full_page=True)
     log_error(f"Falha ao gerar XML ({servico_label}) sem toast e sem arquivo. Print: {img}")
 
+# =========================
+# XML por HTTP (postback JSF)
+# =========================
+
+class FluxoHTTPIndisponivel(Exception):
+    """A página não tem a estrutura esperada; a exportação volta para o navegador."""
+
+_VIEWSTATE_PARCIAL = re.compile(r'<update id="[^"]*javax\.faces\.ViewState[^"]*"><!\[CDATA\[(.*?)\]\]></update>', re.S)
+
+def criar_sessao_http(pagina: Page) -> requests.Session:
+    """Sessão HTTP com os cookies do navegador (a empresa selecionada fica na sessão do portal)."""
+    s = requests.Session()
+    s.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    try:
+        s.headers["User-Agent"] = pagina.evaluate("() => navigator.userAgent")
+    except Exception:
+        pass
+    for cookie in pagina.context.cookies():
+        s.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie.get('path') or '/')
+    return s
+
+def _requisitar(sessao: requests.Session, metodo: str, url: str, **kwargs) -> requests.Response:
+    with controle_hosts.slot(url) as medicao:
+        resp = sessao.request(metodo, url, timeout=60, **kwargs)
+        medicao.resposta(resp.status_code, resp.headers)
+    resp.raise_for_status()
+    if "login.jsf" in resp.url:
+        raise Exception("A sessão do portal expirou durante a exportação por HTTP.")
+    return resp
+
+def _mensagem_portal(texto: str) -> Optional[str]:
+    claro = html.unescape(texto)
+    for msg in (MSG_NENHUMA_NOTA, MSG_SEM_DADOS_IMPRESSAO, MSG_ERRO_IMPREVISTO):
+        if msg in claro:
+            return msg
+    return None
+
+class FormularioJSF:
+    """Formulário da página de exportação, com o ViewState acompanhado entre as requisições."""
+    def __init__(self, sessao: requests.Session, url: str):
+        self.sessao = sessao
+        resp = _requisitar(sessao, "GET", url)
+        doc = lxml.html.document_fromstring(resp.text, base_url=resp.url)
+        forms = doc.xpath("//form[.//input[@name='javax.faces.ViewState']]")
+        if not forms:
+            raise FluxoHTTPIndisponivel("formulário JSF com ViewState não encontrado")
+        self.doc = doc
+        self.form = forms[0]
+        self.action = urljoin(resp.url, self.form.get("action") or resp.url)
+        self.valores: List[Tuple[str, str]] = [(k, v) for k, v in self.form.form_values()]
+        self.viewstate = self.form.xpath(".//input[@name='javax.faces.ViewState']/@value")[0]
+
+    def _input_do_rotulo(self, texto: str):
+        for label in self.form.xpath(".//label[@for]"):
+            if label.text_content().strip() != texto:
+                continue
+            alvo = self.form.xpath(f".//*[@id='{label.get('for')}']")
+            if not alvo:
+                continue
+            el = alvo[0]
+            if el.tag != "input":
+                el = (el.xpath(".//input[@type='checkbox' or @type='radio']") or [None])[0]
+            if el is not None and el.get("name"):
+                return el
+        raise FluxoHTTPIndisponivel(f"campo '{texto}' não encontrado")
+
+    def definir(self, nome: str, valor: str) -> None:
+        self.valores = [(k, v) for k, v in self.valores if k != nome] + [(nome, valor)]
+
+    def marcar(self, rotulo: str, marcado: bool) -> None:
+        el = self._input_do_rotulo(rotulo)
+        par = (el.get("name"), el.get("value") or "on")
+        if el.get("type") == "radio":
+            self.definir(*par)
+            return
+        self.valores = [v for v in self.valores if v != par] + ([par] if marcado else [])
+
+    def id_do_botao(self, texto: str = "", sufixo_id: str = "") -> str:
+        if sufixo_id:
+            achados = self.doc.xpath(f"//*[substring(@id, string-length(@id) - {len(sufixo_id) - 1}) = '{sufixo_id}']")
+        else:
+            achados = [el.getparent() if el.tag == "span" else el
+                       for el in self.doc.xpath(f"//a[normalize-space(.)='{texto}'] | //button[normalize-space(.)='{texto}'] "
+                                                f"| //button/span[normalize-space(.)='{texto}']")]
+        achados = [el for el in achados if el.get("id")]
+        if not achados:
+            raise FluxoHTTPIndisponivel(f"botão '{texto or sufixo_id}' não encontrado")
+        return achados[0].get("id")
+
+    def _dados(self) -> List[Tuple[str, str]]:
+        return [(k, v) for k, v in self.valores if k != "javax.faces.ViewState"] + [("javax.faces.ViewState", self.viewstate)]
+
+    def parcial(self, origem: str) -> str:
+        """Requisição parcial do PrimeFaces (o mesmo que o clique num botão ajax); devolve o XML da resposta."""
+        dados = self._dados() + [
+            ("javax.faces.partial.ajax", "true"), ("javax.faces.source", origem),
+            ("javax.faces.partial.execute", "@all"), ("javax.faces.partial.render", "@all"), (origem, origem),
+        ]
+        resp = _requisitar(self.sessao, "POST", self.action, data=dados,
+                           headers={"Faces-Request": "partial/ajax", "X-Requested-With": "XMLHttpRequest"})
+        if "<partial-response" not in resp.text:
+            raise FluxoHTTPIndisponivel("resposta parcial do JSF não reconhecida")
+        if "<error>" in resp.text:
+            raise FluxoHTTPIndisponivel("o JSF recusou a requisição parcial")
+        m = _VIEWSTATE_PARCIAL.search(resp.text)
+        if m:
+            self.viewstate = m.group(1)
+        return resp.text
+
+    def baixar(self, origem: str, destino_parcial: Path) -> Optional[str]:
+        """Postback completo do botão de download gravando o corpo em `destino_parcial`.
+
+        Devolve None quando veio arquivo, ou o texto da página quando o portal respondeu com HTML.
+        """
+        with controle_hosts.slot(self.action) as medicao:
+            resp = self.sessao.post(self.action, data=self._dados() + [(origem, origem)], timeout=120, stream=True)
+            medicao.resposta(resp.status_code, resp.headers)
+            try:
+                resp.raise_for_status()
+                anexo = "attachment" in resp.headers.get("Content-Disposition", "").lower()
+                if not anexo and "html" in resp.headers.get("Content-Type", "").lower():
+                    return resp.text
+                with open(destino_parcial, "wb") as f:
+                    for bloco in resp.iter_content(64 * 1024):
+                        f.write(bloco)
+                return None
+            finally:
+                resp.close()
+
+def _gerar_xml_http(form: FormularioJSF, pasta_saida: Path, cliente_id: str, competencia: str,
+                    servico_label: str) -> None:
+    form.marcar("Ativa", True)
+    form.marcar("Cancelada", True)
+    form.marcar("Substituida", False)
+    form.marcar(servico_label, True)
+
+    ano, mes = competencia.split("-")
+    nome_base = f"{cliente_id}_XML_{servico_label}_AtivaCancelada_{mes}-{ano}"
+
+    resposta = form.parcial(form.id_do_botao(texto="Gerar Relação Notas"))
+    msg = _mensagem_portal(resposta)
+    if msg:
+        (pasta_saida / f"{nome_base}_SEM_REGISTRO.txt").write_text(msg, encoding="utf-8")
+        log_info(f"Mensagem detectada ('{msg}') no XML {servico_label} (HTTP).")
+        return
+
+    parcial = pasta_saida / f".{nome_base}.parcial"
+    pagina_html = form.baixar(form.id_do_botao(sufixo_id=":btnDownload"), parcial)
+    if pagina_html is not None:
+        msg = _mensagem_portal(pagina_html)
+        if not msg:
+            raise FluxoHTTPIndisponivel("o download devolveu uma página sem arquivo")
+        (pasta_saida / f"{nome_base}_SEM_REGISTRO.txt").write_text(msg, encoding="utf-8")
+        log_info(f"Mensagem detectada ('{msg}') no XML {servico_label} (HTTP).")
+        return
+    _move_to_dest_dynamic_ext(parcial, pasta_saida / nome_base, prefer_exts=(".zip", ".xml", ".pdf"))
+
+def baixar_xmls_http(sessao: requests.Session, competencia: str, cliente_id: str, pasta_saida: Path,
+                     servicos: List[str]) -> None:
+    """Exporta os XMLs sem renderizar a página; tira de `servicos` cada serviço concluído."""
+    form = FormularioJSF(sessao, URL_XML_EXPORT)
+    for campo in ("j_idt92:j_idt109:idStart_input", "j_idt92:j_idt109:idEnd_input"):
+        form.definir(campo, "")          # Emissão em branco
+    for campo in ("j_idt92:j_idt96:idStart_input", "j_idt92:j_idt96:idEnd_input"):
+        form.definir(campo, _fmt_comp(competencia))
+    while servicos:
+        _gerar_xml_http(form, pasta_saida, cliente_id, competencia, servicos[0])
+        servicos.pop(0)
+
 def baixar_xmls(pagina: Page, competencia: str, cliente_id: str, config_geral: Dict,
                 perfil_dir: Path, downloads_tmp_dir: Path):
     log_info(f"Iniciando processo de XML para a competência: {competencia}")
-    pagina.goto(URL_XML_EXPORT, wait_until="domcontentloaded")
+    pasta_saida = Path(config_geral.get("pasta_saida_padrao") or "downloads") / cliente_id
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+
+    # Emitidas (Prestados) + Cancelada; Recebidas (Tomados) + Cancelada
+    servicos = ["Emitidas", "Recebidas"]
+    if gestor_config.get_bool(config_geral, 'sjc_xml_http'):
+        try:
+            baixar_xmls_http(criar_sessao_http(pagina), competencia, cliente_id, pasta_saida, servicos)
+            log_info("XML finalizado (HTTP).")
+            return
+        except FluxoHTTPIndisponivel as e:
+            log_info(f"Exportação de XML por HTTP indisponível ({e}). Usando o navegador.")
+
+    controle_hosts.navegar(pagina, URL_XML_EXPORT, wait_until="domcontentloaded")
     _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS); _esperar_ajax_quieto(pagina, 700)
 
     # 1) Limpar "Emissão"
@@ -776,11 +989,7 @@ def baixar_xmls(pagina: Page, competencia: str, cliente_id: str, config_geral: D
     # 2) Competência
     preencher_competencia_xml(pagina, competencia)
 
-    pasta_saida = Path(config_geral.get("pasta_saida_padrao") or "downloads") / cliente_id
-    pasta_saida.mkdir(parents=True, exist_ok=True)
-
-    # Emitidas (Prestados) + Cancelada; Recebidas (Tomados) + Cancelada
-    for servico in ("Emitidas", "Recebidas"):
+    for servico in servicos:
         gerar_xml_combined(
             pagina, pasta_saida, cliente_id, competencia,
             servico_label=servico, perfil_dir=perfil_dir, downloads_tmp_dir=downloads_tmp_dir
@@ -794,7 +1003,7 @@ def baixar_xmls(pagina: Page, competencia: str, cliente_id: str, config_geral: D
 def baixar_livros_fiscais(pagina: Page, competencia: str, cliente_id: str, config_geral: Dict,
                           perfil_dir: Path, downloads_tmp_dir: Path):
     log_info(f"Iniciando processo de download dos livros para a competência: {competencia}")
-    pagina.goto(URL_LIVROS_FISCAIS, wait_until="domcontentloaded")
+    controle_hosts.navegar(pagina, URL_LIVROS_FISCAIS, wait_until="domcontentloaded")
     _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS)
     _esperar_ajax_quieto(pagina, 700)
 
@@ -817,31 +1026,16 @@ def baixar_livros_fiscais(pagina: Page, competencia: str, cliente_id: str, confi
     gerar_relatorio_livro(pagina, pasta_saida, cliente_id, competencia, "Tomados", "Cancelada", perfil_dir, downloads_tmp_dir)
 
 def limpar_emissao_talao(pagina: Page):
-    alvos = [
-        pagina.locator("#j_idt92\\:j_idt109\\:idStart_input"),
-        pagina.locator("#j_idt92\\:j_idt109\\:idEnd_input"),
-        pagina.locator("fieldset:has(legend:has-text('Emissão')) input").nth(0),
-        pagina.locator("fieldset:has(legend:has-text('Emissão')) input").nth(1),
-    ]
-    for loc in alvos:
-        try:
-            if loc and loc.count() > 0:
-                el = loc.first
-                el.scroll_into_view_if_needed()
-                el.wait_for(state="visible", timeout=1500)
-                el.click()
-                try: el.clear()
-                except Exception:
-                    el.press("Control+A"); el.press("Delete")
-                pagina.wait_for_timeout(40)
-        except Exception:
-            continue
-    _esperar_ajax_quieto(pagina, 400)
+    _limpar_campos(pagina, {
+        "inicio":   instantaneo_dom.consulta(css="[id='j_idt92:j_idt109:idStart_input']", limite=1),
+        "fim":      instantaneo_dom.consulta(css="[id='j_idt92:j_idt109:idEnd_input']", limite=1),
+        "fieldset": instantaneo_dom.consulta(xpath="//fieldset[legend[contains(., 'Emissão')]]//input", limite=2),
+    })
 
 def baixar_talao_fiscal(pagina: Page, competencia: str, cliente_id: str, config_geral: Dict,
                         perfil_dir: Path, downloads_tmp_dir: Path):
     log_info(f"Iniciando processo de TALÃO FISCAL para a competência: {competencia}")
-    pagina.goto(URL_TALAO_FISCAL, wait_until="domcontentloaded")
+    controle_hosts.navegar(pagina, URL_TALAO_FISCAL, wait_until="domcontentloaded")
     _esperar_overlay_sumir(pagina, CLICK_WAIT_OVERLAY_MS)
     _esperar_ajax_quieto(pagina, 700)
 
@@ -865,87 +1059,179 @@ def baixar_talao_fiscal(pagina: Page, competencia: str, cliente_id: str, config_
 # Principal
 # =========================
 
-def executar_captura_sjc(clientes: List[Dict], config_geral: Dict, competencia: str, headful: bool, status_obj: Optional[Dict] = None):
-    log_info("--- INICIANDO ROTINA PARA SÃO JOSÉ DOS CAMPOS ---")
-    if not clientes: return
+@contextmanager
+def _contexto_sjc(config_geral: Dict, headful: bool, perfil_dir: Path, downloads_dir: Path):
+    """Contexto do navegador do pool (quando a thread está numa tarefa dele) ou um persistente próprio.
 
-    c0 = clientes[0]
-    usuario = c0.get("sjc_usuario")
-    senha   = c0.get("sjc_senha")
-    if not all([usuario, senha]):
-        log_error("O primeiro cliente não possui 'sjc_usuario' ou 'sjc_senha'.")
+    Produz (contexto, pasta onde o navegador grava os downloads).
+    """
+    nav = pool_navegadores.atual()
+    if nav is not None:
+        contexto = nav.novo_contexto(locale="pt-BR", timezone_id="America/Sao_Paulo")
+        try:
+            yield contexto, Path(nav.pasta_downloads)
+        finally:
+            contexto.close()
         return
 
-    downloads_tmp_dir = Path(config_geral.get("downloads_tmp_dir") or r"C:\AUTOMA-O-TESTE\APP-CAPTADOR-1.0\.playwright\sjc_downloads").resolve()
+    with sync_playwright() as p:
+        with perfil_enxuto.contexto_persistente(
+            p, perfil_dir, "sjc", config_geral,
+            headless=not headful,
+            accept_downloads=True,
+            downloads_path=str(downloads_dir),  # se versão suportar
+            locale="pt-BR",
+            timezone_id="America/Sao_Paulo",
+        ) as contexto:
+            yield contexto, downloads_dir
+        log_info("Navegador fechado.")
+
+@contextmanager
+def _sessao_sjc(config_geral: Dict, headful: bool, indice: int, usuario: str, senha: str,
+                perfil_dir: Path, downloads_tmp_dir: Path):
+    """Página logada da thread atual; produz (pagina, pasta de downloads).
+
+    A empresa selecionada fica na sessão do portal, então cada contexto tem
+    login, perfil e pasta de downloads próprios: um download nunca é
+    confundido com o de outro cliente.
+    """
+    if indice > 0:
+        perfil_dir = perfil_dir.with_name(f"{perfil_dir.name}_{indice}")
+        downloads_tmp_dir = downloads_tmp_dir / f"contexto_{indice}"
+    perfil_dir.mkdir(parents=True, exist_ok=True)
     downloads_tmp_dir.mkdir(parents=True, exist_ok=True)
+    chave_sessao = usuario if indice == 0 else f"{usuario}#{indice}"
+    reutilizar = gestor_config.get_bool(config_geral, 'sessoes_reutilizar')
 
-    with sync_playwright() as p:
-        contexto = None
-        try:
-            perfil_dir = Path(config_geral.get("perfil_sjc_dir", ".playwright/sjc")).resolve()
-            perfil_dir.mkdir(parents=True, exist_ok=True)
+    with _contexto_sjc(config_geral, headful, perfil_dir, downloads_tmp_dir) as (contexto, pasta_downloads):
+        bloqueio_recursos.aplicar(contexto, "sjc", config_geral)
+        monitor_ociosidade.instalar(contexto)
 
-            try:
-                contexto = p.chromium.launch_persistent_context(
-                    str(perfil_dir),
-                    headless=not headful,
-                    accept_downloads=True,
-                    downloads_path=str(downloads_tmp_dir),  # se versão suportar
-                    locale="pt-BR",
-                    timezone_id="America/Sao_Paulo",
-                )
-            except TypeError:
-                contexto = p.chromium.launch_persistent_context(
-                    str(perfil_dir),
-                    headless=not headful,
-                    accept_downloads=True,
-                    locale="pt-BR",
-                    timezone_id="America/Sao_Paulo",
-                )
+        sessao_reaproveitada = reutilizar and sessoes_portal.restaurar(
+            contexto, "sjc", chave_sessao, URL_SELECIONA_CADASTRO, _sessao_sjc_valida,
+            gestor_config.get_float(config_geral, 'sessoes_ttl_min'))
 
+        if not sessao_reaproveitada:
             try: _limpar_sessao(contexto)
             except Exception: pass
 
-            pagina = contexto.new_page()
+        pagina = contexto.new_page()
+        controle_hosts.observar_pagina(pagina)
 
-            # LOGIN
+        # LOGIN
+        if not sessao_reaproveitada:
             login_sjc(pagina, usuario, senha)
+            if reutilizar:
+                sessoes_portal.guardar(contexto, "sjc", chave_sessao)
+
+        yield pagina, pasta_downloads
 
-            for i, cli in enumerate(clientes):
-                log_info(f"--- Processando cliente {i+1}/{len(clientes)}: ID {cli.get('id')} ---")
-                if i > 0:
-                    pagina.goto(URL_SELECIONA_CADASTRO, wait_until="domcontentloaded")
-                selecionar_empresa(pagina, cli.get("cnpj"))
-
-                try:
-                    # LIVROS
-                    baixar_livros_fiscais(
-                        pagina, competencia, cli.get('id'), config_geral,
-                        perfil_dir=perfil_dir, downloads_tmp_dir=downloads_tmp_dir
-                    )
-                    # TALÃO (Emitidas/Recebidas; Ativa+Cancelada)
-                    baixar_talao_fiscal(
-                        pagina, competencia, cli.get('id'), config_geral,
-                        perfil_dir=perfil_dir, downloads_tmp_dir=downloads_tmp_dir
-                    )
-                    # XML (Emitidas/Recebidas; Ativa+Cancelada) — página nova
-                    baixar_xmls(
-                        pagina, competencia, cli.get('id'), config_geral,
-                        perfil_dir=perfil_dir, downloads_tmp_dir=downloads_tmp_dir
-                    )
-                except Exception as e:
-                    log_error(f"Falha no processamento de {cli.get('id')}: {e}")
-
-                log_info(f"Processamento do cliente {cli.get('id')} finalizado.")
-
-            log_info("--- TODOS OS CLIENTES FORAM PROCESSADOS ---")
+        if reutilizar:
+            sessoes_portal.guardar(contexto, "sjc", chave_sessao)
 
+def _processar_cliente_sjc(pagina: Page, cli: Dict, config_geral: Dict, lista_competencias: List[str],
+                           perfil_dir: Path, downloads_tmp_dir: Path,
+                           indice: Optional[IndiceEmpresas] = None):
+    # Empresa selecionada uma vez; as competências seguem na mesma sessão
+    selecionar_empresa(pagina, cli.get("cnpj"), indice)
+
+    falhas: Dict[str, str] = {}
+    for competencia in lista_competencias:
+        try:
+            # LIVROS
+            baixar_livros_fiscais(
+                pagina, competencia, cli.get('id'), config_geral,
+                perfil_dir=perfil_dir, downloads_tmp_dir=downloads_tmp_dir
+            )
+            # TALÃO (Emitidas/Recebidas; Ativa+Cancelada)
+            baixar_talao_fiscal(
+                pagina, competencia, cli.get('id'), config_geral,
+                perfil_dir=perfil_dir, downloads_tmp_dir=downloads_tmp_dir
+            )
+            # XML (Emitidas/Recebidas; Ativa+Cancelada) — página nova
+            baixar_xmls(
+                pagina, competencia, cli.get('id'), config_geral,
+                perfil_dir=perfil_dir, downloads_tmp_dir=downloads_tmp_dir
+            )
         except Exception as e:
-            log_error(f"ERRO CRÍTICO na rotina de São José dos Campos: {e}")
-        finally:
-            if contexto:
-                contexto.close()
-                log_info("Navegador fechado.")
+            log_error(f"Falha em {cli.get('id')} na competência {competencia}: {e}")
+            falhas[competencia] = str(e)
+
+    if falhas:
+        raise Exception("; ".join(f"{comp}: {erro}" for comp, erro in sorted(falhas.items())))
+
+def executar_captura_sjc(clientes: List[Dict], config_geral: Dict, competencia: Union[str, List[str]], headful: bool, status_obj: Optional[Dict] = None):
+    """`competencia` aceita uma competência, uma lista ou um intervalo 'AAAA-MM..AAAA-MM'."""
+    log_info("--- INICIANDO ROTINA PARA SÃO JOSÉ DOS CAMPOS ---")
+    if not clientes: return
+    lista_competencias = competencias.expandir_competencias(competencia)
+    log_info(f"Competência: {competencias.descrever(lista_competencias)}.")
+
+    c0 = clientes[0]
+    usuario = c0.get("sjc_usuario")
+    senha   = c0.get("sjc_senha")
+    if not all([usuario, senha]):
+        log_error("O primeiro cliente não possui 'sjc_usuario' ou 'sjc_senha'.")
+        return
+
+    downloads_tmp_dir = Path(config_geral.get("downloads_tmp_dir") or r"C:\AUTOMA-O-TESTE\APP-CAPTADOR-1.0\.playwright\sjc_downloads").resolve()
+    perfil_dir = Path(config_geral.get("perfil_sjc_dir", ".playwright/sjc")).resolve()
+    num_contextos = max(1, min(gestor_config.get_int(config_geral, 'sjc_contextos'), len(clientes)))
+    pool = pool_navegadores.obter()
+    if pool is not None:
+        # Cada contexto ocupa um navegador do pool; além disso só haveria logins sem fila para consumir
+        num_contextos = min(num_contextos, pool.tamanho)
+
+    indice = None
+    if gestor_config.get_bool(config_geral, 'sjc_indice_empresas'):
+        indice = IndiceEmpresas(usuario, gestor_config.get_float(config_geral, 'sjc_indice_empresas_ttl_min'))
+
+    lock = threading.Lock()
+    progresso_clientes: Dict[str, Dict] = {str(c.get('id')): {"estado": "pendente"} for c in clientes}
+    if status_obj is not None:
+        status_obj['sjc'] = progresso_clientes
+    contagem = {"iniciados": 0}
+
+    def _processar(recurso, cli: Dict):
+        pagina, pasta_downloads = recurso
+        id_cliente = str(cli.get('id'))
+        with lock:
+            contagem["iniciados"] += 1
+            log_info(f"--- Processando cliente {contagem['iniciados']}/{len(clientes)}: ID {id_cliente} ---")
+            progresso_clientes[id_cliente]["estado"] = "executando"
+        try:
+            _processar_cliente_sjc(pagina, cli, config_geral, lista_competencias, perfil_dir, pasta_downloads, indice)
+            with lock:
+                progresso_clientes[id_cliente]["estado"] = "concluido"
+        except Exception as e:
+            log_error(f"Falha no processamento de {id_cliente}: {e}")
+            with lock:
+                progresso_clientes[id_cliente]["estado"] = "erro"
+                progresso_clientes[id_cliente]["erro"] = str(e)
+
+        nav = pool_navegadores.atual()
+        if nav is not None:
+            nav.registrar_clientes()
+        log_info(f"Processamento do cliente {id_cliente} finalizado.")
+
+    resultado = fila_trabalho.executar(
+        clientes, num_contextos,
+        abrir_recurso=lambda indice: _sessao_sjc(config_geral, headful, indice, usuario, senha,
+                                                 perfil_dir, downloads_tmp_dir),
+        processar=_processar, nome="sjc",
+        envolver_worker=pool_navegadores.envolvedor(headless=not headful),
+        renovar_recurso=pool_navegadores.deve_renovar)
+
+    if resultado.pendentes:
+        motivo = resultado.erros_workers[-1] if resultado.erros_workers else "navegadores encerrados"
+        for cli in resultado.pendentes:
+            progresso_clientes[str(cli.get('id'))]["estado"] = "erro"
+        log_error(f"ERRO CRÍTICO na rotina de São José dos Campos: {motivo}")
+        return
+
+    bloqueio_recursos.registrar_resumo("sjc")
+    monitor_ociosidade.registrar_resumo("sjc")
+    log_info("--- TODOS OS CLIENTES FORAM PROCESSADOS ---")
 
 # --- Execução direta (teste) ---
 if __name__ == "__main__":
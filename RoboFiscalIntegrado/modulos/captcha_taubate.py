@@ -0,0 +1,218 @@
+#--------------------------------------------------------------------------
+# modulos/captcha_taubate.py - v1.1 CAPTCHA DO PORTAL DO CONTADOR (TAUBATÉ)
+# Classificador de dígitos em processo: segmenta a imagem por colunas,
+# normaliza cada dígito e compara por vizinho mais próximo (distância de
+# Hamming) com modelos aprendidos dos captchas que levaram a um login bem-
+# sucedido. Com confiança baixa, cai para o Tesseract; o mesmo enquanto algum
+# dígito ainda não tem modelo ou o glifo está longe de todos os modelos.
+#--------------------------------------------------------------------------
+import io
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+from modulos.logger import log_info, log_error
+
+try:
+    import pytesseract
+    try:
+        pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    except Exception:
+        print("AVISO: Tesseract OCR não encontrado no caminho padrão.")
+except ImportError:
+    pytesseract = None
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELOS_PATH = os.path.join(SCRIPT_DIR, "dados", "captcha_taubate.json")
+
+LIMIAR_ESCURO      = 128
+LARGURA_GLIFO      = 10
+ALTURA_GLIFO       = 14
+MODELOS_POR_DIGITO = 40
+CONFIANCA_MINIMA   = 0.25
+DISTANCIA_MAXIMA   = 10      # bits diferentes (de 140) para o glifo ainda valer como o dígito do modelo
+DIGITOS            = "0123456789"
+TESSERACT_CONFIG   = '--psm 8 -c tessedit_char_whitelist=0123456789'
+
+@dataclass
+class ResultadoCaptcha:
+    texto: str
+    confianca: float
+    metodo: str                      # "modelos" ou "tesseract"
+    glifos: List[int] = field(default_factory=list)
+
+# --- Imagem -> glifos ---
+
+def binarizar(imagem_bytes: bytes) -> Image.Image:
+    """Tons de cinza com limiar fixo (o mesmo pré-processamento usado antes com o Tesseract)."""
+    img = Image.open(io.BytesIO(imagem_bytes)).convert('L')
+    lut = [0] * LIMIAR_ESCURO + [255] * (256 - LIMIAR_ESCURO)
+    return img.point(lut, '1')
+
+def _matriz_tinta(img: Image.Image) -> List[List[bool]]:
+    largura, altura = img.size
+    px = img.convert('L').load()
+    tinta = [[px[x, y] < LIMIAR_ESCURO for x in range(largura)] for y in range(altura)]
+    # Captcha com fundo escuro: inverte para que a "tinta" seja sempre o dígito
+    if sum(map(sum, tinta)) > (largura * altura) / 2:
+        tinta = [[not v for v in linha] for linha in tinta]
+    return tinta
+
+def segmentar(img: Image.Image) -> List[Tuple[int, int]]:
+    """Intervalos de colunas [x0, x1) de cada dígito, pela projeção vertical da tinta."""
+    tinta = _matriz_tinta(img)
+    altura, largura = len(tinta), len(tinta[0]) if tinta else 0
+    colunas = [sum(tinta[y][x] for y in range(altura)) for x in range(largura)]
+    corridas, inicio = [], None
+    for x, total in enumerate(colunas + [0]):
+        if total >= 2 and inicio is None:
+            inicio = x
+        elif total < 2 and inicio is not None:
+            if x - inicio >= 2 and sum(colunas[inicio:x]) >= 6:
+                corridas.append((inicio, x))
+            inicio = None
+    if not corridas:
+        return []
+    # Dígitos encostados viram uma corrida larga: divide pela largura mediana
+    larguras = sorted(x1 - x0 for x0, x1 in corridas)
+    mediana = larguras[len(larguras) // 2]
+    segmentos = []
+    for x0, x1 in corridas:
+        partes = round((x1 - x0) / mediana) if mediana and (x1 - x0) > 1.6 * mediana else 1
+        passo = (x1 - x0) / partes
+        segmentos.extend((int(x0 + i * passo), int(x0 + (i + 1) * passo)) for i in range(partes))
+    return segmentos
+
+def _normalizar(tinta: List[List[bool]], x0: int, x1: int) -> int:
+    linhas = [y for y, linha in enumerate(tinta) if any(linha[x0:x1])]
+    y0, y1 = (linhas[0], linhas[-1] + 1) if linhas else (0, len(tinta))
+    recorte = Image.new('L', (x1 - x0, y1 - y0), 255)
+    px = recorte.load()
+    for y in range(y0, y1):
+        for x in range(x0, x1):
+            if tinta[y][x]:
+                px[x - x0, y - y0] = 0
+    recorte = recorte.resize((LARGURA_GLIFO, ALTURA_GLIFO), Image.BILINEAR)
+    bits = 0
+    for valor in recorte.tobytes():
+        bits = (bits << 1) | (1 if valor < LIMIAR_ESCURO else 0)
+    return bits
+
+def extrair_glifos(imagem_bytes: bytes) -> List[int]:
+    img = binarizar(imagem_bytes)
+    tinta = _matriz_tinta(img)
+    return [_normalizar(tinta, x0, x1) for x0, x1 in segmentar(img)]
+
+# --- Modelos (vizinho mais próximo) ---
+
+class SolucionadorCaptcha:
+    def __init__(self, caminho: str = MODELOS_PATH):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._modelos: Dict[str, List[int]] = {}
+        self._carregar()
+
+    def _carregar(self):
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+            self._modelos = {d: [int(b, 2) for b in bits] for d, bits in dados.get("modelos", {}).items()}
+        except (OSError, ValueError):
+            self._modelos = {}
+
+    def _salvar(self):
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        dados = {"largura": LARGURA_GLIFO, "altura": ALTURA_GLIFO,
+                 "modelos": {d: [format(b, f"0{LARGURA_GLIFO * ALTURA_GLIFO}b") for b in bits] for d, bits in self._modelos.items()}}
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dados, f)
+        os.replace(temporario, self.caminho)
+
+    @property
+    def total_modelos(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._modelos.values())
+
+    def classificar(self, glifo: int) -> Tuple[str, float]:
+        """Dígito mais próximo e confiança (margem relativa para o melhor dígito concorrente).
+
+        Confiança 0 enquanto algum dígito não tem modelo (o certo pode ser justamente ele)
+        ou se o mais próximo está a mais de DISTANCIA_MAXIMA bits.
+        """
+        total_bits = LARGURA_GLIFO * ALTURA_GLIFO
+        with self._lock:
+            distancias = {d: min(bin(glifo ^ m).count("1") for m in modelos) for d, modelos in self._modelos.items() if modelos}
+        if not distancias:
+            return "", 0.0
+        ordem = sorted(distancias.items(), key=lambda kv: kv[1])
+        digito, melhor = ordem[0]
+        if len(distancias) < len(DIGITOS) or melhor > DISTANCIA_MAXIMA:
+            return digito, 0.0
+        segunda = ordem[1][1] if len(ordem) > 1 else total_bits
+        return digito, max(0.0, (segunda - melhor) / max(segunda, 1))
+
+    def resolver(self, imagem_bytes: bytes, confianca_minima: float = CONFIANCA_MINIMA) -> ResultadoCaptcha:
+        glifos = extrair_glifos(imagem_bytes)
+        classificados = [self.classificar(g) for g in glifos]
+        texto = "".join(d for d, _ in classificados)
+        confianca = min((c for _, c in classificados), default=0.0)
+        if texto and len(texto) == len(glifos) and confianca >= confianca_minima:
+            return ResultadoCaptcha(texto, confianca, "modelos", glifos)
+
+        texto_ocr = _tesseract(imagem_bytes)
+        if texto_ocr:
+            return ResultadoCaptcha(texto_ocr, confianca, "tesseract", glifos)
+        return ResultadoCaptcha(texto, confianca, "modelos", glifos)
+
+    def treinar(self, resultado: ResultadoCaptcha) -> bool:
+        """Aprende os glifos de um captcha que levou a login bem-sucedido."""
+        if not resultado.texto or len(resultado.texto) != len(resultado.glifos):
+            return False
+        with self._lock:
+            for digito, glifo in zip(resultado.texto, resultado.glifos):
+                modelos = self._modelos.setdefault(digito, [])
+                if glifo not in modelos:
+                    modelos.append(glifo)
+                    del modelos[:-MODELOS_POR_DIGITO]
+            try:
+                self._salvar()
+            except OSError as e:
+                log_error(f"Não foi possível gravar os modelos do captcha: {e}")
+        return True
+
+def _tesseract(imagem_bytes: bytes) -> str:
+    if pytesseract is None:
+        return ""
+    try:
+        texto = pytesseract.image_to_string(binarizar(imagem_bytes), config=TESSERACT_CONFIG)
+    except Exception as e:
+        log_error(f"Falha ao executar o Tesseract: {e}")
+        return ""
+    return "".join(c for c in texto if c.isdigit())
+
+# --- Serviço compartilhado ---
+
+_lock = threading.Lock()
+_solucionador: Optional[SolucionadorCaptcha] = None
+# OCR fora da thread do navegador: a imagem é resolvida enquanto o formulário é preenchido
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="captcha")
+
+def obter_solucionador() -> SolucionadorCaptcha:
+    global _solucionador
+    with _lock:
+        if _solucionador is None:
+            _solucionador = SolucionadorCaptcha()
+            log_info(f"Modelos de captcha carregados: {_solucionador.total_modelos}.")
+        return _solucionador
+
+def resolver_em_segundo_plano(imagem_bytes: bytes, confianca_minima: float = CONFIANCA_MINIMA) -> "Future[ResultadoCaptcha]":
+    return _executor.submit(obter_solucionador().resolver, imagem_bytes, confianca_minima)
+
+def registrar_sucesso(resultado: ResultadoCaptcha) -> None:
+    if obter_solucionador().treinar(resultado):
+        log_info(f"Captcha '{resultado.texto}' ({resultado.metodo}) aprendido para os próximos logins.")
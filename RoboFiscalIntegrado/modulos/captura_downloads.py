@@ -0,0 +1,190 @@
+#--------------------------------------------------------------------------
+# modulos/captura_downloads.py - v1.0 CAPTURA DE DOWNLOADS POR EVENTO
+# Arma a espera antes do clique e devolve o arquivo assim que ele termina:
+# primeiro pelo evento "download" do Playwright (inclusive em popups), e
+# como reserva por inotify na pasta de downloads do navegador (o arquivo
+# conta quando a escrita é fechada). Fora do Linux, a reserva varre só essa
+# pasta, sem globs recursivos no perfil.
+#--------------------------------------------------------------------------
+import ctypes
+import ctypes.util
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from modulos.logger import log_info, log_error
+
+PASSO_MS = 50
+SUFIXOS_TEMPORARIOS = (".crdownload", ".tmp", ".part", ".download")
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+_EVENTO = struct.Struct("iIII")
+
+def _temporario(nome: str) -> bool:
+    return nome.startswith(".") or nome.lower().endswith(SUFIXOS_TEMPORARIOS) or ".com.google.Chrome." in nome
+
+def _libc():
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        return libc if hasattr(libc, "inotify_init1") else None
+    except OSError:
+        return None
+
+class ObservadorInotify:
+    """Arquivos fechados após escrita (ou movidos para) a pasta, lidos sem bloquear do inotify."""
+    def __init__(self, pasta: Path, libc):
+        self.pasta = Path(pasta)
+        self._libc = libc
+        self._fd = -1
+        self._prontos: List[Path] = []
+
+    def iniciar(self) -> None:
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        if self._libc.inotify_add_watch(fd, os.fsencode(str(self.pasta)), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            erro = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(erro, f"inotify_add_watch falhou em {self.pasta}")
+        self._fd = fd
+
+    def _ler(self) -> None:
+        while True:
+            try:
+                dados = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            pos = 0
+            while pos + _EVENTO.size <= len(dados):
+                _, _, _, tamanho = _EVENTO.unpack_from(dados, pos)
+                nome = dados[pos + _EVENTO.size: pos + _EVENTO.size + tamanho].rstrip(b"\0")
+                pos += _EVENTO.size + tamanho
+                if nome and not _temporario(os.fsdecode(nome)):
+                    self._prontos.append(self.pasta / os.fsdecode(nome))
+
+    def proximo(self) -> Optional[Path]:
+        self._ler()
+        while self._prontos:
+            caminho = self._prontos.pop(0)
+            try:
+                if caminho.stat().st_size > 0:
+                    return caminho
+            except OSError:
+                continue      # já renomeado/removido pelo navegador
+        return None
+
+    def parar(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+class ObservadorVarredura:
+    """Reserva sem inotify: lista só a pasta de downloads e aceita arquivo novo de tamanho estável."""
+    def __init__(self, pasta: Path):
+        self.pasta = Path(pasta)
+        self._existentes: Set[str] = set()
+        self._tamanhos: Dict[str, int] = {}
+
+    def _listar(self):
+        try:
+            return [e for e in os.scandir(self.pasta) if e.is_file()]
+        except OSError:
+            return []
+
+    def iniciar(self) -> None:
+        self._existentes = {e.name for e in self._listar()}
+
+    def proximo(self) -> Optional[Path]:
+        for entrada in self._listar():
+            if entrada.name in self._existentes or _temporario(entrada.name):
+                continue
+            try:
+                tamanho = entrada.stat().st_size
+            except OSError:
+                continue
+            if tamanho > 0 and self._tamanhos.get(entrada.name) == tamanho:
+                return Path(entrada.path)
+            self._tamanhos[entrada.name] = tamanho
+        return None
+
+    def parar(self) -> None:
+        pass
+
+def criar_observador(pasta: Path):
+    libc = _libc()
+    if libc is not None:
+        observador = ObservadorInotify(pasta, libc)
+        try:
+            observador.iniciar()
+            return observador
+        except OSError as e:
+            log_info(f"inotify indisponível ({e}); usando varredura da pasta de downloads.")
+    observador = ObservadorVarredura(pasta)
+    observador.iniciar()
+    return observador
+
+class EsperaDownload:
+    """Uso:
+        with EsperaDownload(pagina, pasta) as espera:
+            clicar(...)
+            arquivo = espera.resultado(timeout_ms)
+    """
+    def __init__(self, pagina, pasta: Path):
+        self.pagina = pagina
+        self.pasta = Path(pasta)
+        self._downloads: List = []
+        self._ao_baixar = self._downloads.append     # mesma referência para on/remove_listener
+        self._observador = None
+        self._paginas: List = []
+
+    def _registrar_pagina(self, pagina) -> None:
+        pagina.on("download", self._ao_baixar)
+        self._paginas.append(pagina)
+
+    def __enter__(self) -> "EsperaDownload":
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        self._observador = criar_observador(self.pasta)
+        self._registrar_pagina(self.pagina)
+        # Downloads abertos em popup chegam pela página nova
+        self.pagina.context.on("page", self._registrar_pagina)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for pagina in self._paginas:
+            try:
+                pagina.remove_listener("download", self._ao_baixar)
+            except Exception:
+                pass
+        try:
+            self.pagina.context.remove_listener("page", self._registrar_pagina)
+        except Exception:
+            pass
+        if self._observador is not None:
+            self._observador.parar()
+
+    def resultado(self, timeout_ms: int) -> Optional[Path]:
+        """Arquivo concluído, ou None se nada chegou em `timeout_ms`."""
+        limite = time.monotonic() + timeout_ms / 1000
+        while True:
+            while self._downloads:
+                download = self._downloads[0]
+                falha = download.failure()        # bloqueia até o download terminar
+                if falha is None:
+                    return Path(download.path())
+                log_error(f"Download '{download.suggested_filename}' falhou: {falha}")
+                self._downloads.pop(0)
+            arquivo = self._observador.proximo()
+            if arquivo is not None:
+                return arquivo
+            restante_ms = (limite - time.monotonic()) * 1000
+            if restante_ms <= 0:
+                return None
+            # Espera curta dentro do Playwright: é ela que entrega os eventos de download
+            self.pagina.wait_for_timeout(min(PASSO_MS, restante_ms))
@@ -1,19 +1,25 @@
 #--------------------------------------------------------------------------
-# modulos/capturador_nf_taubate.py - v12.0 A LÓGICA CORRETA
-# Usa uma sessão de requests 100% limpa e separada para baixar o PDF,
-# exatamente como no script de referência que já funcionava.
+# modulos/capturador_nf_taubate.py - v12.7 CAPTURA EM ESTÁGIOS (PIPELINE) E INCREMENTAL
+# Os PDFs saem pelo downloader compartilhado (modulos/downloader_pdf.py),
+# com uma sessão limpa por nota sobre o mesmo pool de conexões.
 #--------------------------------------------------------------------------
 import os
 import re
 import sys
-import time
 import html
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import requests
 from lxml import etree
-from typing import Dict, List, Optional
-from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+from datetime import date, timedelta
 from modulos.logger import log_info, log_error
+from modulos import controle_hosts, cache_certificados, indice_notas, downloader_pdf, hedge_requisicoes
+from modulos.pipeline_captura import Pipeline, ControlePaginacao
+from modulos.planejador_periodos import PlanejadorPeriodos
+import gestor_config
 from urllib.parse import urljoin
 
 try:
@@ -24,7 +30,15 @@ except ImportError:
 ABRASF_NS  = "http://www.abrasf.org.br/nfse.xsd"
 SOAP_NS    = "http://schemas.xmlsoap.org/soap/envelope/"
 TNAMESPACE = "https://abrasftaubate.meumunicipio.online/ws/nfs"
-ENDPOINT   = "https://abrasftaubate.meumunicipio.online/ws/nfs"
+# Endereços sobrescrevíveis por ambiente (ex.: benchmarks/servidor_simulado.py)
+ENDPOINT    = os.getenv("TAUBATE_ABRASF_ENDPOINT", "https://abrasftaubate.meumunicipio.online/ws/nfs")
+NFE_VER_URL = os.getenv("TAUBATE_NFE_VER_URL", "https://taubateiss.meumunicipio.digital/taubateiss/contribuinte/nfe/nfe_ver.php")
+
+TAMANHO_PAGINA      = 50   # o webservice devolve no máximo 50 CompNfse por página
+CHUNK_PARSER        = 8 * 1024   # caracteres entregues por vez ao parser; bem abaixo de uma página (~95 KB)
+_RE_DECLARACAO_XML  = re.compile(r'^\s*<\?xml[^>]*\?>')
+_RE_OUTPUT_INICIO   = re.compile(r'<(?:[\w.-]+:)?outputXML\b[^>]*?(/?)>')
+_RE_OUTPUT_FIM      = re.compile(r'</(?:[\w.-]+:)?outputXML\s*>')
 
 class CapturadorTaubate:
     def __init__(self, cliente_info: Dict, config_geral: Dict):
@@ -34,29 +48,53 @@ class CapturadorTaubate:
         self.im = cliente_info['ccm']
         self.pfx_path = cliente_info.get('pfx_path') or config_geral.get('pfx_padrao_path')
         self.pfx_pwd = cliente_info.get('pfx_pwd') or config_geral.get('pfx_padrao_pwd')
+        self.config_geral = config_geral
         self.timeout = 90
-        # Sessão exclusiva para as chamadas SOAP com certificado
-        self.soap_session = requests.Session()
-        if self.pfx_path and self.pfx_pwd:
-            try:
-                adapter = Pkcs12Adapter(pkcs12_filename=self.pfx_path, pkcs12_password=self.pfx_pwd.encode('utf-8'))
-                self.soap_session.mount(ENDPOINT, adapter)
-            except Exception as e:
-                raise Exception(f"Falha ao carregar o certificado PFX '{self.pfx_path}': {e}")
+        # Sessão SOAP compartilhada por certificado (PFX decifrado uma vez, conexões TLS reaproveitadas),
+        # reservada até fechar() para o despejo por inatividade não fechá-la no meio de uma captura longa
+        try:
+            self.soap_session = cache_certificados.reservar_sessao(
+                self.pfx_path, self.pfx_pwd,
+                pool_maxsize=gestor_config.get_int(config_geral, 'captura_max_por_host'),
+                max_entradas=gestor_config.get_int(config_geral, 'cert_cache_max'),
+                ttl_ocioso_s=60 * gestor_config.get_int(config_geral, 'cert_cache_ttl_min'))
+        except Exception as e:
+            raise Exception(f"Falha ao carregar o certificado PFX '{self.pfx_path}': {e}")
         self.headers = {"Content-Type": "text/xml; charset=utf-8"}
 
+    def fechar(self) -> None:
+        cache_certificados.liberar_sessao(self.soap_session)
+
     def _build_soap_envelope(self, operation: str, body_xml: str) -> str:
         cabec_msg = f'<cabecalho versao="2.04" xmlns="{ABRASF_NS}"><versaoDados>2.04</versaoDados></cabecalho>'
         soap_body = f'<tns:{operation}Request xmlns:tns="{TNAMESPACE}"><tns:nfseCabecMsg><![CDATA[{cabec_msg}]]></tns:nfseCabecMsg><tns:nfseDadosMsg><![CDATA[{body_xml}]]></tns:nfseDadosMsg></tns:{operation}Request>'
         return f'<soapenv:Envelope xmlns:soapenv="{SOAP_NS}"><soapenv:Body>{soap_body}</soapenv:Body></soapenv:Envelope>'
 
-    def _send_request(self, operation: str, body_xml: str) -> str:
-        self.headers["SOAPAction"] = f"nfs#{operation}"
-        envelope = self._build_soap_envelope(operation, body_xml)
-        response = self.soap_session.post(ENDPOINT, data=envelope.encode('utf-8'), headers=self.headers, timeout=self.timeout)
+    def _post(self, envelope: bytes, headers: Dict, tentativa: Optional[hedge_requisicoes.Tentativa] = None) -> str:
+        with controle_hosts.slot(ENDPOINT) as medicao:
+            if tentativa is not None:
+                tentativa.iniciar()     # o relógio do hedge só conta a rede, não a fila do governador
+            try:
+                response = self.soap_session.post(ENDPOINT, data=envelope, headers=headers, timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                # Interrompida de propósito pela cópia vencedora: não é sinal de host congestionado
+                if tentativa is not None and tentativa.cancelada:
+                    raise hedge_requisicoes.Cancelada() from None
+                raise
+            medicao.resposta(response.status_code, response.headers)
         response.raise_for_status()
         return response.text
 
+    def _send_request(self, operation: str, body_xml: str) -> str:
+        headers = dict(self.headers, SOAPAction=f"nfs#{operation}")
+        envelope = self._build_soap_envelope(operation, body_xml).encode('utf-8')
+        if not gestor_config.get_bool(self.config_geral, 'soap_hedge'):
+            return self._post(envelope, headers)
+        # Página lenta além do p95 da operação ganha uma cópia; fica a resposta que chegar primeiro
+        hedge_requisicoes.preparar_sessao(self.soap_session)
+        return hedge_requisicoes.executar(operation, lambda tentativa: self._post(envelope, headers, tentativa),
+                                          fracao_orcamento=gestor_config.get_float(self.config_geral, 'soap_hedge_orcamento'))
+
     def consultar_prestados_periodo(self, data_inicio: date, data_fim: date, pagina: int = 1) -> str:
         di, df = data_inicio.isoformat(), data_fim.isoformat()
         body_xml = f'<ConsultarNfseServicoPrestadoEnvio xmlns="{ABRASF_NS}"><Prestador><CpfCnpj><Cnpj>{self.cnpj}</Cnpj></CpfCnpj><InscricaoMunicipal>{self.im}</InscricaoMunicipal></Prestador><PeriodoEmissao><DataInicial>{di}</DataInicial><DataFinal>{df}</DataFinal></PeriodoEmissao><Pagina>{pagina}</Pagina></ConsultarNfseServicoPrestadoEnvio>'
@@ -69,6 +107,7 @@ class CapturadorTaubate:
         return self._send_request("ConsultarNfseServicoTomado", body_xml)
 
 def _parse_response_tolerant(xml_content: str) -> Optional[etree._Element]:
+    """Caminho antigo (árvore completa). Mantido para comparação em benchmarks/bench_parser_abrasf.py."""
     try:
         root = etree.fromstring(xml_content.encode('utf-8'))
         output_xml = root.xpath('//outputXML/text()')
@@ -81,134 +120,383 @@ def _parse_response_tolerant(xml_content: str) -> Optional[etree._Element]:
         pass
     return None
 
+def _localname(tag) -> str:
+    return etree.QName(tag).localname if isinstance(tag, str) else ""
+
+class _RepasseOutputXML:
+    """Alvo do parser do envelope: repassa o texto de <outputXML> ao parser interno enquanto ele é lido.
+
+    O conteúdo nunca é montado numa string inteira: os pedaços entregues pelo libxml2 são juntados
+    até CHUNK_PARSER caracteres, desescapados (quando há um segundo nível de escape, cuidando de
+    entidades cortadas entre blocos) e entregues ao parser interno.
+    """
+    def __init__(self, interno):
+        self.interno = interno
+        self.encontrado = False
+        self.alimentado = False
+        self._dentro = False
+        self._blocos: List[str] = []
+        self._tamanho = 0
+        self._escapado: Optional[bool] = None
+        self._entidade = ""          # '&...' sem ';' no fim do bloco anterior
+        self._cabeca: Optional[str] = ""   # início do documento até decidir sobre a declaração <?xml?>
+
+    def start(self, tag, attrib):
+        if not self.encontrado and _localname(tag) == 'outputXML':
+            self._dentro = self.encontrado = True
+
+    def end(self, tag):
+        if self._dentro and _localname(tag) == 'outputXML':
+            self.finalizar()
+
+    def finalizar(self):
+        """Entrega o que restou (fim do <outputXML> ou envelope truncado)."""
+        if self._dentro:
+            self._descarregar(final=True)
+            self._dentro = False
+
+    def data(self, texto):
+        if self._dentro:
+            self._blocos.append(texto)
+            self._tamanho += len(texto)
+            if self._tamanho >= CHUNK_PARSER:
+                self._descarregar()
+
+    def close(self):
+        return self.encontrado
+
+    def _descarregar(self, final: bool = False):
+        texto = "".join(self._blocos)
+        self._blocos, self._tamanho = [], 0
+        if self._escapado is None:
+            inicio = texto.lstrip()
+            if not inicio:
+                return
+            # Normalmente chega escapado uma única vez (já resolvido pelo parser do envelope);
+            # só desfaz um segundo nível de escape quando ele realmente existe.
+            self._escapado = not inicio.startswith('<')
+        if self._escapado:
+            texto = self._entidade + texto
+            corte = texto.rfind('&')
+            if not final and corte != -1 and ';' not in texto[corte:]:
+                texto, self._entidade = texto[:corte], texto[corte:]
+            else:
+                self._entidade = ""
+            texto = _desescapar_xml(texto)
+        if self._cabeca is not None:
+            cabeca = (self._cabeca + texto).lstrip()
+            if not final and (len(cabeca) < 2 or (cabeca.startswith('<?') and '?>' not in cabeca)):
+                self._cabeca = cabeca
+                return
+            texto, self._cabeca = _RE_DECLARACAO_XML.sub('', cabeca, count=1), None
+        if texto:
+            self.interno.feed(texto.encode('utf-8'))
+            self.alimentado = True
+
+def _eventos_resposta(eventos, limpar: bool) -> Iterator[Tuple[str, object]]:
+    for _, elem in eventos:
+        nome = _localname(elem.tag)
+        if nome == 'CompNfse':
+            yield 'nfse', elem
+        elif nome == 'MensagemRetorno':
+            yield 'mensagem', _mensagem_para_dict(elem)
+        if limpar:
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+def _mensagem_para_dict(msg_node: etree._Element) -> Dict[str, Optional[str]]:
+    campos = {_localname(child.tag).lower(): (child.text or "").strip() for child in msg_node}
+    return {"codigo": campos.get("codigo"), "mensagem": campos.get("mensagem"), "correcao": campos.get("correcao")}
+
+def _desescapar_xml(texto: str) -> str:
+    """Entidades XML de um bloco sem entidade cortada no fim (replace em C; html.unescape só para &#..;)."""
+    if '&' not in texto:
+        return texto
+    if '&#' in texto:
+        return html.unescape(texto)
+    return texto.replace('&lt;', '<').replace('&gt;', '>').replace('&quot;', '"').replace('&apos;', "'").replace('&amp;', '&')
+
+def _cortar_antes_de_entidade(texto: str, inicio: int, corte: int) -> int:
+    amp = texto.rfind('&', inicio, corte)
+    if amp > inicio and texto.find(';', amp, corte) == -1:
+        return amp
+    return corte
+
+def _repassar(xml_content: str, repasse: _RepasseOutputXML) -> Iterator[None]:
+    """Entrega o texto de <outputXML> ao `repasse` em blocos; gera um passo a cada bloco."""
+    inicio = _RE_OUTPUT_INICIO.search(xml_content)
+    fim = _RE_OUTPUT_FIM.search(xml_content, inicio.end()) if inicio and not inicio.group(1) else None
+    if inicio is not None and fim is not None and xml_content.find('<', inicio.end(), fim.start()) == -1:
+        # Caso comum: conteúdo só com entidades; fatia o envelope e desescapa bloco a bloco
+        repasse.start('outputXML', {})
+        pos = inicio.end()
+        while pos < fim.start():
+            corte = _cortar_antes_de_entidade(xml_content, pos, min(pos + CHUNK_PARSER, fim.start()))
+            repasse.data(_desescapar_xml(xml_content[pos:corte]))
+            pos = corte
+            yield
+        repasse.end('outputXML')
+        return
+    # CDATA, envelope fora do padrão ou truncado: o parser do envelope entrega o texto ao repasse
+    envelope = etree.XMLParser(target=repasse, recover=True, huge_tree=True)
+    try:
+        for i in range(0, len(xml_content), CHUNK_PARSER):
+            envelope.feed(xml_content[i:i + CHUNK_PARSER].encode('utf-8'))
+            yield
+        envelope.close()
+    except etree.XMLSyntaxError:
+        pass
+    repasse.finalizar()
+
+def iterar_resposta(xml_content: str, limpar: bool = True) -> Iterator[Tuple[str, object]]:
+    """Percorre a resposta ABRASF em streaming.
+
+    O texto de <outputXML> vai ao parser interno em blocos de CHUNK_PARSER caracteres, sem
+    cópia inteira do conteúdo escapado nem do desescapado.
+    Gera ('nfse', elemento CompNfse) e ('mensagem', {'codigo', 'mensagem', 'correcao'}) um a um.
+    Com `limpar=True` cada CompNfse é descartado da memória assim que o consumidor pede o próximo,
+    portanto o elemento só é válido até a próxima iteração.
+    """
+    interno = etree.XMLPullParser(events=('end',), tag=('{*}CompNfse', '{*}MensagemRetorno', 'CompNfse', 'MensagemRetorno'),
+                                  recover=True, huge_tree=True)
+    repasse = _RepasseOutputXML(interno)
+    for _ in _repassar(xml_content, repasse):
+        yield from _eventos_resposta(interno.read_events(), limpar)
+    if not repasse.alimentado:
+        return
+    interno.close()
+    yield from _eventos_resposta(interno.read_events(), limpar)
+
+def extrair_mensagens_retorno(xml_content: str) -> List[Dict[str, Optional[str]]]:
+    """Lista de MensagemRetorno da resposta como dicionários com 'codigo', 'mensagem' e 'correcao'."""
+    return [dado for tipo, dado in iterar_resposta(xml_content) if tipo == 'mensagem']
+
+def extrair_nfse_nodes(xml_content: str) -> List[etree._Element]:
+    """Lista de elementos CompNfse da resposta (vazia quando só há mensagens de retorno)."""
+    return [dado for tipo, dado in iterar_resposta(xml_content, limpar=False) if tipo == 'nfse']
+
+def _formatar_mensagem(msg: Dict[str, Optional[str]]) -> str:
+    return f"({msg.get('codigo')}) {msg.get('mensagem')}"
+
 def _get_nodes_and_messages(xml_content: str):
     nodes, messages = [], []
-    inner_root = _parse_response_tolerant(xml_content)
-    if inner_root is not None:
-        ns = {'ns': ABRASF_NS}
-        nodes = inner_root.xpath('//ns:CompNfse', namespaces=ns)
-        for msg_node in inner_root.xpath('//ns:MensagemRetorno', namespaces=ns):
-            code = msg_node.findtext('ns:Codigo', namespaces=ns)
-            msg = msg_node.findtext('ns:Mensagem', namespaces=ns)
-            messages.append(f"({code}) {msg}")
+    for tipo, dado in iterar_resposta(xml_content, limpar=False):
+        if tipo == 'nfse':
+            nodes.append(dado)
+        else:
+            messages.append(_formatar_mensagem(dado))
     return nodes, messages
 
 def _sanitize_path_component(name: Optional[str]) -> str:
     if not name: return ""
     return re.sub(r'[<>:"/\\|?*\x00-\x1f]+', '_', name).strip()
 
-def baixar_pdf_nota(url_visualizacao: str, caminho_pdf: Path):
+def _link_impressao(pagina_html: str, url_pagina: str) -> Optional[str]:
+    """Extrai o link nfe_imp.php da página de visualização da nota."""
+    pdf_link_match = re.search(r'href=["\'](nfe_imp\.php[^"\']+)["\']', pagina_html)
+    if not pdf_link_match:
+        return None
+    return urljoin(url_pagina, html.unescape(pdf_link_match.group(1)))
+
+def baixar_pdf_nota(url_visualizacao: str, caminho_pdf: Path) -> bool:
+    """Baixa o PDF da nota a partir do link de visualização. Retorna True se o PDF foi salvo."""
     try:
         id_match = re.search(r'id=(\d+)', url_visualizacao)
         if not id_match:
             log_error(f"Não foi possível extrair o ID da nota da URL: {url_visualizacao}")
-            return
+            return False
         id_nota = id_match.group(1)
-        url_corrigida = f"https://taubateiss.meumunicipio.digital/taubateiss/contribuinte/nfe/nfe_ver.php?id={id_nota}"
-        
-        # Nova lógica: Primeiro verifica se a URL já retorna PDF diretamente
-        with requests.Session() as session:
-            log_info(f"Acessando página de visualização com URL reconstruída: {url_corrigida}")
-            view_page_resp = session.get(url_corrigida, timeout=60)
-            view_page_resp.raise_for_status()
-            
-            # Verifica se a resposta já é um PDF
-            content_type = view_page_resp.headers.get('content-type', '').lower()
-            if 'application/pdf' in content_type and view_page_resp.content.startswith(b'%PDF'):
-                log_info(f"URL já retorna PDF diretamente. Salvando...")
-                with open(caminho_pdf, 'wb') as f:
-                    f.write(view_page_resp.content)
-                log_info(f"PDF salvo com sucesso em: {caminho_pdf}")
-                return
-            
-            # Caso contrário, procura pelo link de impressão na página HTML
-            pdf_link_match = re.search(r'href=["\'](nfe_imp\.php[^"\']+)["\']', view_page_resp.text)
-            if not pdf_link_match:
-                log_error(f"Não foi possível encontrar o link de impressão na página: {url_corrigida}")
-                return
-
-            pdf_url = urljoin(url_corrigida, html.unescape(pdf_link_match.group(1)))
-            log_info(f"Link de PDF encontrado. Baixando de: {pdf_url}")
-
-            pdf_resp = session.get(pdf_url, timeout=60)
-            pdf_resp.raise_for_status()
+        url_corrigida = f"{NFE_VER_URL}?id={id_nota}"
 
-            if pdf_resp.content.startswith(b'%PDF'):
-                with open(caminho_pdf, 'wb') as f:
-                    f.write(pdf_resp.content)
-                log_info(f"PDF salvo com sucesso em: {caminho_pdf}")
-            else:
-                log_error(f"O link de impressão não retornou um PDF. URL: {pdf_url}")
+        # A página de visualização às vezes já devolve o PDF; senão segue o link de impressão
+        log_info(f"Acessando página de visualização com URL reconstruída: {url_corrigida}")
+        return downloader_pdf.obter().baixar(url_corrigida, caminho_pdf, seguir_link=_link_impressao)
 
     except Exception as e:
         log_error(f"Falha crítica ao baixar PDF da nota. URL: {url_visualizacao} | Erro: {e}")
+        return False
 
-def _processar_captura(capturador: CapturadorTaubate, tipo_nota: str, data_inicio: date, data_fim: date, pasta_saida_base: str, id_cliente: str, cliente_info: Dict):
+def _processar_captura(capturador: CapturadorTaubate, tipo_nota: str, data_inicio: date, data_fim: date, pasta_saida_base: str, id_cliente: str, cliente_info: Dict) -> int:
+    """Captura um tipo de nota em estágios: páginas SOAP -> CompNfse -> XML em disco -> PDF."""
     log_info(f"--- Iniciando captura de notas {tipo_nota} para ID {id_cliente} ---")
-    pagina, notas_salvas = 1, 0
     razao_social = _sanitize_path_component(cliente_info.get('razao_social', ''))
     pasta_destino = Path(pasta_saida_base) / f"{id_cliente}-{razao_social}"
     ns_map = {'ns': ABRASF_NS}
     capturador_func = capturador.consultar_prestados_periodo if tipo_nota == "prestadas" else capturador.consultar_tomados_periodo
-    
-    while True:
-        log_info(f"Buscando página {pagina} de notas {tipo_nota}...")
-        try:
-            xml_resposta = capturador_func(data_inicio, data_fim, pagina)
-            nodes, messages = _get_nodes_and_messages(xml_resposta)
+    prefixo = "PRESTADA" if tipo_nota == "prestadas" else "TOMADA"
+    config_geral = capturador.config_geral
 
-            if messages and any("E016" in m for m in messages):
-                log_info(f"Nenhuma nota {tipo_nota} nova encontrada para o ID {id_cliente}.")
+    # Captura incremental: pula o período já capturado por completo nesta pasta e as notas já indexadas
+    pasta_indice = os.path.normcase(str(pasta_destino.resolve()))
+    inicio_efetivo, conhecidas = data_inicio, {}
+    if gestor_config.get_bool(config_geral, 'captura_incremental'):
+        marca = indice_notas.obter_marca(id_cliente, tipo_nota, pasta_indice)
+        if marca and marca[0] <= data_inicio <= marca[1] + timedelta(days=1):
+            ausentes = indice_notas.contar_xml_ausentes(id_cliente, tipo_nota, pasta_indice, data_inicio, min(data_fim, marca[1]))
+            if ausentes:
+                # XMLs apagados ou movidos: o período volta a ser buscado por inteiro
+                log_info(f"{ausentes} XML(s) de notas {tipo_nota} do ID {id_cliente} já capturadas não estão mais em "
+                         f"{pasta_destino}. Capturando o período completo.")
+            elif data_fim <= marca[1]:
+                log_info(f"Notas {tipo_nota} do ID {id_cliente} já capturadas até {marca[1]:%d/%m/%Y}. Nada a buscar.")
+                return 0
+            else:
+                # Repete o último dia marcado para pegar notas emitidas depois da última execução
+                inicio_efetivo = max(data_inicio, marca[1])
+                log_info(f"Captura incremental de {tipo_nota} para ID {id_cliente} a partir de {inicio_efetivo:%d/%m/%Y}.")
+        conhecidas = indice_notas.carregar_notas(id_cliente, tipo_nota, pasta_indice)
+
+    # Períodos longos são divididos em janelas paginadas em paralelo (cada uma com a sua paginação)
+    planejador = PlanejadorPeriodos(inicio_efetivo, data_fim,
+                                    janela_inicial_dias=gestor_config.get_int(config_geral, 'captura_janela_dias'),
+                                    notas_por_janela=gestor_config.get_int(config_geral, 'captura_notas_por_janela'))
+    janelas_paralelas = max(1, gestor_config.get_int(config_geral, 'captura_janelas_paralelas'))
+    contagem = {"notas_salvas": 0, "ja_existentes": 0, "falhas_pdf": 0, "falha_busca": False}
+    contagem_lock = threading.Lock()
+    vistas = set()
+
+    def buscar_janela(emitir, janela) -> int:
+        ini, fim = janela
+        controle = ControlePaginacao(TAMANHO_PAGINA)
+        pagina = 1
+        while controle.pode_buscar(pagina):
+            log_info(f"Buscando página {pagina} de notas {tipo_nota} ({ini:%d/%m/%Y} a {fim:%d/%m/%Y})...")
+            try:
+                emitir((controle, pagina, capturador_func(ini, fim, pagina)))
+            except requests.exceptions.HTTPError as e:
+                log_error(f"Erro de servidor ao buscar notas {tipo_nota} para ID {id_cliente}: {e}")
+                contagem["falha_busca"] = True
+                controle.encerrar(pagina)
                 break
-            
-            if not nodes:
-                log_info(f"Fim da busca. Nenhuma nota {tipo_nota} adicional na página {pagina}.")
+            except Exception as e:
+                log_error(f"Erro inesperado no processamento de {tipo_nota} para ID {id_cliente}: {e}", exc_info=sys.exc_info())
+                contagem["falha_busca"] = True
+                controle.encerrar(pagina)
                 break
-            
-            for node in nodes:
-                num_nf = node.findtext('.//ns:Numero', namespaces=ns_map)
-                data_emissao = node.findtext('.//ns:DataEmissao', namespaces=ns_map)
-                link_visualizacao = node.findtext('.//ns:LinkNota', namespaces=ns_map)
-
-                if num_nf and data_emissao:
-                    prefixo = "PRESTADA" if tipo_nota == "prestadas" else "TOMADA"
-                    nome_base = f"NF_{prefixo}_{num_nf}_{data_emissao.split('T')[0]}"
-                    pasta_destino.mkdir(parents=True, exist_ok=True)
-                    
-                    caminho_xml = pasta_destino / f"{nome_base}.xml"
-                    xml_content = etree.tostring(node, pretty_print=True, encoding='utf-8', xml_declaration=True)
-                    with open(caminho_xml, 'wb') as f: f.write(xml_content)
-                    
-                    if link_visualizacao:
-                        caminho_pdf = pasta_destino / f"{nome_base}.pdf"
-                        # Chamada corrigida para não passar a sessão
-                        baixar_pdf_nota(link_visualizacao, caminho_pdf)
-
-                    notas_salvas += 1
-            
-            if len(nodes) < 50: break
-            pagina += 1
-            time.sleep(1)
-
-        except requests.exceptions.HTTPError as e:
-            log_error(f"Erro de servidor ao buscar notas {tipo_nota} para ID {id_cliente}: {e}")
-            break
-        except Exception as e:
-            log_error(f"Erro inesperado no processamento de {tipo_nota} para ID {id_cliente}: {e}", exc_info=sys.exc_info())
-            break
-            
-    log_info(f"--- Captura de {tipo_nota} finalizada para ID {id_cliente}. Total salvo: {notas_salvas} ---")
+            pagina += 1  # o ritmo entre páginas fica a cargo do governador do host (controle_hosts)
+        return controle.total_itens
+
+    def buscar_paginas(emitir):
+        def consumir_janelas():
+            while True:
+                janela = planejador.proxima_janela()
+                if janela is None:
+                    return
+                planejador.registrar(janela, buscar_janela(emitir, janela))
+
+        with ThreadPoolExecutor(max_workers=janelas_paralelas, thread_name_prefix=f"janelas-{tipo_nota}-{id_cliente}") as executor:
+            for futuro in [executor.submit(consumir_janelas) for _ in range(janelas_paralelas)]:
+                futuro.result()
+
+    def extrair_notas(item):
+        controle, pagina, xml_resposta = item
+        if not controle.pagina_valida(pagina):
+            return None
+        notas, codigos, total_nodes = [], [], 0
+        try:
+            # Cada CompNfse é serializado e descartado antes de ler o próximo
+            for tipo, dado in iterar_resposta(xml_resposta):
+                if tipo == 'mensagem':
+                    codigos.append(dado.get('codigo') or "")
+                    continue
+                total_nodes += 1
+                num_nf = dado.findtext('.//ns:Numero', namespaces=ns_map)
+                data_emissao = dado.findtext('.//ns:DataEmissao', namespaces=ns_map)
+                if not (num_nf and data_emissao):
+                    continue
+                nome_base = f"NF_{prefixo}_{num_nf}_{data_emissao.split('T')[0]}"
+                link = dado.findtext('.//ns:LinkNota', namespaces=ns_map)
+                xml_bytes = etree.tostring(dado, pretty_print=True, encoding='utf-8', xml_declaration=True)
+                hash_xml = hashlib.sha256(xml_bytes).hexdigest()
+                with contagem_lock:
+                    # Janelas vizinhas não se sobrepõem, mas a mesma nota nunca é processada duas vezes
+                    if (num_nf, data_emissao) in vistas:
+                        continue
+                    vistas.add((num_nf, data_emissao))
+                conhecida = conhecidas.get((num_nf, data_emissao))
+                xml_em_dia = bool(conhecida and conhecida['hash_xml'] == hash_xml
+                                  and conhecida['caminho_xml'] and os.path.exists(conhecida['caminho_xml']))
+                pdf_em_dia = bool(xml_em_dia and conhecida['caminho_pdf'] and os.path.exists(conhecida['caminho_pdf']))
+                if xml_em_dia and (pdf_em_dia or not link):
+                    with contagem_lock:
+                        contagem["ja_existentes"] += 1
+                    continue
+                notas.append({
+                    "nome_base": nome_base, "numero": num_nf, "data_emissao": data_emissao,
+                    "link": link, "xml": xml_bytes, "hash": hash_xml, "gravar_xml": not xml_em_dia,
+                })
+            if "E016" in codigos:
+                log_info(f"Nenhuma nota {tipo_nota} nova encontrada para o ID {id_cliente}.")
+                controle.encerrar(pagina)
+                return None
+            if not total_nodes:
+                log_info(f"Fim da busca. Nenhuma nota {tipo_nota} adicional na página {pagina}.")
+                controle.encerrar(pagina)
+                return None
+            controle.registrar(pagina, total_nodes)
+        except Exception:
+            controle.encerrar(pagina)
+            raise
+        return notas
 
-def capturar_notas(cliente_info: Dict, config_geral: Dict, data_inicio: date, data_fim: date, pasta_saida: str):
+    def salvar_xml(nota):
+        if nota['gravar_xml']:
+            pasta_destino.mkdir(parents=True, exist_ok=True)
+            caminho_xml = pasta_destino / f"{nota['nome_base']}.xml"
+            with open(caminho_xml, 'wb') as f: f.write(nota['xml'])
+            indice_notas.registrar_nota(id_cliente, tipo_nota, pasta_indice, nota['numero'], nota['data_emissao'], nota['hash'], str(caminho_xml))
+            with contagem_lock:
+                contagem["notas_salvas"] += 1
+        return [nota] if nota['link'] else None
+
+    def baixar_pdf(nota):
+        caminho_pdf = pasta_destino / f"{nota['nome_base']}.pdf"
+        if baixar_pdf_nota(nota['link'], caminho_pdf):
+            indice_notas.registrar_pdf(id_cliente, tipo_nota, pasta_indice, nota['numero'], nota['data_emissao'], str(caminho_pdf))
+        else:
+            with contagem_lock:
+                contagem["falhas_pdf"] += 1
+
+    pipeline = Pipeline(f"{tipo_nota}-{id_cliente}")
+    tamanho_fila = gestor_config.get_int(config_geral, 'captura_fila_max')
+    pipeline.adicionar_estagio("extracao", extrair_notas, workers=janelas_paralelas, tamanho_fila=janelas_paralelas)
+    pipeline.adicionar_estagio("xml", salvar_xml, workers=gestor_config.get_int(config_geral, 'captura_workers_xml'), tamanho_fila=tamanho_fila)
+    pipeline.adicionar_estagio("pdf", baixar_pdf, workers=gestor_config.get_int(config_geral, 'captura_workers_pdf'), tamanho_fila=tamanho_fila)
+    pipeline.executar(buscar_paginas)
+    pipeline.log_estatisticas()
+
+    # Só marca o período como capturado se nada falhou; hoje fica de fora porque ainda pode receber notas
+    completo = not contagem["falha_busca"] and not contagem["falhas_pdf"] and not any(e.erros for e in pipeline.estagios)
+    capturado_ate = min(data_fim, date.today() - timedelta(days=1))
+    if completo and capturado_ate >= inicio_efetivo:
+        indice_notas.avancar_marca(id_cliente, tipo_nota, pasta_indice, inicio_efetivo, capturado_ate)
+
+    notas_salvas = contagem["notas_salvas"]
+    log_info(f"--- Captura de {tipo_nota} finalizada para ID {id_cliente}. Total salvo: {notas_salvas} "
+             f"(já existentes: {contagem['ja_existentes']}) ---")
+    return notas_salvas
+
+def capturar_notas(cliente_info: Dict, config_geral: Dict, data_inicio: date, data_fim: date, pasta_saida: str) -> int:
+    """Captura as notas PRESTADAS do cliente. Retorna o total salvo; erros de configuração são re-levantados."""
     try:
         capturador = CapturadorTaubate(cliente_info, config_geral)
-        _processar_captura(capturador, "prestadas", data_inicio, data_fim, pasta_saida, cliente_info['id'], cliente_info)
+        try:
+            return _processar_captura(capturador, "prestadas", data_inicio, data_fim, pasta_saida, cliente_info['id'], cliente_info)
+        finally:
+            capturador.fechar()
     except Exception as e:
         log_error(f"Erro CRÍTICO ao configurar captura de PRESTADAS para ID {cliente_info['id']}: {e}", exc_info=sys.exc_info())
+        raise
         
-def capturar_notas_tomadas(cliente_info: Dict, config_geral: Dict, data_inicio: date, data_fim: date, pasta_saida: str):
+def capturar_notas_tomadas(cliente_info: Dict, config_geral: Dict, data_inicio: date, data_fim: date, pasta_saida: str) -> int:
+    """Captura as notas TOMADAS do cliente. Retorna o total salvo; erros de configuração são re-levantados."""
     try:
         capturador = CapturadorTaubate(cliente_info, config_geral)
-        _processar_captura(capturador, "tomadas", data_inicio, data_fim, pasta_saida, cliente_info['id'], cliente_info)
+        try:
+            return _processar_captura(capturador, "tomadas", data_inicio, data_fim, pasta_saida, cliente_info['id'], cliente_info)
+        finally:
+            capturador.fechar()
     except Exception as e:
-        log_error(f"Erro CRÍTICO ao configurar captura de TOMADAS para ID {cliente_info['id']}: {e}", exc_info=sys.exc_info())
\ No newline at end of file
+        log_error(f"Erro CRÍTICO ao configurar captura de TOMADAS para ID {cliente_info['id']}: {e}", exc_info=sys.exc_info())
+        raise
\ No newline at end of file
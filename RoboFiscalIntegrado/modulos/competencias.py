@@ -0,0 +1,58 @@
+#--------------------------------------------------------------------------
+# modulos/competencias.py - v1.0 LISTAS E INTERVALOS DE COMPETÊNCIAS
+# Converte o que vem da interface ("2024-09", "2024-01..2024-06",
+# "2024-01,2024-03", "09/2024" ou uma lista) numa lista ordenada de
+# competências AAAA-MM, para as rotinas processarem vários meses depois de
+# selecionar cada empresa uma única vez.
+#--------------------------------------------------------------------------
+import re
+from typing import Iterable, List, Optional, Union
+
+SEPARADOR_INTERVALO = ".."
+
+def _normalizar(comp: str) -> str:
+    comp = comp.strip()
+    m = re.fullmatch(r"(\d{4})-(\d{1,2})", comp) or re.fullmatch(r"(\d{1,2})/(\d{4})", comp)
+    if not m:
+        raise ValueError(f"Competência inválida: '{comp}' (use AAAA-MM).")
+    ano, mes = (m.group(1), m.group(2)) if "-" in comp else (m.group(2), m.group(1))
+    if not 1 <= int(mes) <= 12:
+        raise ValueError(f"Mês inválido na competência '{comp}'.")
+    return f"{int(ano):04d}-{int(mes):02d}"
+
+def _intervalo(inicio: str, fim: str) -> List[str]:
+    ano, mes = map(int, _normalizar(inicio).split("-"))
+    ano_fim, mes_fim = map(int, _normalizar(fim).split("-"))
+    if (ano, mes) > (ano_fim, mes_fim):
+        raise ValueError(f"Intervalo de competências invertido: {inicio}{SEPARADOR_INTERVALO}{fim}.")
+    meses = []
+    while (ano, mes) <= (ano_fim, mes_fim):
+        meses.append(f"{ano:04d}-{mes:02d}")
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+def expandir_competencias(valor: Union[str, Iterable[str]]) -> List[str]:
+    """Lista ordenada e sem repetições de competências AAAA-MM; aceita itens e intervalos 'ini..fim'."""
+    partes = re.split(r"[,;\s]+", valor) if isinstance(valor, str) else list(valor)
+    resultado = set()
+    for parte in partes:
+        parte = (parte or "").strip()
+        if not parte:
+            continue
+        if SEPARADOR_INTERVALO in parte:
+            inicio, fim = parte.split(SEPARADOR_INTERVALO, 1)
+            resultado.update(_intervalo(inicio, fim))
+        else:
+            resultado.add(_normalizar(parte))
+    if not resultado:
+        raise ValueError("Nenhuma competência informada.")
+    return sorted(resultado)
+
+def de_formulario(inicio: str, fim: Optional[str] = None) -> str:
+    """Competência inicial e final (opcional) do formulário no formato aceito por expandir_competencias."""
+    inicio = (inicio or "").strip()
+    fim = (fim or "").strip()
+    return f"{inicio}{SEPARADOR_INTERVALO}{fim}" if fim and fim != inicio else inicio
+
+def descrever(lista: List[str]) -> str:
+    return lista[0] if len(lista) == 1 else f"{lista[0]}{SEPARADOR_INTERVALO}{lista[-1]} ({len(lista)} competências)"
@@ -0,0 +1,222 @@
+#--------------------------------------------------------------------------
+# modulos/controle_hosts.py - v2.0 GOVERNADOR DE TRÁFEGO POR HOST
+# Cada host tem um limite de requisições simultâneas e um balde de fichas
+# (token bucket) cuja taxa é ajustada em AIMD: sobe devagar enquanto o
+# portal responde bem e cai pela metade diante de 429/5xx, timeouts ou
+# latência muito acima da habitual. Usado por HTTP (requests) e Playwright.
+#--------------------------------------------------------------------------
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from modulos.logger import log_info
+
+_LIMITE_PADRAO       = 8
+_TAXA_INICIAL        = 1.0    # requisições/s antes de qualquer medição (o antigo sleep(1) entre páginas)
+_TAXA_MIN            = 0.2
+_TAXA_MAX            = 10.0
+_LATENCIA_ALVO_S     = 3.0    # abaixo disso a latência nunca é tratada como congestionamento
+AUMENTO_POR_SEGUNDO  = 0.25   # aumento aditivo da taxa (req/s) a cada segundo de respostas boas
+FATOR_REDUCAO        = 0.5
+ALFA_EWMA            = 0.2
+
+class Medicao:
+    """Resultado de uma requisição feita dentro de `slot()`, preenchido por quem chamou."""
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+        self.latencia_s: Optional[float] = None
+        self._t0 = time.monotonic()
+
+    def resposta(self, status: Optional[int], headers=None) -> None:
+        """Registra status e latência até o cabeçalho (o corpo pode continuar em streaming)."""
+        self.status = status
+        self.latencia_s = time.monotonic() - self._t0
+        valor = (headers or {}).get('Retry-After') or (headers or {}).get('retry-after')
+        if valor:
+            try:
+                self.retry_after = float(valor)
+            except ValueError:
+                self.retry_after = None
+
+class GovernadorHost:
+    def __init__(self, host: str, limite: int, taxa_inicial: float, taxa_min: float, taxa_max: float, latencia_alvo_s: float):
+        self.host = host
+        self.semaforo = threading.BoundedSemaphore(limite)
+        self.taxa_min = taxa_min
+        self.taxa_max = max(taxa_min, taxa_max)
+        self.taxa = min(self.taxa_max, max(taxa_min, taxa_inicial))
+        self.latencia_alvo_s = latencia_alvo_s
+        self.requisicoes = 0
+        self.reducoes = 0
+        self._fichas = 1.0
+        self._ultimo_abastecimento = time.monotonic()
+        self._bloqueado_ate = 0.0
+        self._ultima_reducao = 0.0
+        self._ewma: Optional[float] = None
+        self._base: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _abastecer(self, agora: float):
+        capacidade = max(1.0, self.taxa)
+        self._fichas = min(capacidade, self._fichas + (agora - self._ultimo_abastecimento) * self.taxa)
+        self._ultimo_abastecimento = agora
+
+    def aguardar(self) -> float:
+        """Bloqueia até haver uma ficha para o host. Devolve o tempo esperado."""
+        inicio = time.monotonic()
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._abastecer(agora)
+                if agora < self._bloqueado_ate:
+                    espera = self._bloqueado_ate - agora
+                elif self._fichas >= 1.0:
+                    self._fichas -= 1.0
+                    self.requisicoes += 1
+                    return agora - inicio
+                else:
+                    espera = (1.0 - self._fichas) / self.taxa
+            time.sleep(min(espera, 1.0))
+
+    def registrar(self, latencia_s: Optional[float] = None, status: Optional[int] = None,
+                  erro: bool = False, retry_after: Optional[float] = None) -> None:
+        """Realimenta o governador com o resultado de uma requisição."""
+        with self._lock:
+            agora = time.monotonic()
+            lento = False
+            if latencia_s is not None and not erro:
+                self._ewma = latencia_s if self._ewma is None else (1 - ALFA_EWMA) * self._ewma + ALFA_EWMA * latencia_s
+                # A linha de base acompanha as melhores latências e sobe devagar se o portal ficar mais lento de vez
+                if self._base is None or self._ewma < self._base:
+                    self._base = self._ewma
+                else:
+                    self._base += 0.01 * (self._ewma - self._base)
+                lento = latencia_s > max(self.latencia_alvo_s, 3 * self._base)
+
+            if retry_after:
+                self._bloqueado_ate = max(self._bloqueado_ate, agora + retry_after)
+
+            motivo = None
+            if erro:
+                motivo = "timeout/erro de conexão"
+            elif status is not None and (status == 429 or status >= 500):
+                motivo = f"HTTP {status}"
+            elif lento:
+                motivo = f"latência {latencia_s:.1f}s"
+
+            if motivo is None:
+                self.taxa = min(self.taxa_max, self.taxa + AUMENTO_POR_SEGUNDO / self.taxa)
+                return
+            # Várias respostas ruins da mesma rajada contam como um único sinal de congestionamento
+            if agora - self._ultima_reducao < max(1.0, self._ewma or 0.0):
+                return
+            self._ultima_reducao = agora
+            self.reducoes += 1
+            self.taxa = max(self.taxa_min, self.taxa * FATOR_REDUCAO)
+            self._fichas = min(self._fichas, 1.0)
+        log_info(f"[governador] {self.host}: taxa reduzida para {self.taxa:.2f} req/s ({motivo}).")
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            return {"host": self.host, "taxa": round(self.taxa, 2), "requisicoes": self.requisicoes,
+                    "reducoes": self.reducoes, "latencia_media_s": round(self._ewma or 0.0, 3)}
+
+_lock = threading.Lock()
+_parametros = {"limite": _LIMITE_PADRAO, "taxa_inicial": _TAXA_INICIAL, "taxa_min": _TAXA_MIN,
+               "taxa_max": _TAXA_MAX, "latencia_alvo_s": _LATENCIA_ALVO_S}
+_governadores: Dict[str, GovernadorHost] = {}
+
+def _host(url: str) -> str:
+    return (urlsplit(url).netloc or url).lower()
+
+def configurar(max_por_host: int = _LIMITE_PADRAO, taxa_inicial: float = _TAXA_INICIAL, taxa_min: float = _TAXA_MIN,
+               taxa_max: float = _TAXA_MAX, latencia_alvo_s: float = _LATENCIA_ALVO_S) -> None:
+    """Define os parâmetros dos governadores e descarta o estado aprendido.
+
+    Só afeta hosts usados depois da chamada; chamar antes de iniciar a tarefa.
+    """
+    with _lock:
+        _parametros.update({
+            "limite": max(1, int(max_por_host or _LIMITE_PADRAO)),
+            "taxa_inicial": float(taxa_inicial or _TAXA_INICIAL),
+            "taxa_min": float(taxa_min or _TAXA_MIN),
+            "taxa_max": float(taxa_max or _TAXA_MAX),
+            "latencia_alvo_s": float(latencia_alvo_s or _LATENCIA_ALVO_S),
+        })
+        _governadores.clear()
+
+def governador(url: str) -> GovernadorHost:
+    host = _host(url)
+    with _lock:
+        gov = _governadores.get(host)
+        if gov is None:
+            gov = GovernadorHost(host, **_parametros)
+            _governadores[host] = gov
+        return gov
+
+def aguardar(url: str) -> float:
+    """Espera a vez do host sem ocupar vaga de concorrência (pausas entre ações)."""
+    return governador(url).aguardar()
+
+def registrar(url: str, latencia_s: Optional[float] = None, status: Optional[int] = None,
+              erro: bool = False, retry_after: Optional[float] = None) -> None:
+    governador(url).registrar(latencia_s, status, erro, retry_after)
+
+def _erro_de_rede(e: BaseException) -> bool:
+    # requests (Timeout/ConnectionError), urllib3, socket e Playwright (TimeoutError)
+    nomes = {c.__name__ for c in type(e).__mro__}
+    return bool(nomes & {"Timeout", "ConnectionError", "TimeoutError", "ReadTimeoutError", "ConnectTimeoutError"})
+
+@contextmanager
+def slot(url: str):
+    """Reserva uma vaga de conexão e uma ficha do host durante o bloco.
+
+    O bloco recebe uma `Medicao`; chamar `medicao.resposta(status, headers)`
+    alimenta o governador com status e latência. Exceções de rede contam como
+    sinal de congestionamento.
+    """
+    gov = governador(url)
+    gov.semaforo.acquire()
+    try:
+        gov.aguardar()
+        medicao = Medicao()
+        try:
+            yield medicao
+        except BaseException as e:
+            if _erro_de_rede(e):
+                gov.registrar(time.monotonic() - medicao._t0, erro=True)
+            raise
+        latencia = medicao.latencia_s if medicao.latencia_s is not None else time.monotonic() - medicao._t0
+        gov.registrar(latencia, medicao.status, retry_after=medicao.retry_after)
+    finally:
+        gov.semaforo.release()
+
+# --- Playwright ---
+
+def navegar(pagina, url: str, **kwargs):
+    """`pagina.goto` passando pelo governador do host."""
+    with slot(url) as medicao:
+        resposta = pagina.goto(url, **kwargs)
+        if resposta is not None:
+            medicao.resposta(resposta.status, resposta.headers)
+    return resposta
+
+def observar_pagina(pagina) -> None:
+    """Alimenta os governadores com 429/5xx vistos pelo navegador (XHR, recursos, postbacks)."""
+    def _ao_responder(resposta):
+        try:
+            status = resposta.status
+            if status == 429 or status >= 500:
+                retry_after = resposta.headers.get('retry-after')
+                registrar(resposta.url, status=status, retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        except Exception:
+            pass
+    pagina.on("response", _ao_responder)
+
+def estatisticas() -> List[Dict]:
+    with _lock:
+        governadores = list(_governadores.values())
+    return [g.estatisticas() for g in governadores]
@@ -0,0 +1,158 @@
+#--------------------------------------------------------------------------
+# modulos/downloader_pdf.py - v1.2 DOWNLOADER DE PDF COMPARTILHADO
+# Um único pool de conexões keep-alive para todos os PDFs do processo, com
+# limite de downloads simultâneos, novas tentativas com backoff (5xx, falhas
+# de conexão e leituras interrompidas, todas no laço de baixar(): o urllib3
+# não repete nada, então cada resposta passa pelo governador do host e a
+# espera fica fora do semáforo) e gravação em streaming num arquivo .part
+# renomeado no final.
+#--------------------------------------------------------------------------
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from modulos import controle_hosts
+from modulos.logger import log_info, log_error
+
+CHUNK_BYTES = 64 * 1024
+STATUS_REPETIR = (500, 502, 503, 504)
+# Falhas ao ler a resposta (corpo truncado, timeout de leitura)
+FALHAS_LEITURA = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                  requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+class _LeituraInterrompida(Exception):
+    """Queda no meio da leitura da resposta; a tentativa inteira pode ser repetida."""
+    def __init__(self, original: Exception):
+        super().__init__(str(original))
+        self.original = original
+
+def _ler(func, *args):
+    try:
+        return func(*args)
+    except FALHAS_LEITURA as e:
+        raise _LeituraInterrompida(e) from e
+
+def _repetivel(e: Exception) -> bool:
+    """Leitura interrompida, falha de conexão/timeout ou status 5xx: vale uma nova tentativa."""
+    if isinstance(e, requests.exceptions.HTTPError):
+        return e.response is not None and e.response.status_code in STATUS_REPETIR
+    return isinstance(e, (_LeituraInterrompida, requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+class DownloaderPDF:
+    """Serviço de download de PDFs com pool de conexões compartilhado.
+
+    Cada nota usa uma sessão leve própria (os cookies do portal ficam isolados
+    por nota), mas todas montam o mesmo HTTPAdapter, então as conexões TLS são
+    reaproveitadas entre notas e entre clientes.
+    """
+    def __init__(self, max_concorrencia: int = 8, tentativas: int = 3, backoff_s: float = 0.5, timeout: int = 60):
+        self.max_concorrencia = max(1, int(max_concorrencia))
+        self.tentativas = max(1, int(tentativas))
+        self.backoff_s = backoff_s
+        self.timeout = timeout
+        # Sem novas tentativas no urllib3: as dele dormiriam dentro do semáforo e do slot do
+        # governador, que só veria o último status. Toda repetição é do laço de baixar()
+        retry = Retry(total=0, connect=0, read=False, status=0, redirect=False, raise_on_status=False)
+        self._adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concorrencia, max_retries=retry)
+        self._semaforo = threading.BoundedSemaphore(self.max_concorrencia)
+
+    def _nova_sessao(self) -> requests.Session:
+        # Não fechar estas sessões: o close() fecharia o adaptador compartilhado
+        sessao = requests.Session()
+        sessao.mount('https://', self._adaptador)
+        sessao.mount('http://', self._adaptador)
+        return sessao
+
+    def _gravar_streaming(self, resposta: requests.Response, caminho: Path) -> bool:
+        """Grava o corpo em caminho.part e renomeia só se começar com %PDF."""
+        parcial = caminho.with_name(caminho.name + ".part")
+        inicio = b""
+        try:
+            with open(parcial, 'wb') as f:
+                for bloco in resposta.iter_content(CHUNK_BYTES):
+                    if len(inicio) < 4:
+                        inicio += bloco[:4 - len(inicio)]
+                    f.write(bloco)
+            if not inicio.startswith(b'%PDF'):
+                os.remove(parcial)
+                return False
+            os.replace(parcial, caminho)
+            return True
+        except BaseException:
+            if parcial.exists():
+                os.remove(parcial)
+            raise
+
+    def _tentar(self, url: str, caminho: Path, seguir_link: Optional[Callable[[str, str], Optional[str]]]) -> bool:
+        sessao = self._nova_sessao()
+        with controle_hosts.slot(url) as medicao, sessao.get(url, timeout=self.timeout, stream=True) as resp:
+            medicao.resposta(resp.status_code, resp.headers)
+            resp.raise_for_status()
+            if 'application/pdf' in resp.headers.get('content-type', '').lower():
+                if _ler(self._gravar_streaming, resp, caminho):
+                    log_info(f"PDF salvo com sucesso em: {caminho}")
+                    return True
+                log_error(f"A URL anunciou PDF mas o conteúdo não é um PDF: {url}")
+                return False
+            pagina = _ler(lambda: resp.text)
+
+        url_pdf = seguir_link(pagina, url) if seguir_link else None
+        if not url_pdf:
+            log_error(f"Não foi possível encontrar o link de impressão na página: {url}")
+            return False
+
+        log_info(f"Link de PDF encontrado. Baixando de: {url_pdf}")
+        with controle_hosts.slot(url_pdf) as medicao, sessao.get(url_pdf, timeout=self.timeout, stream=True) as resp:
+            medicao.resposta(resp.status_code, resp.headers)
+            resp.raise_for_status()
+            if _ler(self._gravar_streaming, resp, caminho):
+                log_info(f"PDF salvo com sucesso em: {caminho}")
+                return True
+        log_error(f"O link de impressão não retornou um PDF. URL: {url_pdf}")
+        return False
+
+    def baixar(self, url: str, caminho: Path, seguir_link: Optional[Callable[[str, str], Optional[str]]] = None) -> bool:
+        """Baixa o PDF de `url` para `caminho`.
+
+        Se a URL devolver HTML, `seguir_link(html, url)` deve devolver a URL do PDF.
+        Status 5xx, falhas de conexão, timeouts e quedas no meio do corpo (resposta
+        truncada) são repetidos aqui, com a espera fora do semáforo e do slot do host
+        para não segurar a vaga de outro download. Cada resposta, inclusive as 5xx
+        intermediárias, chega ao governador do host.
+        """
+        caminho = Path(caminho)
+        for tentativa in range(1, self.tentativas + 1):
+            with self._semaforo:
+                try:
+                    return self._tentar(url, caminho, seguir_link)
+                except (_LeituraInterrompida, requests.exceptions.RequestException) as e:
+                    erro = getattr(e, 'original', e)
+                    if not _repetivel(e) or tentativa == self.tentativas:
+                        raise erro
+            espera = self.backoff_s * (2 ** (tentativa - 1))
+            log_info(f"Falha ao baixar PDF ({erro}). Nova tentativa {tentativa + 1}/{self.tentativas} em {espera:.1f}s.")
+            time.sleep(espera)
+        return False
+
+_lock = threading.Lock()
+_downloader: Optional[DownloaderPDF] = None
+
+def configurar(max_concorrencia: int = 8, tentativas: int = 3) -> DownloaderPDF:
+    """Recria o downloader compartilhado; chamar antes de iniciar a captura."""
+    global _downloader
+    with _lock:
+        _downloader = DownloaderPDF(max_concorrencia=max_concorrencia, tentativas=tentativas)
+        return _downloader
+
+def obter() -> DownloaderPDF:
+    global _downloader
+    with _lock:
+        if _downloader is None:
+            _downloader = DownloaderPDF()
+        return _downloader
@@ -0,0 +1,105 @@
+#--------------------------------------------------------------------------
+# modulos/fila_trabalho.py - v1.2 FILA DE TRABALHO COM RECURSO POR WORKER
+# Distribui itens entre N threads; cada thread abre o próprio recurso (ex.:
+# um navegador logado, que no Playwright síncrono não pode mudar de thread)
+# e consome a fila até esvaziar. Se um worker não consegue abrir o recurso,
+# os itens continuam na fila para os demais. Entre itens, o worker pode
+# fechar o recurso e recomeçar com um novo (ex.: navegador a reciclar).
+#--------------------------------------------------------------------------
+import queue
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, List, Optional, Sequence
+
+from modulos.logger import log_info, log_error
+
+@dataclass
+class ResultadoFila:
+    concluidos: List[Any] = field(default_factory=list)
+    falhas: List[Any] = field(default_factory=list)
+    pendentes: List[Any] = field(default_factory=list)   # sobraram porque nenhum worker conseguiu continuar
+    erros_workers: List[str] = field(default_factory=list)
+
+def executar(itens: Sequence[Any], num_workers: int,
+             abrir_recurso: Callable[[int], ContextManager[Any]],
+             processar: Callable[[Any, Any], None],
+             nome: str = "fila",
+             envolver_worker: Optional[Callable[[Callable[[], None]], None]] = None,
+             renovar_recurso: Optional[Callable[[], bool]] = None) -> ResultadoFila:
+    """Processa `itens` com até `num_workers` threads.
+
+    Cada worker faz `with abrir_recurso(indice) as recurso:` e chama
+    `processar(recurso, item)` para cada item que retira da fila. Exceção em
+    `processar` conta o item como falha e o worker segue; exceção ao abrir ou
+    fechar o recurso encerra só aquele worker.
+
+    `envolver_worker(corpo)`, se informado, decide onde o corpo de cada worker
+    roda (ex.: numa thread do pool de navegadores) e só retorna quando ele acaba.
+
+    `renovar_recurso()`, consultado na thread do worker depois de cada item, pede
+    para fechar o recurso e recomeçar o worker (de novo por `envolver_worker`)
+    enquanto ainda houver itens na fila.
+    """
+    fila: "queue.Queue[Any]" = queue.Queue()
+    for item in itens:
+        fila.put(item)
+    resultado = ResultadoFila()
+    lock = threading.Lock()
+
+    def _worker(indice: int, renovar: List[bool]):
+        try:
+            with abrir_recurso(indice) as recurso:
+                while True:
+                    try:
+                        item = fila.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        processar(recurso, item)
+                        with lock:
+                            resultado.concluidos.append(item)
+                    except Exception as e:
+                        log_error(f"[{nome}-{indice}] Falha ao processar item: {e}", exc_info=sys.exc_info())
+                        with lock:
+                            resultado.falhas.append(item)
+                    if renovar_recurso is not None and not fila.empty() and renovar_recurso():
+                        log_info(f"[{nome}-{indice}] Renovando o recurso do worker.")
+                        renovar[0] = True
+                        return
+        except Exception as e:
+            log_error(f"[{nome}-{indice}] Worker encerrado: {e}", exc_info=sys.exc_info())
+            with lock:
+                resultado.erros_workers.append(str(e))
+
+    def _rodar(indice: int):
+        renovar = [True]
+        while renovar[0]:
+            renovar[0] = False
+            if envolver_worker is None:
+                _worker(indice, renovar)
+                continue
+            try:
+                envolver_worker(lambda: _worker(indice, renovar))
+            except Exception as e:
+                log_error(f"[{nome}-{indice}] Worker não pôde ser iniciado: {e}", exc_info=sys.exc_info())
+                with lock:
+                    resultado.erros_workers.append(str(e))
+
+    num_workers = max(1, min(int(num_workers), len(itens) or 1))
+    if num_workers == 1:
+        _rodar(0)
+    else:
+        log_info(f"[{nome}] {len(itens)} item(ns) distribuídos entre {num_workers} workers.")
+        threads = [threading.Thread(target=_rodar, args=(i,), name=f"{nome}-{i}", daemon=True) for i in range(num_workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    while True:
+        try:
+            resultado.pendentes.append(fila.get_nowait())
+        except queue.Empty:
+            break
+    return resultado
@@ -0,0 +1,259 @@
+#--------------------------------------------------------------------------
+# modulos/hedge_requisicoes.py - v1.1 REQUISIÇÕES DUPLICADAS PARA A CAUDA LENTA
+# Se uma requisição não respondeu até o p95 de latência já observado para a
+# mesma operação, dispara uma cópia e fica com a que terminar primeiro. Um
+# orçamento limita as cópias a uma fração das requisições originais.
+# O relógio (amostras e gatilho) só corre depois que a requisição ganhou a
+# vaga do governador do host, então a fila do governador não dispara cópias.
+# A original roda na thread chamadora; só a cópia vai para o executor e,
+# se ela vencer, o socket da original é fechado para liberar quem chamou.
+#--------------------------------------------------------------------------
+import heapq
+import itertools
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from modulos.logger import log_info, log_error
+
+JANELA_AMOSTRAS = 200
+MINIMO_AMOSTRAS = 20
+GATILHO_MINIMO_S = 0.5
+MAX_COPIAS_SIMULTANEAS = 16
+
+class RastreadorLatencia:
+    """Últimas latências bem-sucedidas de uma operação."""
+    def __init__(self, tamanho: int = JANELA_AMOSTRAS):
+        self._amostras = deque(maxlen=tamanho)
+        self._lock = threading.Lock()
+
+    def registrar(self, latencia_s: float) -> None:
+        with self._lock:
+            self._amostras.append(latencia_s)
+
+    def percentil(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._amostras:
+                return None
+            ordenadas = sorted(self._amostras)
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100.0))]
+
+    def gatilho(self, minimo_amostras: int = MINIMO_AMOSTRAS, minimo_s: float = GATILHO_MINIMO_S) -> Optional[float]:
+        """Tempo de espera antes da cópia (p95), ou None enquanto não há amostras suficientes."""
+        with self._lock:
+            if len(self._amostras) < minimo_amostras:
+                return None
+        return max(minimo_s, self.percentil(95))
+
+class OrcamentoHedge:
+    """Conta originais e cópias; só libera uma cópia se couber na fração configurada."""
+    def __init__(self):
+        self.originais = 0
+        self.copias = 0
+        self.vitorias_copia = 0
+        self._lock = threading.Lock()
+
+    def contar_original(self):
+        with self._lock:
+            self.originais += 1
+
+    def reservar(self, fracao: float) -> bool:
+        with self._lock:
+            if self.copias + 1 > fracao * self.originais:
+                return False
+            self.copias += 1
+            return True
+
+    def contar_vitoria(self):
+        with self._lock:
+            self.vitorias_copia += 1
+
+_lock = threading.Lock()
+_rastreadores: Dict[str, RastreadorLatencia] = {}
+_orcamentos: Dict[str, OrcamentoHedge] = {}
+# Só as cópias rodam aqui; a requisição original fica na thread de quem chamou
+_executor = ThreadPoolExecutor(max_workers=MAX_COPIAS_SIMULTANEAS, thread_name_prefix="hedge-copia")
+
+# --- Conexões em uso por thread (para interromper a original) ---
+
+_conexoes: Dict[int, object] = {}
+_lock_conexoes = threading.Lock()
+
+class _RastreiaConexao:
+    def _get_conn(self, timeout=None):
+        conexao = super()._get_conn(timeout)
+        with _lock_conexoes:
+            _conexoes[threading.get_ident()] = conexao
+        return conexao
+
+    def _put_conn(self, conn):
+        # Devolvida ao pool, a conexão pode ir para outra thread: não pode mais ser interrompida por esta
+        with _lock_conexoes:
+            if _conexoes.get(threading.get_ident()) is conn:
+                del _conexoes[threading.get_ident()]
+        super()._put_conn(conn)
+
+class _PoolHTTPRastreado(_RastreiaConexao, HTTPConnectionPool):
+    pass
+
+class _PoolHTTPSRastreado(_RastreiaConexao, HTTPSConnectionPool):
+    pass
+
+def preparar_sessao(sessao) -> None:
+    """Faz a sessão requests anotar a conexão usada por cada thread (idempotente)."""
+    with _lock:
+        for esquema, classe in (("http", _PoolHTTPRastreado), ("https", _PoolHTTPSRastreado)):
+            gerente = getattr(sessao.get_adapter(f"{esquema}://"), "poolmanager", None)
+            if gerente is None or gerente.pool_classes_by_scheme.get(esquema) is classe:
+                continue
+            gerente.pool_classes_by_scheme = dict(gerente.pool_classes_by_scheme, **{esquema: classe})
+            gerente.clear()     # pools já abertos voltam a ser criados com a classe rastreada
+
+class Cancelada(Exception):
+    """A requisição original foi interrompida porque a cópia respondeu antes."""
+
+class Tentativa:
+    """Uma execução de `funcao`; ela deve chamar `iniciar()` já dentro da vaga do host."""
+    def __init__(self, ao_iniciar: Optional[Callable[["Tentativa"], None]] = None):
+        self.inicio: Optional[float] = None
+        self.cancelada = False
+        self.copia = None
+        self._thread: Optional[int] = None
+        self._terminou = False
+        self._ao_iniciar = ao_iniciar
+        self._lock = threading.Lock()
+
+    def iniciar(self) -> None:
+        with self._lock:
+            self.inicio = time.monotonic()
+            self._thread = threading.get_ident()
+        if self._ao_iniciar:
+            self._ao_iniciar(self)
+
+    def latencia(self) -> Optional[float]:
+        return None if self.inicio is None else time.monotonic() - self.inicio
+
+    def terminar(self) -> None:
+        with self._lock:
+            self._terminou = True
+
+    def cancelar(self) -> bool:
+        """Fecha o socket da requisição ainda em andamento; False se ela já terminou."""
+        with self._lock, _lock_conexoes:
+            if self._terminou or self._thread is None:
+                return False
+            sock = getattr(_conexoes.get(self._thread), "sock", None)
+            if sock is None:
+                return False
+            self.cancelada = True
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return True
+
+# --- Agendador dos gatilhos ---
+
+class _Vigia:
+    """Uma thread só para todos os gatilhos pendentes (não uma thread por requisição)."""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._fila = []
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def agendar(self, quando: float, acao: Callable[[], None]) -> None:
+        with self._cond:
+            heapq.heappush(self._fila, (quando, next(self._seq), acao))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._rodar, name="hedge-vigia", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _rodar(self) -> None:
+        while True:
+            with self._cond:
+                while not self._fila or self._fila[0][0] > time.monotonic():
+                    self._cond.wait(None if not self._fila else self._fila[0][0] - time.monotonic())
+                _, _, acao = heapq.heappop(self._fila)
+            try:
+                acao()
+            except Exception as e:
+                log_error(f"[hedge] Falha ao disparar cópia: {e}")
+
+_vigia = _Vigia()
+
+def _estado(chave: str):
+    with _lock:
+        if chave not in _rastreadores:
+            _rastreadores[chave] = RastreadorLatencia()
+            _orcamentos[chave] = OrcamentoHedge()
+        return _rastreadores[chave], _orcamentos[chave]
+
+def _disparar_copia(chave: str, funcao: Callable, fracao_orcamento: float, original: Tentativa, gatilho: float) -> None:
+    rastreador, orcamento = _estado(chave)
+    with original._lock:
+        if original._terminou or not orcamento.reservar(fracao_orcamento):
+            return
+        log_info(f"[hedge] {chave}: sem resposta em {gatilho:.1f}s, enviando requisição duplicada.")
+
+        def _copia():
+            tentativa = Tentativa()
+            resultado = funcao(tentativa)
+            if tentativa.inicio is not None:
+                rastreador.registrar(tentativa.latencia())
+            # Ainda em andamento, a original é interrompida e a thread chamadora fica com esta resposta
+            if original.cancelar():
+                orcamento.contar_vitoria()
+            return resultado
+
+        original.copia = _executor.submit(_copia)
+
+def executar(chave: str, funcao: Callable[[Tentativa], object], fracao_orcamento: float = 0.05):
+    """Executa `funcao(tentativa)` na thread chamadora, com hedge pela latência da operação `chave`.
+
+    `funcao` chama `tentativa.iniciar()` ao ganhar a vaga do host e, se a requisição falhar com
+    `tentativa.cancelada`, levanta `Cancelada`. Sem amostras suficientes não há cópia. A cópia que
+    perde não é interrompida, apenas tem o resultado descartado.
+    """
+    rastreador, orcamento = _estado(chave)
+    orcamento.contar_original()
+    gatilho = rastreador.gatilho() if fracao_orcamento > 0 else None
+    ao_iniciar = None
+    if gatilho is not None:
+        ao_iniciar = lambda t: _vigia.agendar(t.inicio + gatilho, lambda: _disparar_copia(chave, funcao, fracao_orcamento, t, gatilho))
+    original = Tentativa(ao_iniciar)
+    try:
+        resultado = funcao(original)
+    except BaseException as erro:
+        original.terminar()
+        if original.copia is None:
+            raise
+        # Original interrompida pela cópia vencedora, ou falhou por conta própria: vale a cópia
+        try:
+            return original.copia.result()
+        except Exception:
+            if original.cancelada:
+                raise
+            raise erro
+    original.terminar()
+    if original.inicio is not None:
+        rastreador.registrar(original.latencia())
+    return resultado
+
+def estatisticas() -> Dict[str, Dict]:
+    with _lock:
+        chaves = list(_rastreadores)
+    dados = {}
+    for chave in chaves:
+        rastreador, orcamento = _estado(chave)
+        p50, p95 = rastreador.percentil(50), rastreador.percentil(95)
+        dados[chave] = {"originais": orcamento.originais, "copias": orcamento.copias,
+                        "vitorias_copia": orcamento.vitorias_copia,
+                        "p50_s": round(p50 or 0.0, 3), "p95_s": round(p95 or 0.0, 3)}
+    return dados
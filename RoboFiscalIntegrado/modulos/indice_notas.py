@@ -0,0 +1,165 @@
+#--------------------------------------------------------------------------
+# modulos/indice_notas.py - v1.0 ÍNDICE LOCAL DE NOTAS CAPTURADAS
+# Guarda, por cliente, tipo (prestadas/tomadas) e pasta de destino, as notas
+# já gravadas em disco com o hash do XML, e a "marca d'água" com o período
+# que já foi capturado por completo nessa pasta. Usado pela captura incremental.
+#--------------------------------------------------------------------------
+import sqlite3
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+# Banco separado do cadastro de clientes, na mesma pasta 'dados'
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(SCRIPT_DIR, "dados", "indice_notas.db")
+
+_lock = threading.Lock()
+_inicializado: Optional[str] = None
+
+def initialize_db():
+    """Cria as tabelas do índice (notas e marcas d'água) se ainda não existirem."""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    con = sqlite3.connect(DB_PATH)
+    cur = con.cursor()
+    # WAL permite que vários clientes gravem no índice ao mesmo tempo sem bloquear as leituras
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS notas (
+            id_cliente TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            pasta TEXT NOT NULL,
+            numero TEXT NOT NULL,
+            data_emissao TEXT NOT NULL,
+            hash_xml TEXT NOT NULL,
+            caminho_xml TEXT,
+            caminho_pdf TEXT,
+            atualizado_em TEXT,
+            PRIMARY KEY (id_cliente, tipo, pasta, numero, data_emissao)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS marcas (
+            id_cliente TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            pasta TEXT NOT NULL,
+            capturado_de TEXT NOT NULL,
+            capturado_ate TEXT NOT NULL,
+            atualizado_em TEXT,
+            PRIMARY KEY (id_cliente, tipo, pasta)
+        )
+    """)
+    con.commit()
+    con.close()
+
+def get_connection():
+    global _inicializado
+    with _lock:
+        if _inicializado != DB_PATH:
+            initialize_db()
+            _inicializado = DB_PATH
+    con = sqlite3.connect(DB_PATH, timeout=30)
+    con.row_factory = sqlite3.Row
+    return con
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+# --- Notas ---
+
+def carregar_notas(id_cliente: str, tipo: str, pasta: str) -> Dict[Tuple[str, str], sqlite3.Row]:
+    """Todas as notas já indexadas do cliente/tipo na pasta, por (numero, data_emissao)."""
+    con = get_connection()
+    cur = con.cursor()
+    cur.execute("SELECT numero, data_emissao, hash_xml, caminho_xml, caminho_pdf FROM notas WHERE id_cliente = ? AND tipo = ? AND pasta = ?",
+                (str(id_cliente), tipo, pasta))
+    notas = {(row['numero'], row['data_emissao']): row for row in cur.fetchall()}
+    con.close()
+    return notas
+
+def registrar_nota(id_cliente: str, tipo: str, pasta: str, numero: str, data_emissao: str, hash_xml: str, caminho_xml: str):
+    """Insere ou atualiza a nota após gravar o XML (mantém o PDF registrado se o XML não mudou)."""
+    con = get_connection()
+    cur = con.cursor()
+    cur.execute("""
+        INSERT INTO notas (id_cliente, tipo, pasta, numero, data_emissao, hash_xml, caminho_xml, caminho_pdf, atualizado_em)
+        VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?)
+        ON CONFLICT (id_cliente, tipo, pasta, numero, data_emissao) DO UPDATE SET
+            caminho_pdf = CASE WHEN notas.hash_xml = excluded.hash_xml THEN notas.caminho_pdf ELSE NULL END,
+            hash_xml = excluded.hash_xml,
+            caminho_xml = excluded.caminho_xml,
+            atualizado_em = excluded.atualizado_em
+    """, (str(id_cliente), tipo, pasta, numero, data_emissao, hash_xml, caminho_xml, _agora()))
+    con.commit()
+    con.close()
+
+def registrar_pdf(id_cliente: str, tipo: str, pasta: str, numero: str, data_emissao: str, caminho_pdf: str):
+    con = get_connection()
+    cur = con.cursor()
+    cur.execute("UPDATE notas SET caminho_pdf = ?, atualizado_em = ? WHERE id_cliente = ? AND tipo = ? AND pasta = ? AND numero = ? AND data_emissao = ?",
+                (caminho_pdf, _agora(), str(id_cliente), tipo, pasta, numero, data_emissao))
+    con.commit()
+    con.close()
+
+def contar_xml_ausentes(id_cliente: str, tipo: str, pasta: str, de: date, ate: date) -> int:
+    """Notas indexadas emitidas no período cujo XML não está mais em disco (apagado ou movido)."""
+    con = get_connection()
+    cur = con.cursor()
+    cur.execute("SELECT caminho_xml FROM notas WHERE id_cliente = ? AND tipo = ? AND pasta = ? AND data_emissao >= ? AND data_emissao < ?",
+                (str(id_cliente), tipo, pasta, de.isoformat(), (ate + timedelta(days=1)).isoformat()))
+    caminhos = [row['caminho_xml'] for row in cur.fetchall()]
+    con.close()
+    return sum(1 for caminho in caminhos if not (caminho and os.path.exists(caminho)))
+
+# --- Marca d'água por cliente/tipo/pasta ---
+
+def obter_marca(id_cliente: str, tipo: str, pasta: str) -> Optional[Tuple[date, date]]:
+    """Intervalo (de, até) já capturado sem lacunas para o cliente/tipo nesta pasta de destino."""
+    con = get_connection()
+    cur = con.cursor()
+    cur.execute("SELECT capturado_de, capturado_ate FROM marcas WHERE id_cliente = ? AND tipo = ? AND pasta = ?", (str(id_cliente), tipo, pasta))
+    row = cur.fetchone()
+    con.close()
+    return (date.fromisoformat(row['capturado_de']), date.fromisoformat(row['capturado_ate'])) if row else None
+
+def avancar_marca(id_cliente: str, tipo: str, pasta: str, capturado_de: date, capturado_ate: date):
+    """Registra um período capturado por completo.
+
+    Se ele encosta no intervalo já marcado, os dois são unidos; se não encosta,
+    fica valendo o mais recente (as rotinas sempre andam para frente).
+    """
+    um_dia = timedelta(days=1)
+    con = get_connection()
+    try:
+        cur = con.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT capturado_de, capturado_ate FROM marcas WHERE id_cliente = ? AND tipo = ? AND pasta = ?", (str(id_cliente), tipo, pasta))
+        row = cur.fetchone()
+        if row:
+            de_atual, ate_atual = date.fromisoformat(row['capturado_de']), date.fromisoformat(row['capturado_ate'])
+            if capturado_de <= ate_atual + um_dia and capturado_ate >= de_atual - um_dia:
+                capturado_de, capturado_ate = min(de_atual, capturado_de), max(ate_atual, capturado_ate)
+            elif capturado_ate < de_atual:
+                con.rollback()
+                return
+        cur.execute("""
+            INSERT INTO marcas (id_cliente, tipo, pasta, capturado_de, capturado_ate, atualizado_em) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id_cliente, tipo, pasta) DO UPDATE SET
+                capturado_de = excluded.capturado_de,
+                capturado_ate = excluded.capturado_ate,
+                atualizado_em = excluded.atualizado_em
+        """, (str(id_cliente), tipo, pasta, capturado_de.isoformat(), capturado_ate.isoformat(), _agora()))
+        con.commit()
+    finally:
+        con.close()
+
+def remover_marca(id_cliente: str, tipo: Optional[str] = None):
+    """Descarta a marca d'água (em todas as pastas) para forçar uma recaptura completa do cliente."""
+    con = get_connection()
+    cur = con.cursor()
+    if tipo:
+        cur.execute("DELETE FROM marcas WHERE id_cliente = ? AND tipo = ?", (str(id_cliente), tipo))
+    else:
+        cur.execute("DELETE FROM marcas WHERE id_cliente = ?", (str(id_cliente),))
+    con.commit()
+    con.close()
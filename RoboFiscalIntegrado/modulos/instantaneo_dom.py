@@ -0,0 +1,97 @@
+#--------------------------------------------------------------------------
+# modulos/instantaneo_dom.py - v1.0 CONSULTA DO DOM EM LOTE
+# Resolve um conjunto de seletores (CSS ou XPath, com XPaths relativos a
+# cada elemento achado) num único evaluate e devolve presença, visibilidade,
+# estado marcado, texto e atributos. Cada elemento recebe um data-robo-ref,
+# então a ação seguinte (clicar, preencher) aponta direto para ele sem
+# refazer a cadeia de locators.
+#--------------------------------------------------------------------------
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+_CAPTURAR_JS = r"""consultas => {
+    window.__roboRef = window.__roboRef || 0;
+    const visivel = el => el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden';
+    const porXpath = (expr, ctx) => {
+        const r = document.evaluate(expr, ctx, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        const nos = [];
+        for (let i = 0; i < r.snapshotLength; i++) nos.push(r.snapshotItem(i));
+        return nos.filter(n => n.nodeType === 1);
+    };
+    const texto = el => (el.innerText || el.textContent || '').trim();
+    const descrever = (el, atributos, comTexto) => {
+        if (!el.hasAttribute('data-robo-ref')) el.setAttribute('data-robo-ref', String(++window.__roboRef));
+        const d = {ref: el.getAttribute('data-robo-ref'), tag: el.tagName.toLowerCase(),
+                   visivel: visivel(el), marcado: !!el.checked, atributos: {}};
+        if (comTexto) d.texto = texto(el);
+        for (const a of atributos) d.atributos[a] = el.getAttribute(a);
+        return d;
+    };
+    const resultado = {};
+    for (const [nome, c] of Object.entries(consultas)) {
+        let els;
+        try {
+            els = c.xpath ? porXpath(c.xpath, document) : Array.from(document.querySelectorAll(c.css));
+        } catch (e) {
+            els = [];
+        }
+        if (c.contem) {
+            const alvo = c.contem.toLowerCase();
+            els = els.filter(el => texto(el).toLowerCase().includes(alvo));
+        }
+        if (c.visiveis) els = els.filter(visivel);
+        resultado[nome] = els.slice(0, c.limite).map(el => {
+            const d = descrever(el, c.atributos, c.texto);
+            d.relativos = {};
+            for (const [rel, expr] of Object.entries(c.relativos)) {
+                const alvo = porXpath(expr, el)[0];
+                d.relativos[rel] = alvo ? descrever(alvo, c.atributos, false) : null;
+            }
+            return d;
+        });
+    }
+    return resultado;
+}"""
+
+@dataclass
+class Elemento:
+    ref: str
+    tag: str
+    visivel: bool
+    marcado: bool
+    atributos: Dict[str, Optional[str]]
+    texto: str = ""
+    relativos: Dict[str, Optional["Elemento"]] = field(default_factory=dict)
+
+    def locator(self, pagina):
+        """Locator do elemento: pelo id quando há (sobrevive a re-render do ajax), senão pelo data-robo-ref."""
+        id_ = self.atributos.get("id")
+        if id_:
+            return pagina.locator(f"[id='{id_}']").first
+        return pagina.locator(f"[data-robo-ref='{self.ref}']").first
+
+def consulta(css: str = "", xpath: str = "", contem: str = "", visiveis: bool = False, texto: bool = False,
+             atributos: Optional[List[str]] = None, relativos: Optional[Dict[str, str]] = None,
+             limite: int = 50) -> Dict:
+    """Uma consulta do lote; `relativos` são XPaths avaliados a partir de cada elemento achado."""
+    return {"css": css, "xpath": xpath, "contem": contem, "visiveis": visiveis, "texto": texto,
+            "atributos": sorted(set(["id"] + list(atributos or []))), "relativos": relativos or {},
+            "limite": limite}
+
+def _elemento(bruto: Dict) -> Elemento:
+    return Elemento(ref=bruto["ref"], tag=bruto["tag"], visivel=bruto["visivel"], marcado=bruto["marcado"],
+                    atributos=bruto.get("atributos") or {}, texto=bruto.get("texto") or "",
+                    relativos={k: _elemento(v) if v else None for k, v in (bruto.get("relativos") or {}).items()})
+
+def capturar(pagina, consultas: Dict[str, Dict]) -> Dict[str, List[Elemento]]:
+    """Executa todas as `consultas` (nome -> consulta(...)) num único round-trip."""
+    brutos = pagina.evaluate(_CAPTURAR_JS, consultas)
+    return {nome: [_elemento(b) for b in brutos.get(nome, [])] for nome in consultas}
+
+def primeiro(resultado: Dict[str, List[Elemento]], *nomes: str, visivel: bool = False) -> Optional[Elemento]:
+    """Primeiro elemento achado, olhando as consultas na ordem dada."""
+    for nome in nomes:
+        for el in resultado.get(nome, []):
+            if el.visivel or not visivel:
+                return el
+    return None
@@ -0,0 +1,118 @@
+#--------------------------------------------------------------------------
+# modulos/monitor_ociosidade.py - v1.1 ESPERA DE OCIOSIDADE DENTRO DA PÁGINA
+# Um script injetado na página junta num só promise o que antes eram várias
+# consultas do Python a cada 50 ms: fila de ajax do PrimeFaces, jQuery.active,
+# blockUI/overlays visíveis e um MutationObserver (DOM sem mudanças por uma
+# janela curta). O Python faz um único evaluate e recebe quanto tempo esperou
+# e por quê; as latências por clique ficam acumuladas para o resumo da rotina.
+#--------------------------------------------------------------------------
+import threading
+from typing import Dict, Optional
+
+from modulos.logger import log_info
+
+# Janela sem mutações no DOM para considerar a página assentada
+QUIETO_MS = 80
+
+SCRIPT_MONITOR = r"""(() => {
+    if (window.__roboOcioso) return;
+    let ultimaMutacao = performance.now();
+    const observar = () => {
+        try {
+            // Marcações data-robo-ref da consulta em lote não contam como atividade da página
+            const observador = new MutationObserver(registros => {
+                if (registros.some(r => r.attributeName !== 'data-robo-ref')) ultimaMutacao = performance.now();
+            });
+            observador.observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+        } catch (e) {}
+    };
+    if (document.documentElement) observar(); else document.addEventListener('DOMContentLoaded', observar);
+
+    const OVERLAYS = ".ui-widget-overlay, .ui-dialog-mask, .ui-blockui, [aria-busy='true']";
+    const visivel = el => el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden';
+    const overlay = () => {
+        for (const el of document.querySelectorAll(OVERLAYS)) if (visivel(el)) return true;
+        const r = document.evaluate("//div[contains(text(), 'Processando')]", document, null,
+                                    XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < r.snapshotLength; i++) if (visivel(r.snapshotItem(i))) return true;
+        return false;
+    };
+    const pendente = quietoMs => {
+        const pf = window.PrimeFaces;
+        if (pf && pf.ajax && pf.ajax.Queue && pf.ajax.Queue.isEmpty && !pf.ajax.Queue.isEmpty()) return 'ajax';
+        if (window.jQuery && window.jQuery.active > 0) return 'jquery';
+        if (window.jQuery && window.jQuery.blockUI && document.querySelector('.blockUI.blockOverlay')) return 'blockui';
+        if (overlay()) return 'overlay';
+        if (performance.now() - ultimaMutacao < quietoMs) return 'dom';
+        return null;
+    };
+
+    window.__roboOcioso = (quietoMs, timeoutMs) => new Promise(resolve => {
+        const inicio = performance.now();
+        const espera = {};
+        let anterior = inicio;
+        const passo = () => {
+            const agora = performance.now();
+            const motivo = pendente(quietoMs);
+            if (motivo === null) return resolve({ocioso: true, ms: agora - inicio, espera});
+            espera[motivo] = (espera[motivo] || 0) + (agora - anterior);
+            anterior = agora;
+            if (agora - inicio >= timeoutMs) return resolve({ocioso: false, ms: agora - inicio, espera});
+            setTimeout(passo, 16);
+        };
+        passo();
+    });
+})()"""
+
+_AGUARDAR_JS = "([quietoMs, timeoutMs]) => window.__roboOcioso ? window.__roboOcioso(quietoMs, timeoutMs) : null"
+
+_lock = threading.Lock()
+_latencias: Dict[str, Dict[str, float]] = {}
+
+def instalar(contexto) -> None:
+    """Injeta o monitor em todas as páginas que o contexto abrir (desde o início do carregamento)."""
+    contexto.add_init_script(script=SCRIPT_MONITOR)
+
+def esperar(pagina, timeout_ms: int, quieto_ms: int = QUIETO_MS) -> Optional[Dict]:
+    """Aguarda a página ficar ociosa (ou `timeout_ms`) num único round-trip; devolve o detalhe do JS."""
+    for _ in range(2):
+        try:
+            detalhe = pagina.evaluate(_AGUARDAR_JS, [quieto_ms, timeout_ms])
+            if detalhe is not None:
+                return detalhe
+            # Página aberta antes da instalação no contexto
+            pagina.evaluate(SCRIPT_MONITOR)
+        except Exception:
+            # Navegação no meio da espera destrói o contexto JS; espera a página nova e tenta de novo
+            try:
+                pagina.wait_for_load_state("domcontentloaded", timeout=timeout_ms)
+            except Exception:
+                return None
+    return None
+
+def registrar(descricao: str, ms_total: float, detalhe: Optional[Dict]) -> None:
+    with _lock:
+        m = _latencias.setdefault(descricao, {"cliques": 0, "total_ms": 0.0, "max_ms": 0.0, "sem_ocioso": 0})
+        m["cliques"] += 1
+        m["total_ms"] += ms_total
+        m["max_ms"] = max(m["max_ms"], ms_total)
+        if not detalhe or not detalhe.get("ocioso"):
+            m["sem_ocioso"] += 1
+        for motivo, ms in ((detalhe or {}).get("espera") or {}).items():
+            m[f"espera_{motivo}_ms"] = m.get(f"espera_{motivo}_ms", 0.0) + ms
+
+def estatisticas() -> Dict[str, Dict[str, float]]:
+    with _lock:
+        return {d: dict(m) for d, m in _latencias.items()}
+
+def registrar_resumo(portal: str, limite: int = 5) -> None:
+    """Loga os cliques que mais tempo custaram e em que a página os fez esperar."""
+    dados = estatisticas()
+    if not dados:
+        return
+    for descricao, m in sorted(dados.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)[:limite]:
+        esperas = {k[7:-3]: v for k, v in m.items() if k.startswith("espera_")}
+        principal = max(esperas, key=esperas.get) if esperas else "-"
+        log_info(f"[{portal}] Clique '{descricao}': {int(m['cliques'])}x, média {m['total_ms'] / m['cliques']:.0f} ms, "
+                 f"máx {m['max_ms']:.0f} ms, esperando mais por {principal}"
+                 + (f", {int(m['sem_ocioso'])} sem ociosidade" if m['sem_ocioso'] else "") + ".")
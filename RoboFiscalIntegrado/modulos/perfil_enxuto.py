@@ -0,0 +1,130 @@
+#--------------------------------------------------------------------------
+# modulos/perfil_enxuto.py - v1.0 PERFIL DO CHROMIUM DESCARTÁVEL COM SNAPSHOT
+# Em vez de abrir o perfil persistente inteiro (caches, IndexedDB, Code
+# Cache...), sobe o Chromium num perfil temporário (tmpfs quando houver) e
+# semeia só cookies e localStorage a partir de um snapshot compacto, cifrado
+# pelo mesmo armazenamento das sessões. Ao fechar, o snapshot é regravado e
+# o perfil temporário apagado. Perfis persistentes têm os caches podados
+# periodicamente.
+#--------------------------------------------------------------------------
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+import gestor_config
+from modulos import sessoes_portal
+from modulos.logger import log_info, log_error
+
+# Diretórios de cache do Chromium que podem ser apagados sem perder login nem preferências
+PASTAS_CACHE = ("Cache", "Code Cache", "GPUCache", "DawnCache", "DawnGraphiteCache", "DawnWebGPUCache",
+                "GrShaderCache", "GraphiteDawnCache", "ShaderCache", "component_crx_cache",
+                "optimization_guide_model_store", os.path.join("Service Worker", "CacheStorage"),
+                os.path.join("Service Worker", "ScriptCache"))
+MARCA_PODA = ".ultima_poda"
+
+_SEMEAR_LOCAL_STORAGE = """(dados => {
+    const itens = dados[location.origin];
+    if (!itens) return;
+    try {
+        for (const [nome, valor] of itens) {
+            if (localStorage.getItem(nome) === null) localStorage.setItem(nome, valor);
+        }
+    } catch (e) {}
+})"""
+
+def _pasta_temporaria() -> str:
+    # tmpfs no Linux; no Windows, a pasta temporária do usuário
+    return "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+
+def _tamanho(pasta: Path) -> int:
+    total = 0
+    for raiz, _, arquivos in os.walk(pasta):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+def podar_cache(perfil_dir, intervalo_horas: float) -> int:
+    """Apaga os caches do perfil se a última poda foi há mais de `intervalo_horas`; devolve os bytes liberados."""
+    perfil = Path(perfil_dir)
+    if not perfil.is_dir() or intervalo_horas <= 0:
+        return 0
+    marca = perfil / MARCA_PODA
+    try:
+        if time.time() - marca.stat().st_mtime < intervalo_horas * 3600:
+            return 0
+    except OSError:
+        pass
+
+    liberados = 0
+    for base in [perfil] + [p for p in perfil.iterdir() if p.is_dir()]:
+        for nome in PASTAS_CACHE:
+            alvo = base / nome
+            if alvo.is_dir():
+                liberados += _tamanho(alvo)
+                shutil.rmtree(alvo, ignore_errors=True)
+    marca.touch()
+    if liberados:
+        log_info(f"Cache do perfil {perfil} podado: {liberados / 1e6:.1f} MB liberados.")
+    return liberados
+
+def semear(contexto, estado: Dict) -> None:
+    """Aplica cookies e localStorage de um storage_state num contexto já aberto."""
+    if estado.get("cookies"):
+        contexto.add_cookies(estado["cookies"])
+    por_origem = {o["origin"]: [[i["name"], i["value"]] for i in o.get("localStorage", [])]
+                  for o in estado.get("origins", []) if o.get("localStorage")}
+    if por_origem:
+        contexto.add_init_script(script=f"{_SEMEAR_LOCAL_STORAGE}({json.dumps(por_origem)})")
+
+@contextmanager
+def contexto_persistente(playwright, perfil_dir, portal: str, config_geral: Dict, **opcoes) -> Iterator:
+    """launch_persistent_context com o modo enxuto quando `perfil_enxuto` está ligado.
+
+    `perfil_dir` continua identificando o perfil (e o snapshot dele); no modo
+    enxuto o Chromium nunca abre essa pasta, só um perfil temporário novo.
+    """
+    perfil_dir = str(perfil_dir)
+    podar_cache(perfil_dir, gestor_config.get_float(config_geral, 'perfil_podar_cache_horas'))
+
+    if not gestor_config.get_bool(config_geral, 'perfil_enxuto'):
+        contexto = _lancar(playwright, perfil_dir, opcoes)
+        try:
+            yield contexto
+        finally:
+            contexto.close()
+        return
+
+    chave = f"perfil_{portal}"
+    ttl_min = gestor_config.get_float(config_geral, 'perfil_enxuto_ttl_dias') * 24 * 60
+    temporario = tempfile.mkdtemp(prefix=f"robo_{portal}_", dir=_pasta_temporaria())
+    try:
+        contexto = _lancar(playwright, temporario, opcoes)
+        try:
+            estado = sessoes_portal.carregar(chave, perfil_dir, ttl_min)
+            if estado:
+                semear(contexto, estado)
+            yield contexto
+        finally:
+            try:
+                sessoes_portal.salvar(chave, perfil_dir, contexto.storage_state())
+            except Exception as e:
+                log_error(f"Não foi possível gravar o snapshot do perfil {portal}: {e}")
+            contexto.close()
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+def _lancar(playwright, pasta: str, opcoes: Dict):
+    try:
+        return playwright.chromium.launch_persistent_context(pasta, **opcoes)
+    except TypeError:
+        # Versões antigas do Playwright não aceitam downloads_path no contexto persistente
+        opcoes = {k: v for k, v in opcoes.items() if k != "downloads_path"}
+        return playwright.chromium.launch_persistent_context(pasta, **opcoes)
@@ -0,0 +1,217 @@
+#--------------------------------------------------------------------------
+# modulos/pipeline_captura.py - v1.1 PIPELINE PRODUTOR/CONSUMIDOR EM ESTÁGIOS
+# Cada estágio tem a sua fila limitada e o seu número de workers, para que
+# rede (páginas SOAP, PDFs) e disco (XMLs) trabalhem ao mesmo tempo. A
+# profundidade de cada fila é amostrada a cada entrada (máxima e média) e a
+# fonte entra nas estatísticas com vazão e ocupação próprias.
+#--------------------------------------------------------------------------
+import sys
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from modulos.logger import log_info, log_error
+
+_FIM = object()
+
+class Estagio:
+    """Um estágio do pipeline: consome itens da sua fila e repassa o resultado ao próximo."""
+    def __init__(self, nome: str, funcao: Callable, workers: int = 1, tamanho_fila: int = 50):
+        self.nome = nome
+        self.funcao = funcao
+        self.workers = max(1, int(workers))
+        self.fila: queue.Queue = queue.Queue(maxsize=max(1, int(tamanho_fila)))
+        self.processados = 0
+        self.erros = 0
+        self.tempo_ocupado = 0.0
+        self.fila_max = 0
+        self._fila_soma = 0
+        self._fila_amostras = 0
+        self._lock = threading.Lock()
+
+    def receber(self, item) -> None:
+        """Enfileira (bloqueia com a fila cheia) e amostra a profundidade logo depois."""
+        self.fila.put(item)
+        profundidade = self.fila.qsize()
+        with self._lock:
+            self.fila_max = max(self.fila_max, profundidade)
+            self._fila_soma += profundidade
+            self._fila_amostras += 1
+
+    @property
+    def fila_media(self) -> float:
+        with self._lock:
+            return self._fila_soma / self._fila_amostras if self._fila_amostras else 0.0
+
+    def _contabilizar(self, duracao: float, erro: bool):
+        with self._lock:
+            self.processados += 1
+            self.tempo_ocupado += duracao
+            if erro:
+                self.erros += 1
+
+class Pipeline:
+    """Encadeia uma função produtora (`fonte`) e uma sequência de estágios.
+
+    A fonte recebe `emitir(item)` e roda na sua própria thread. A função de cada
+    estágio recebe um item e devolve um iterável de itens para o próximo estágio
+    (ou None quando não há nada a repassar).
+    """
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.estagios: List[Estagio] = []
+        self.fonte_emitidos = 0
+        self.fonte_tempo_ocupado = 0.0
+        self._inicio: Optional[float] = None
+        self._fim: Optional[float] = None
+
+    def adicionar_estagio(self, nome: str, funcao: Callable, workers: int = 1, tamanho_fila: int = 50) -> "Pipeline":
+        self.estagios.append(Estagio(nome, funcao, workers, tamanho_fila))
+        return self
+
+    def _repassar(self, indice: int, resultados: Optional[Iterable]):
+        if resultados is None or indice + 1 >= len(self.estagios):
+            return
+        destino = self.estagios[indice + 1]
+        for item in resultados:
+            destino.receber(item)
+
+    def _worker(self, indice: int):
+        estagio = self.estagios[indice]
+        while True:
+            item = estagio.fila.get()
+            if item is _FIM:
+                return
+            t0 = time.perf_counter()
+            erro = False
+            try:
+                self._repassar(indice, estagio.funcao(item))
+            except Exception as e:
+                erro = True
+                log_error(f"[{self.nome}] Falha no estágio '{estagio.nome}': {e}", exc_info=sys.exc_info())
+            finally:
+                estagio._contabilizar(time.perf_counter() - t0, erro)
+
+    def executar(self, fonte: Callable[[Callable], None]) -> None:
+        """Roda o pipeline até a fonte terminar e todas as filas esvaziarem."""
+        if not self.estagios:
+            raise ValueError("Pipeline sem estágios.")
+        self._inicio = time.perf_counter()
+
+        grupos: List[List[threading.Thread]] = []
+        for i, estagio in enumerate(self.estagios):
+            threads = [threading.Thread(target=self._worker, args=(i,), name=f"{self.nome}-{estagio.nome}-{n}", daemon=True)
+                       for n in range(estagio.workers)]
+            for t in threads:
+                t.start()
+            grupos.append(threads)
+
+        primeiro = self.estagios[0]
+        bloqueada = [0.0]
+
+        def emitir(item):
+            self.fonte_emitidos += 1
+            t0 = time.perf_counter()
+            primeiro.receber(item)
+            bloqueada[0] += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        try:
+            fonte(emitir)
+        except Exception as e:
+            log_error(f"[{self.nome}] Falha na fonte do pipeline: {e}", exc_info=sys.exc_info())
+        finally:
+            # Ocupação da fonte: o tempo dela menos o que passou esperando vaga na primeira fila
+            self.fonte_tempo_ocupado = max(0.0, time.perf_counter() - t0 - bloqueada[0])
+            # Encerra estágio a estágio: só sinaliza o próximo quando o anterior drenou tudo
+            for estagio, threads in zip(self.estagios, grupos):
+                for _ in threads:
+                    estagio.fila.put(_FIM)
+                for t in threads:
+                    t.join()
+            self._fim = time.perf_counter()
+
+    def estatisticas(self) -> List[Dict]:
+        """Fonte e estágios: profundidade da fila de entrada (máxima e média), itens, vazão (itens/s) e ocupação."""
+        decorrido = max(((self._fim or time.perf_counter()) - (self._inicio or time.perf_counter())), 1e-9)
+        dados = [{
+            "estagio": "fonte",
+            "workers": 1,
+            "fila_max": 0,
+            "fila_media": 0.0,
+            "processados": self.fonte_emitidos,
+            "erros": 0,
+            "itens_por_s": round(self.fonte_emitidos / decorrido, 2),
+            "ocupacao": round(self.fonte_tempo_ocupado / decorrido, 2),
+        }]
+        for e in self.estagios:
+            dados.append({
+                "estagio": e.nome,
+                "workers": e.workers,
+                "fila_max": e.fila_max,
+                "fila_media": round(e.fila_media, 1),
+                "processados": e.processados,
+                "erros": e.erros,
+                "itens_por_s": round(e.processados / decorrido, 2),
+                "ocupacao": round(e.tempo_ocupado / (decorrido * e.workers), 2),
+            })
+        return dados
+
+    def gargalo(self) -> Optional[str]:
+        """Nome do estágio (ou "fonte") com maior ocupação média dos workers."""
+        dados = self.estatisticas()
+        if not dados:
+            return None
+        return max(dados, key=lambda d: d["ocupacao"])["estagio"]
+
+    def log_estatisticas(self) -> None:
+        partes = [f"{d['estagio']}: {d['processados']} itens, {d['itens_por_s']}/s, ocupação {int(d['ocupacao'] * 100)}%, fila máx {d['fila_max']} (média {d['fila_media']})"
+                  for d in self.estatisticas()]
+        log_info(f"[{self.nome}] Estágios -> " + " | ".join(partes) + f" | Gargalo: {self.gargalo()}")
+
+class ControlePaginacao:
+    """Coordena a busca de páginas com pré-busca de uma página à frente.
+
+    A fonte só pede a página N+2 depois que o estágio de extração informou o
+    resultado da página N; qualquer página com menos itens que o tamanho da
+    página (ou com erro) encerra a paginação.
+    """
+    def __init__(self, tamanho_pagina: int = 50):
+        self.tamanho_pagina = tamanho_pagina
+        self._cond = threading.Condition()
+        self._concluidas = set()
+        self._ultima: Optional[int] = None
+        self.total_itens = 0
+
+    def pode_buscar(self, pagina: int) -> bool:
+        with self._cond:
+            while True:
+                if self._ultima is not None and pagina > self._ultima:
+                    return False
+                if pagina <= 2 or (pagina - 2) in self._concluidas:
+                    return True
+                self._cond.wait()
+
+    def registrar(self, pagina: int, total_itens: int) -> None:
+        with self._cond:
+            self._concluidas.add(pagina)
+            self.total_itens += total_itens
+            if total_itens < self.tamanho_pagina:
+                self._encerrar_em(pagina)
+            self._cond.notify_all()
+
+    def encerrar(self, pagina: int) -> None:
+        with self._cond:
+            self._concluidas.add(pagina)
+            self._encerrar_em(pagina)
+            self._cond.notify_all()
+
+    def _encerrar_em(self, pagina: int):
+        if self._ultima is None or pagina < self._ultima:
+            self._ultima = pagina
+
+    def pagina_valida(self, pagina: int) -> bool:
+        """False para páginas pré-buscadas além da última página real."""
+        with self._cond:
+            return self._ultima is None or pagina <= self._ultima
@@ -0,0 +1,57 @@
+#--------------------------------------------------------------------------
+# modulos/planejador_periodos.py - v1.0 DIVISÃO DE PERÍODOS EM JANELAS
+# Períodos longos (trimestre, ano) viram janelas menores que podem ser
+# paginadas em paralelo. O tamanho da janela se adapta à densidade de
+# notas por dia observada nas janelas já concluídas.
+#--------------------------------------------------------------------------
+import threading
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+Janela = Tuple[date, date]
+
+class PlanejadorPeriodos:
+    """Entrega janelas consecutivas e sem sobreposição de `data_inicio` até `data_fim`.
+
+    Enquanto não há medição, usa `janela_inicial_dias`. Depois de cada janela
+    concluída, o tamanho das próximas mira `notas_por_janela` notas com base na
+    densidade (notas/dia) acumulada; sem notas, a janela dobra de tamanho.
+    """
+    def __init__(self, data_inicio: date, data_fim: date, janela_inicial_dias: int = 31,
+                 notas_por_janela: int = 500, min_dias: int = 1, max_dias: int = 366):
+        self.data_fim = data_fim
+        self.notas_por_janela = max(1, int(notas_por_janela))
+        self.min_dias = max(1, int(min_dias))
+        self.max_dias = max(self.min_dias, int(max_dias))
+        self._proximo_inicio = data_inicio
+        self._dias_janela = min(self.max_dias, max(self.min_dias, int(janela_inicial_dias)))
+        self._dias_medidos = 0
+        self._notas_medidas = 0
+        self._lock = threading.Lock()
+
+    @property
+    def densidade(self) -> Optional[float]:
+        """Notas por dia nas janelas concluídas (None antes da primeira medição)."""
+        with self._lock:
+            return self._notas_medidas / self._dias_medidos if self._dias_medidos else None
+
+    def proxima_janela(self) -> Optional[Janela]:
+        with self._lock:
+            if self._proximo_inicio > self.data_fim:
+                return None
+            inicio = self._proximo_inicio
+            fim = min(self.data_fim, inicio + timedelta(days=self._dias_janela - 1))
+            self._proximo_inicio = fim + timedelta(days=1)
+            return inicio, fim
+
+    def registrar(self, janela: Janela, total_notas: int) -> None:
+        """Informa quantas notas a janela trouxe e recalcula o tamanho das próximas."""
+        inicio, fim = janela
+        with self._lock:
+            self._dias_medidos += (fim - inicio).days + 1
+            self._notas_medidas += max(0, int(total_notas))
+            if self._notas_medidas:
+                dias = round(self.notas_por_janela * self._dias_medidos / self._notas_medidas)
+            else:
+                dias = self._dias_janela * 2
+            self._dias_janela = min(self.max_dias, max(self.min_dias, dias))
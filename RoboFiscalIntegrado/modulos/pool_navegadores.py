@@ -0,0 +1,226 @@
+#--------------------------------------------------------------------------
+# modulos/pool_navegadores.py - v1.1 POOL DE NAVEGADORES AQUECIDOS
+# Mantém N Chromium abertos entre tarefas do app web / interface. O
+# Playwright síncrono só pode ser usado na thread que o criou, então cada
+# navegador vive numa thread própria do pool e a tarefa inteira roda nela:
+# quem chama entrega uma função que recebe o Navegador e espera o resultado.
+# Cada navegador é verificado enquanto ocioso e reciclado quando cai, passa
+# da vida máxima ou atende clientes demais (contém o crescimento de memória).
+# Uma tarefa longa (a fila inteira de um worker) consulta deve_renovar()
+# entre clientes e devolve o navegador para ser reciclado no meio dela.
+#--------------------------------------------------------------------------
+import atexit
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import gestor_config
+from modulos.logger import log_info, log_error
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POOL_DIR = os.path.join(SCRIPT_DIR, "dados", "pool_navegadores")
+VERIFICAR_A_CADA_S = 60
+
+class Navegador:
+    """Um Chromium do pool; só pode ser usado dentro da tarefa que o recebeu."""
+    def __init__(self, indice: int, browser, headless: bool, pasta_downloads: str):
+        self.indice = indice
+        self.browser = browser
+        self.headless = headless
+        self.pasta_downloads = pasta_downloads
+        self.criado_em = time.monotonic()
+        self.clientes = 0
+
+    def novo_contexto(self, **opcoes):
+        opcoes.setdefault("accept_downloads", True)
+        return self.browser.new_context(**opcoes)
+
+    def registrar_clientes(self, quantidade: int = 1) -> None:
+        self.clientes += quantidade
+
+    def saudavel(self) -> bool:
+        try:
+            return self.browser.is_connected() and bool(self.browser.version)
+        except Exception:
+            return False
+
+class _Tarefa:
+    def __init__(self, funcao: Callable[[Navegador], Any], headless: bool):
+        self.funcao = funcao
+        self.headless = headless
+        self.futuro: Future = Future()
+
+_PARAR = object()
+_local = threading.local()
+
+class PoolNavegadores:
+    def __init__(self, tamanho: int = 2, vida_max_s: float = 3600, reciclar_apos_clientes: int = 50):
+        self.tamanho = max(1, int(tamanho))
+        self.vida_max_s = vida_max_s
+        self.reciclar_apos_clientes = max(1, int(reciclar_apos_clientes))
+        self._fila: "queue.Queue[Any]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._estado: Dict[int, Dict] = {}
+
+    def iniciar(self) -> None:
+        for i in range(self.tamanho):
+            t = threading.Thread(target=self._laco, args=(i,), name=f"pool-navegador-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        log_info(f"Pool de navegadores iniciado com {self.tamanho} Chromium.")
+
+    def encerrar(self, timeout: float = 30) -> None:
+        for _ in self._threads:
+            self._fila.put(_PARAR)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def executar(self, funcao: Callable[[Navegador], Any], headless: bool = True) -> Any:
+        """Roda `funcao(navegador)` na thread de um navegador livre e devolve o resultado (ou relança o erro)."""
+        tarefa = _Tarefa(funcao, headless)
+        self._fila.put(tarefa)
+        return tarefa.futuro.result()
+
+    def precisa_reciclar(self, nav: Navegador) -> bool:
+        return self._motivo_reciclagem(nav, nav.headless) is not None
+
+    def estatisticas(self) -> Dict[int, Dict]:
+        with self._lock:
+            return {i: dict(e) for i, e in self._estado.items()}
+
+    # --- Thread de cada navegador ---
+
+    def _motivo_reciclagem(self, nav: Navegador, headless: bool) -> Optional[str]:
+        if not nav.saudavel():
+            return "não responde"
+        if nav.headless != headless:
+            return "modo de janela diferente"
+        if time.monotonic() - nav.criado_em > self.vida_max_s:
+            return "vida máxima atingida"
+        if nav.clientes >= self.reciclar_apos_clientes:
+            return f"{nav.clientes} clientes atendidos"
+        return None
+
+    def _abrir(self, playwright, indice: int, headless: bool) -> Navegador:
+        pasta = os.path.join(POOL_DIR, str(indice), "downloads")
+        shutil.rmtree(pasta, ignore_errors=True)
+        os.makedirs(pasta, exist_ok=True)
+        browser = playwright.chromium.launch(headless=headless, downloads_path=pasta)
+        return Navegador(indice, browser, headless, pasta)
+
+    def _garantir(self, playwright, indice: int, nav: Optional[Navegador], headless: bool) -> Navegador:
+        if nav is not None:
+            motivo = self._motivo_reciclagem(nav, headless)
+            if motivo is None:
+                return nav
+            log_info(f"[pool] Reciclando navegador {indice}: {motivo}.")
+            self._fechar(nav)
+        nav = self._abrir(playwright, indice, headless)
+        with self._lock:
+            e = self._estado.setdefault(indice, {"lancamentos": 0, "tarefas": 0})
+            e["lancamentos"] += 1
+        return nav
+
+    def _fechar(self, nav: Optional[Navegador]) -> None:
+        if nav is None:
+            return
+        try:
+            nav.browser.close()
+        except Exception:
+            pass
+
+    def _laco(self, indice: int) -> None:
+        from playwright.sync_api import sync_playwright
+        nav: Optional[Navegador] = None
+        with sync_playwright() as p:
+            try:
+                nav = self._garantir(p, indice, None, True)
+            except Exception as e:
+                log_error(f"[pool] Não foi possível aquecer o navegador {indice}: {e}")
+            while True:
+                try:
+                    tarefa = self._fila.get(timeout=VERIFICAR_A_CADA_S)
+                except queue.Empty:
+                    # Verificação ociosa: o próximo pedido já encontra um navegador pronto
+                    if nav is not None:
+                        try:
+                            nav = self._garantir(p, indice, nav, nav.headless)
+                        except Exception as e:
+                            log_error(f"[pool] Falha ao reabrir o navegador {indice}: {e}")
+                            nav = None
+                    continue
+                if tarefa is _PARAR:
+                    break
+                if not tarefa.futuro.set_running_or_notify_cancel():
+                    continue
+                try:
+                    nav = self._garantir(p, indice, nav, tarefa.headless)
+                    _local.navegador = nav
+                    tarefa.futuro.set_result(tarefa.funcao(nav))
+                except BaseException as e:
+                    tarefa.futuro.set_exception(e)
+                finally:
+                    _local.navegador = None
+                    if nav is not None:
+                        # Contextos esquecidos pela tarefa não podem se acumular no navegador
+                        for ctx in list(nav.browser.contexts):
+                            try:
+                                ctx.close()
+                            except Exception:
+                                pass
+                    with self._lock:
+                        self._estado.setdefault(indice, {"lancamentos": 0, "tarefas": 0})["tarefas"] += 1
+            self._fechar(nav)
+
+# --- Pool do processo ---
+
+_pool_lock = threading.Lock()
+_pool: Optional[PoolNavegadores] = None
+
+def iniciar(config_geral: Dict) -> Optional[PoolNavegadores]:
+    """Sobe o pool do processo (chamar uma vez na inicialização do app web / interface)."""
+    global _pool
+    if not gestor_config.get_bool(config_geral, 'pool_navegadores'):
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolNavegadores(
+                tamanho=gestor_config.get_int(config_geral, 'pool_navegadores_tamanho'),
+                vida_max_s=gestor_config.get_float(config_geral, 'pool_navegadores_vida_max_min') * 60,
+                reciclar_apos_clientes=gestor_config.get_int(config_geral, 'pool_navegadores_reciclar_clientes'),
+            )
+            _pool.iniciar()
+            atexit.register(encerrar)
+        return _pool
+
+def obter() -> Optional[PoolNavegadores]:
+    return _pool
+
+def encerrar() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.encerrar()
+            _pool = None
+
+def atual() -> Optional[Navegador]:
+    """Navegador do pool emprestado à thread atual, ou None fora de uma tarefa do pool."""
+    return getattr(_local, "navegador", None)
+
+def deve_renovar() -> bool:
+    """Para fila_trabalho: o navegador emprestado à thread atual já deve ser reciclado?"""
+    pool, nav = _pool, atual()
+    return pool is not None and nav is not None and pool.precisa_reciclar(nav)
+
+def envolvedor(headless: bool) -> Optional[Callable[[Callable[[], Any]], Any]]:
+    """Para fila_trabalho: roda o corpo de cada worker dentro de um navegador do pool (None sem pool)."""
+    pool = _pool
+    if pool is None:
+        return None
+    return lambda corpo: pool.executar(lambda _nav: corpo(), headless=headless)
@@ -1,16 +1,19 @@
 #--------------------------------------------------------------------------
-# modulos/portal_livros_taubate.py - v1.7 COM RETRIES E TIMEOUT MAIOR
+# modulos/portal_livros_taubate.py - v2.8 NAVEGADORES LIMITADOS AO POOL E RECICLADOS ENTRE CLIENTES
 #--------------------------------------------------------------------------
-import os, re, sys, time
+import os, re, sys, threading, time
+from contextlib import contextmanager
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 
-import pytesseract
-from PIL import Image
-import io
 import requests
+import lxml.html
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin
 from modulos.logger import log_info, log_error
+from modulos import controle_hosts, captcha_taubate, sessoes_portal, fila_trabalho, bloqueio_recursos, pool_navegadores, perfil_enxuto, competencias
+import gestor_config
 
 try:
     from playwright.sync_api import TimeoutError as PWTimeoutError, Dialog
@@ -25,11 +28,10 @@ CRC_SENHA = os.getenv("CRC_SENHA")
 CONTADOR_LOGIN_URL = os.getenv("CONTADOR_LOGIN_URL", "https://taubateiss.meumunicipio.digital/taubateiss/contador/login.php")
 PROFILE_DIR = os.path.join("dados", ".profile_taubate")
 DOWNLOAD_DIR = Path("downloads")
-
-try:
-    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-except Exception:
-    print("AVISO: Tesseract OCR não encontrado no caminho padrão.")
+# Pausa mínima entre tentativas de login (o governador do host pode alongá-la, nunca encurtá-la)
+PAUSA_LOGIN_ERRO_S    = 5.0
+PAUSA_LOGIN_CAPTCHA_S = 1.0
+MESES = ["Janeiro","Fevereiro","Março","Abril","Maio","Junho","Julho","Agosto","Setembro","Outubro","Novembro","Dezembro"]
 
 # ======================== Utils ========================
 _FORBIDDEN = r'<>:"/\\|?*\0'
@@ -50,14 +52,25 @@ def _contador_root_only(url: str) -> str:
     base_path = path[: i + len("/contador")] if i != -1 else "/taubateiss/contador"
     return f"{parts.scheme}://{parts.netloc}{base_path}"
 
+def _sessao_contador_valida(url_final: str, corpo: str) -> bool:
+    # Sessão expirada redireciona para login.php (ou devolve o formulário com o campo do CRC)
+    return "/contador/main.php" in url_final and "name='crc'" not in corpo and 'name="crc"' not in corpo
+
 def _update_status(status_obj: Optional[Dict], progress: int, message: str):
     if not status_obj: return
     final_progress = 50 if progress == 100 else int(progress * 0.5)
     status_obj['progress'] = final_progress
     status_obj['message'] = message
 
+def _pausar_login(portal_url: str, pausa_s: float, erro: bool = False) -> None:
+    if erro:
+        # Timeout/erro do portal: o governador reduz a taxa do host antes da próxima tentativa
+        controle_hosts.registrar(portal_url, erro=True)
+    time.sleep(pausa_s)
+    controle_hosts.aguardar(portal_url)
+
 # ======================== Funções do Robô ========================
-def login_contador(page, url, crc, senha) -> None:
+def login_contador(page, url, crc, senha, confianca_minima: float = captcha_taubate.CONFIANCA_MINIMA) -> None:
     portal_url = url or CONTADOR_LOGIN_URL
     
     MAX_RETRIES = 3 # <<< NOVO: Número máximo de tentativas
@@ -65,23 +78,22 @@ def login_contador(page, url, crc, senha) -> None:
         try:
             log_info(f"Tentando acessar o portal... (Tentativa {tentativa}/{MAX_RETRIES})")
             # <<< MUDANÇA: Aumentamos o timeout para 60 segundos
-            page.goto(portal_url, wait_until="domcontentloaded", timeout=60000)
+            controle_hosts.navegar(page, portal_url, wait_until="domcontentloaded", timeout=60000)
             
             log_info("Página de login carregada. Preenchendo formulário...")
             
             page.locator("input[name='crc']").wait_for(timeout=15000)
+
+            # O captcha é resolvido numa thread à parte enquanto o formulário é preenchido
+            captcha_image_bytes = page.locator("img[src*='imagem.php']").first.screenshot()
+            captcha_futuro = captcha_taubate.resolver_em_segundo_plano(captcha_image_bytes, confianca_minima)
+
             page.locator("input[name='crc']").fill(crc or CRC)
             page.locator("input[name='senha']").fill(senha or CRC_SENHA)
-            
-            captcha_image_loc = page.locator("img[src*='imagem.php']").first
-            captcha_image_bytes = captcha_image_loc.screenshot()
-            
-            img = Image.open(io.BytesIO(captcha_image_bytes)).convert('L')
-            lut = [0] * 128 + [255] * (256 - 128)
-            img = img.point(lut, '1')
 
-            config = '--psm 8 -c tessedit_char_whitelist=0123456789'
-            captcha_text = pytesseract.image_to_string(img, config=config).strip()
+            captcha = captcha_futuro.result()
+            captcha_text = captcha.texto
+            log_info(f"CAPTCHA lido via {captcha.metodo}: '{captcha_text}' (confiança {captcha.confianca:.2f}).")
             
             if len(captcha_text) >= 4:
                 page.locator("input[name='confirma']").fill(captcha_text)
@@ -89,36 +101,41 @@ def login_contador(page, url, crc, senha) -> None:
                 try:
                     page.wait_for_url("**/contador/main.php**", timeout=10000) # Timeout maior para pós-login
                     log_info("Login bem-sucedido.")
+                    captcha_taubate.registrar_sucesso(captcha)
                     return # <<< SUCESSO: Sai da função
                 except PWTimeoutError:
                     log_info("Login falhou. Tentando resolver o CAPTCHA novamente.")
                     # A própria estrutura do loop já fará ele recarregar a página
+                    if tentativa < MAX_RETRIES:
+                        _pausar_login(portal_url, PAUSA_LOGIN_CAPTCHA_S)
             else:
                  log_info("CAPTCHA não resolvido corretamente. Tentando novamente.")
+                 if tentativa < MAX_RETRIES:
+                     _pausar_login(portal_url, PAUSA_LOGIN_CAPTCHA_S)
         
         except PWTimeoutError as e:
             log_error(f"Timeout ao tentar carregar a página na tentativa {tentativa}: {e}")
             if tentativa < MAX_RETRIES:
-                log_info("Aguardando 5 segundos antes de tentar novamente...")
-                time.sleep(5)
+                log_info(f"Aguardando {PAUSA_LOGIN_ERRO_S:.0f} segundos antes de tentar novamente...")
+                _pausar_login(portal_url, PAUSA_LOGIN_ERRO_S, erro=True)
             else:
                 log_error("Número máximo de tentativas de login atingido. Desistindo.")
                 raise e # <<< ERRO: Levanta a exceção após todas as tentativas falharem
         except Exception as e:
             log_error(f"Erro inesperado durante o login (tentativa {tentativa}): {e}")
             if tentativa < MAX_RETRIES:
-                time.sleep(5)
+                _pausar_login(portal_url, PAUSA_LOGIN_ERRO_S, erro=True)
             else:
                 raise e
         
         # Recarrega a página se não deu certo, para pegar um novo captcha
         if page.url != portal_url:
-            page.goto(portal_url)
+            controle_hosts.navegar(page, portal_url)
 
 
 def acessar_empresa_via_link(page, cnpj: str, ccm: str, base_root: str) -> None:
     url_emp = f"{base_root}/main.php?acao=acessar&ccm={ccm}&cnpj={cnpj}"
-    page.goto(url_emp, wait_until="domcontentloaded", timeout=30000)
+    controle_hosts.navegar(page, url_emp, wait_until="domcontentloaded", timeout=30000)
     
     try:
         body_text = page.frame_locator("#main").locator("body").inner_text(timeout=5000)
@@ -137,7 +154,6 @@ def ir_para_movimento(page) -> None:
 
 def selecionar_competencia(page, comp: str) -> None:
     ano, mes = parse_competencia(comp)
-    MESES = ["Janeiro","Fevereiro","Março","Abril","Maio","Junho","Julho","Agosto","Setembro","Outubro","Novembro","Dezembro"]
     fl = page.frame_locator("#main")
     fl.locator("select[name='mes']").select_option(label=MESES[mes-1])
     fl.locator("input[name='ano']").fill(str(ano))
@@ -174,7 +190,8 @@ def encerrar_escrituracao(page, comp: str) -> None:
         else:
             log_info(f"Livro de Serviços {tipo_nome} já está encerrado.")
 
-def baixar_livro_mensal_pdf(page, tipo: str, comp: str, client_id: str, cnpj: str, ccm: str, download_dir: Path) -> None:
+def baixar_livro_mensal_pdf(page, tipo: str, comp: str, client_id: str, cnpj: str, ccm: str, download_dir: Path,
+                            sessao: Optional[requests.Session] = None) -> None:
     ano, mes = parse_competencia(comp)
     comp_formatada_arquivo = f"{mes:02d}{ano:04d}"
 
@@ -187,73 +204,329 @@ def baixar_livro_mensal_pdf(page, tipo: str, comp: str, client_id: str, cnpj: st
     sufixo_url = "prestado" if tipo.lower().startswith("p") else "tomado"
     url_livro = f"https://taubateiss.meumunicipio.digital/taubateiss/cgi-local/contribuinte/livro/livro_fiscal_mensal_{sufixo_url}_pdf.php?ccm={ccm}&cnpj={cnpj}&mes={mes:02d}&ano={ano:04d}"
 
-    s = requests.Session()
-    for cookie in page.context.cookies():
-        s.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'])
+    s = sessao
+    if s is None:
+        s = requests.Session()
+        for cookie in page.context.cookies():
+            s.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'])
 
-    response = s.get(url_livro, timeout=60)
+    with controle_hosts.slot(url_livro) as medicao:
+        response = s.get(url_livro, timeout=60)
+        medicao.resposta(response.status_code, response.headers)
     response.raise_for_status()
     if "application/pdf" in response.headers.get("Content-Type", ""):
         with open(destino, "wb") as f: f.write(response.content)
         log_info(f"SUCESSO: Livro de {tipo} salvo em '{destino}'")
 
+# ======================== Fluxo HTTP (sem navegador) ========================
+# Mesmos passos de acessar_empresa_via_link -> encerrar_escrituracao, feitos com
+# GET/POST diretos e os formulários lidos com lxml. O navegador fica só para o
+# login com captcha; a sessão HTTP herda os cookies dele.
+
+class FluxoHTTPIndisponivel(Exception):
+    """A página não tem a estrutura esperada; o cliente volta para o fluxo no navegador."""
+
+def criar_sessao_http(page, pool_maxsize: int = 4) -> requests.Session:
+    s = requests.Session()
+    s.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize))
+    try:
+        s.headers["User-Agent"] = page.evaluate("() => navigator.userAgent")
+    except Exception:
+        pass
+    for cookie in page.context.cookies():
+        s.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie.get('path') or '/')
+    return s
+
+def _http(sessao: requests.Session, metodo: str, url: str, **kwargs):
+    with controle_hosts.slot(url) as medicao:
+        resp = sessao.request(metodo, url, timeout=30, **kwargs)
+        medicao.resposta(resp.status_code, resp.headers)
+    resp.raise_for_status()
+    if "login.php" in resp.url:
+        raise Exception("A sessão do portal expirou durante o fluxo HTTP.")
+    # Sem charset no cabeçalho, o lxml detecta pelo <meta> da própria página
+    conteudo = resp.text if "charset" in resp.headers.get("Content-Type", "").lower() else resp.content
+    doc = lxml.html.document_fromstring(conteudo, base_url=resp.url)
+    doc.make_links_absolute(resp.url)
+    return doc
+
+def _url_de_clique(elemento) -> Optional[str]:
+    """Destino de um link ou de um onclick do tipo location='pagina.php?...'."""
+    for el in [elemento] + list(elemento.iterdescendants()):
+        href = el.get("href") or ""
+        if href and "javascript:" not in href.lower() and not href.endswith("#"):
+            return href
+        m = re.search(r"""['"]([^'"]+\.php[^'"]*)['"]""", el.get("onclick") or "")
+        if m:
+            return urljoin(elemento.base_url or "", m.group(1))
+    return None
+
+def _submeter(sessao: requests.Session, form, botao=None):
+    valores = list(form.form_values())
+    if botao is not None and botao.get("name"):
+        valores.append((botao.get("name"), botao.get("value") or ""))
+    action = form.action or form.base_url
+    if (form.method or "GET").upper() == "POST":
+        return _http(sessao, "POST", action, data=valores)
+    return _http(sessao, "GET", action, params=valores)
+
+def _acessar_empresa_http(sessao: requests.Session, cnpj: str, ccm: str, base_root: str):
+    doc = _http(sessao, "GET", f"{base_root}/main.php?acao=acessar&ccm={ccm}&cnpj={cnpj}")
+    texto = doc.text_content().lower()
+    for frame in doc.xpath("//frame[@id='main' or @name='main'] | //iframe[@id='main' or @name='main']"):
+        if frame.get("src"):
+            texto += _http(sessao, "GET", frame.get("src")).text_content().lower()
+    if "contribuinte não possui procuração eletrônica" in texto or "contribuinte não encontrado" in texto:
+        raise Exception("Empresa sem procuração, ou CNPJ/CCM incorretos.")
+    log_info(f"Acesso à empresa {cnpj} bem-sucedido (HTTP).")
+    return doc
+
+def _ir_para_movimento_http(sessao: requests.Session, doc_principal):
+    celulas = doc_principal.xpath("//td[contains(@class,'menu')][contains(normalize-space(.), 'Movimento (Contribuinte)')]")
+    url = _url_de_clique(celulas[0]) if celulas else None
+    if not url:
+        raise FluxoHTTPIndisponivel("menu 'Movimento (Contribuinte)' sem link reconhecível")
+    return _http(sessao, "GET", url)
+
+def _selecionar_competencia_http(sessao: requests.Session, doc_movimento, comp: str):
+    ano, mes = parse_competencia(comp)
+    forms = doc_movimento.xpath("//form[.//select[@name='mes']]")
+    if not forms:
+        raise FluxoHTTPIndisponivel("formulário de competência não encontrado")
+    form = forms[0]
+    opcoes = [o for o in form.xpath(".//select[@name='mes']/option") if o.text_content().strip() == MESES[mes-1]]
+    if not opcoes:
+        raise FluxoHTTPIndisponivel(f"mês '{MESES[mes-1]}' não encontrado no formulário")
+    form.fields["mes"] = opcoes[0].get("value", opcoes[0].text_content().strip())
+    form.fields["ano"] = str(ano)
+    botoes = form.xpath(".//*[@name='btnOk']")
+    doc = _submeter(sessao, form, botoes[0] if botoes else None)
+    if "Serviços Prestados" not in doc.text_content():
+        raise FluxoHTTPIndisponivel("a competência não abriu a página de escrituração")
+    return doc
+
+def _link_encerramento(doc, tipo_sufixo: str, tipo_nome: str):
+    links = doc.xpath(f"//*[@id='tableEncerra_{tipo_sufixo}']//a")
+    if not links:
+        raise FluxoHTTPIndisponivel(f"quadro de encerramento de {tipo_nome} não encontrado")
+    return links[0]
+
+def _botao_confirmacao(confirmacao, tipo_nome: str):
+    """Botão 'Encerrar' que um POST do formulário reproduz: <button> ou input type=submit, sem JavaScript."""
+    candidatos = [b for b in confirmacao.xpath("//button | //input[@type='submit' or @type='button' or @type='image']")
+                  if re.search("encerrar", b.text_content() or b.get("value") or "", re.IGNORECASE)]
+    if not candidatos:
+        raise FluxoHTTPIndisponivel(f"botão de confirmação do encerramento de {tipo_nome} não encontrado")
+    botao = candidatos[0]
+    form = next(botao.iterancestors("form"), None)
+    submete = (botao.get("type") or ("submit" if botao.tag == "button" else "")).lower() == "submit"
+    # onclick/onsubmit podem preencher campos ou trocar o destino antes do envio
+    if form is None or not submete or botao.get("onclick") or form.get("onsubmit"):
+        raise FluxoHTTPIndisponivel(f"confirmação do encerramento de {tipo_nome} depende de JavaScript")
+    return form, botao
+
+def _encerrar_escrituracao_http(sessao: requests.Session, doc_principal, doc_competencia, comp: str) -> None:
+    doc = doc_competencia
+    for tipo_sufixo, tipo_nome in [("p", "Prestados"), ("t", "Tomados")]:
+        link = _link_encerramento(doc, tipo_sufixo, tipo_nome)
+        if "encerrar escrituração" not in link.text_content().lower():
+            log_info(f"Livro de Serviços {tipo_nome} já está encerrado.")
+            continue
+
+        log_info(f"A encerrar livro de Serviços {tipo_nome}...")
+        url = _url_de_clique(link)
+        if not url:
+            raise FluxoHTTPIndisponivel(f"link de encerramento de {tipo_nome} sem destino reconhecível")
+        confirmacao = _http(sessao, "GET", url)
+        if 'encerrar escrituração "sem movimento"' in confirmacao.text_content().lower():
+            log_info(f"AVISO: Livro de Serviços {tipo_nome} tem notas para validar. O encerramento será ignorado.")
+            doc = _selecionar_competencia_http(sessao, _ir_para_movimento_http(sessao, doc_principal), comp)
+            continue
+
+        form, botao = _botao_confirmacao(confirmacao, tipo_nome)
+        log_info("Confirmando encerramento...")
+        _submeter(sessao, form, botao)
+        doc = _selecionar_competencia_http(sessao, _ir_para_movimento_http(sessao, doc_principal), comp)
+        # A resposta do POST não diz se o portal aceitou; o quadro recarregado diz
+        if "encerrar escrituração" in _link_encerramento(doc, tipo_sufixo, tipo_nome).text_content().lower():
+            raise FluxoHTTPIndisponivel(f"o livro de {tipo_nome} continua aberto depois da confirmação")
+        log_info("Encerrado com sucesso.")
+
+def _processar_cliente_http(sessao: requests.Session, base_root: str, cliente: Dict, competencias: List[str],
+                            download_dir_client: Path, falhas: Dict[str, str]) -> None:
+    """Acessa a empresa uma vez e percorre as competências; cada uma tratada sai de `competencias`.
+
+    Erro numa competência vai para `falhas` e a seguinte continua; FluxoHTTPIndisponivel
+    interrompe e deixa as restantes para o navegador.
+    """
+    doc_principal = _acessar_empresa_http(sessao, cliente['cnpj'], cliente['ccm'], base_root)
+    while competencias:
+        competencia = competencias[0]
+        try:
+            doc = _selecionar_competencia_http(sessao, _ir_para_movimento_http(sessao, doc_principal), competencia)
+            _encerrar_escrituracao_http(sessao, doc_principal, doc, competencia)
+
+            baixar_livro_mensal_pdf(None, "Prestados", competencia, cliente['id'], cliente['cnpj'], cliente['ccm'], download_dir_client, sessao=sessao)
+            baixar_livro_mensal_pdf(None, "Tomados", competencia, cliente['id'], cliente['cnpj'], cliente['ccm'], download_dir_client, sessao=sessao)
+        except FluxoHTTPIndisponivel:
+            raise
+        except Exception as e:
+            log_error(f"ERRO no ID {cliente.get('id')}, competência {competencia}: {e}")
+            falhas[competencia] = str(e)
+        competencias.pop(0)
+
 # --- Função Principal do Módulo ---
-def executar_baixa_livros(clientes: List[Dict], config_geral: Dict, competencia: str, download_dir: str, headful: bool, status_obj: Optional[Dict] = None):
+@contextmanager
+def _contexto_navegador(perfil: str, headful: bool, config_geral: Dict):
+    """Contexto novo no navegador do pool (se a thread é do pool); senão, Chromium próprio com o perfil (enxuto ou completo)."""
+    nav = pool_navegadores.atual()
+    if nav is not None:
+        ctx = nav.novo_contexto()
+        try:
+            yield ctx
+        finally:
+            ctx.close()
+        return
+
     from playwright.sync_api import sync_playwright
-    
-    total_clientes = len(clientes)
-    final_download_dir = Path(download_dir or config_geral.get('pasta_saida_padrao') or DOWNLOAD_DIR)
-    ctx = None
-    
     with sync_playwright() as p:
-        try:
-            _update_status(status_obj, 10, "Iniciando navegador para baixar livros...")
-            ctx = p.chromium.launch_persistent_context(PROFILE_DIR, headless=not headful)
-            page = ctx.new_page()
-            
-            _update_status(status_obj, 15, "Fazendo login no portal do contador...")
+        with perfil_enxuto.contexto_persistente(p, perfil, "taubate", config_geral, headless=not headful) as ctx:
+            yield ctx
+
+@contextmanager
+def _navegador_logado(config_geral: Dict, headful: bool, indice: int, status_obj: Optional[Dict] = None):
+    """Navegador próprio da thread atual, já logado; produz (page, base_root, sessao_http).
+
+    Cada worker usa um perfil e uma sessão guardada separados: a empresa acessada
+    fica na sessão do portal, então dois workers não podem compartilhar login.
+    """
+    perfil = PROFILE_DIR if indice == 0 else f"{PROFILE_DIR}_{indice}"
+    login_url = config_geral.get("url_taubate", CONTADOR_LOGIN_URL)
+    crc = config_geral.get("crc") or CRC
+    chave_sessao = crc if indice == 0 else f"{crc}#{indice}"
+    reutilizar = gestor_config.get_bool(config_geral, 'sessoes_reutilizar')
+    url_main = f"{_contador_root_only(login_url)}/main.php"
+
+    with _contexto_navegador(perfil, headful, config_geral) as ctx:
+        bloqueio_recursos.aplicar(ctx, "taubate", config_geral)
+        page = ctx.new_page()
+        controle_hosts.observar_pagina(page)
+
+        if reutilizar and sessoes_portal.restaurar(ctx, "taubate_contador", chave_sessao, url_main, _sessao_contador_valida,
+                                                   gestor_config.get_float(config_geral, 'sessoes_ttl_min')):
+            controle_hosts.navegar(page, url_main, wait_until="domcontentloaded")
+        else:
+            if indice == 0:
+                _update_status(status_obj, 15, "Fazendo login no portal do contador...")
             login_contador(page,
-                           url=config_geral.get("url_taubate", CONTADOR_LOGIN_URL),
-                           crc=config_geral.get("crc"),
-                           senha=config_geral.get("crc_senha"))
-            
-            base_root = _contador_root_only(page.url)
+                           url=login_url,
+                           crc=crc,
+                           senha=config_geral.get("crc_senha"),
+                           confianca_minima=gestor_config.get_float(config_geral, 'captcha_confianca_minima'))
+            if reutilizar:
+                sessoes_portal.guardar(ctx, "taubate_contador", chave_sessao)
 
-            for i, cliente in enumerate(clientes):
-                progress = 20 + int((i / total_clientes) * 80)
-                _update_status(status_obj, progress, f"Livros ({i+1}/{total_clientes}): Acessando {cliente['id']}...")
-                
-                try:
-                    razao = cliente.get('razao_social') or str(cliente.get('id'))
-                    safe_name = _sanitize_filename_part(f"{cliente.get('id')}-{razao}")
-                    download_dir_client = final_download_dir / safe_name
-                    download_dir_client.mkdir(parents=True, exist_ok=True)
-                    
-                    acessar_empresa_via_link(page, cliente['cnpj'], cliente['ccm'], base_root)
-                    ir_para_movimento(page)
-                    selecionar_competencia(page, competencia)
-                    
-                    encerrar_escrituracao(page, competencia) 
-                    
-                    baixar_livro_mensal_pdf(page, "Prestados", competencia, cliente['id'], cliente['cnpj'], cliente['ccm'], download_dir_client)
-                    baixar_livro_mensal_pdf(page, "Tomados", competencia, cliente['id'], cliente['cnpj'], cliente['ccm'], download_dir_client)
-                    
-                    log_info(f">>> Sucesso para o ID: {cliente['id']} <<<")
-
-                except Exception as e:
-                    log_error(f"ERRO ao processar ID {cliente['id']}: {e}")
-            
-            _update_status(status_obj, 100, "Baixa de livros finalizada.")
+        sessao_http = criar_sessao_http(page) if gestor_config.get_bool(config_geral, 'livros_modo_http') else None
+        yield page, _contador_root_only(page.url), sessao_http
+
+        if reutilizar:
+            # Regrava ao fim para a validade local acompanhar a sessão renovada no portal
+            sessoes_portal.guardar(ctx, "taubate_contador", chave_sessao)
+
+def _processar_cliente(page, base_root: str, cliente: Dict, lista_competencias: List[str], final_download_dir: Path,
+                       sessao_http: Optional[requests.Session] = None) -> None:
+    razao = cliente.get('razao_social') or str(cliente.get('id'))
+    safe_name = _sanitize_filename_part(f"{cliente.get('id')}-{razao}")
+    download_dir_client = final_download_dir / safe_name
+    download_dir_client.mkdir(parents=True, exist_ok=True)
 
+    pendentes = list(lista_competencias)
+    falhas: Dict[str, str] = {}
+    if sessao_http is not None:
+        try:
+            _processar_cliente_http(sessao_http, base_root, cliente, pendentes, download_dir_client, falhas)
+        except FluxoHTTPIndisponivel as e:
+            log_info(f"Fluxo HTTP indisponível para {cliente.get('id')} ({e}). Usando o navegador.")
+
+    if pendentes:
+        # Empresa acessada uma vez; cada competência só troca o período no menu Movimento
+        acessar_empresa_via_link(page, cliente['cnpj'], cliente['ccm'], base_root)
+        for competencia in pendentes:
+            try:
+                ir_para_movimento(page)
+                selecionar_competencia(page, competencia)
+
+                encerrar_escrituracao(page, competencia)
+
+                baixar_livro_mensal_pdf(page, "Prestados", competencia, cliente['id'], cliente['cnpj'], cliente['ccm'], download_dir_client)
+                baixar_livro_mensal_pdf(page, "Tomados", competencia, cliente['id'], cliente['cnpj'], cliente['ccm'], download_dir_client)
+            except Exception as e:
+                log_error(f"ERRO no ID {cliente.get('id')}, competência {competencia}: {e}")
+                falhas[competencia] = str(e)
+
+    if falhas:
+        raise Exception("; ".join(f"{comp}: {erro}" for comp, erro in sorted(falhas.items())))
+
+def executar_baixa_livros(clientes: List[Dict], config_geral: Dict, competencia: Union[str, List[str]], download_dir: str, headful: bool, status_obj: Optional[Dict] = None):
+    """`competencia` aceita uma competência, uma lista ou um intervalo 'AAAA-MM..AAAA-MM'."""
+    lista_competencias = competencias.expandir_competencias(competencia)
+    log_info(f"Baixa de livros para a competência {competencias.descrever(lista_competencias)}.")
+    total_clientes = len(clientes)
+    final_download_dir = Path(download_dir or config_geral.get('pasta_saida_padrao') or DOWNLOAD_DIR)
+    num_contextos = max(1, min(gestor_config.get_int(config_geral, 'livros_contextos'), total_clientes or 1))
+    pool = pool_navegadores.obter()
+    if pool is not None:
+        # Cada contexto ocupa um navegador do pool; além disso só haveria logins sem fila para consumir
+        num_contextos = min(num_contextos, pool.tamanho)
+
+    lock = threading.Lock()
+    progresso_clientes: Dict[str, Dict] = {str(c.get('id')): {"estado": "pendente"} for c in clientes}
+    if status_obj is not None:
+        status_obj['livros'] = progresso_clientes
+    contagem = {"concluidos": 0}
+
+    def _processar(recurso, cliente: Dict):
+        page, base_root, sessao_http = recurso
+        id_cliente = str(cliente.get('id'))
+        with lock:
+            progresso_clientes[id_cliente]["estado"] = "executando"
+            progress = 20 + int((contagem["concluidos"] / total_clientes) * 80)
+            _update_status(status_obj, progress, f"Livros ({contagem['concluidos']}/{total_clientes}): Acessando {id_cliente}...")
+        try:
+            _processar_cliente(page, base_root, cliente, lista_competencias, final_download_dir, sessao_http)
+            log_info(f">>> Sucesso para o ID: {id_cliente} <<<")
+            with lock:
+                progresso_clientes[id_cliente]["estado"] = "concluido"
         except Exception as e:
-            log_error(f"ERRO CRÍTICO no módulo de baixar livros: {e}")
-            if status_obj:
-                status_obj['has_error'] = True
-                status_obj['message'] = f"Erro crítico ao baixar livros: {e}"
-            if ctx:
-                ctx.close()
-            raise
-        
+            log_error(f"ERRO ao processar ID {id_cliente}: {e}")
+            with lock:
+                progresso_clientes[id_cliente]["estado"] = "erro"
+                progresso_clientes[id_cliente]["erro"] = str(e)
         finally:
-            if ctx:
-                ctx.close()
\ No newline at end of file
+            nav = pool_navegadores.atual()
+            if nav is not None:
+                nav.registrar_clientes()
+            with lock:
+                contagem["concluidos"] += 1
+
+    _update_status(status_obj, 10, f"Iniciando {num_contextos} navegador(es) para baixar livros...")
+    resultado = fila_trabalho.executar(
+        clientes, num_contextos,
+        abrir_recurso=lambda indice: _navegador_logado(config_geral, headful, indice, status_obj),
+        processar=_processar, nome="livros",
+        envolver_worker=pool_navegadores.envolvedor(headless=not headful),
+        renovar_recurso=pool_navegadores.deve_renovar)
+
+    if resultado.pendentes:
+        # Nenhum navegador conseguiu continuar (ex.: login recusado em todos)
+        motivo = resultado.erros_workers[-1] if resultado.erros_workers else "navegadores encerrados"
+        for cliente in resultado.pendentes:
+            progresso_clientes[str(cliente.get('id'))]["estado"] = "erro"
+        log_error(f"ERRO CRÍTICO no módulo de baixar livros: {motivo}")
+        if status_obj:
+            status_obj['has_error'] = True
+            status_obj['message'] = f"Erro crítico ao baixar livros: {motivo}"
+        raise Exception(motivo)
+
+    bloqueio_recursos.registrar_resumo("taubate")
+    _update_status(status_obj, 100, "Baixa de livros finalizada.")
@@ -0,0 +1,144 @@
+#--------------------------------------------------------------------------
+# modulos/sessoes_portal.py - v1.0 SESSÕES DE PORTAL PERSISTIDAS
+# Guarda o storage_state do Playwright por credencial (CRC do contador,
+# usuário do SJC), cifrado em disco (Fernet com chave derivada por PBKDF2) e
+# com validade. Antes de reutilizar, uma requisição leve confirma que o
+# portal ainda aceita a sessão; se não aceitar, o chamador faz o login.
+#--------------------------------------------------------------------------
+import base64
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from modulos import controle_hosts
+from modulos.logger import log_info, log_error
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+except ImportError:
+    Fernet = None
+    class InvalidToken(Exception): ...
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSOES_DIR = os.path.join(SCRIPT_DIR, "dados", "sessoes_portal")
+CHAVE_PATH = os.path.join(SCRIPT_DIR, "dados", ".chave_sessoes")
+
+TAMANHO_SAL = 16
+ITERACOES_PBKDF2 = 200_000
+TTL_PADRAO_MIN = 240
+
+_lock = threading.Lock()
+
+def disponivel() -> bool:
+    return Fernet is not None
+
+def _segredo() -> bytes:
+    """Segredo mestre: ROBO_CHAVE_SESSOES ou um arquivo local gerado na primeira vez (só o dono lê)."""
+    do_ambiente = os.getenv("ROBO_CHAVE_SESSOES")
+    if do_ambiente:
+        return do_ambiente.encode("utf-8")
+    with _lock:
+        if not os.path.exists(CHAVE_PATH):
+            os.makedirs(os.path.dirname(CHAVE_PATH), exist_ok=True)
+            fd = os.open(CHAVE_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(secrets.token_urlsafe(32).encode("ascii"))
+        with open(CHAVE_PATH, "rb") as f:
+            return f.read().strip()
+
+def _fernet(sal: bytes) -> "Fernet":
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=sal, iterations=ITERACOES_PBKDF2)
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(_segredo())))
+
+def _caminho(portal: str, usuario: str) -> str:
+    # O nome do arquivo não expõe a credencial
+    resumo = hashlib.sha256(f"{portal}\0{usuario}".encode("utf-8")).hexdigest()[:32]
+    return os.path.join(SESSOES_DIR, f"{portal}_{resumo}.bin")
+
+def salvar(portal: str, usuario: str, estado: Dict) -> bool:
+    """Cifra e grava o storage_state; a validade conta a partir deste momento."""
+    if not disponivel() or not usuario:
+        return False
+    caminho = _caminho(portal, usuario)
+    sal = os.urandom(TAMANHO_SAL)
+    token = _fernet(sal).encrypt_at_time(json.dumps(estado).encode("utf-8"), int(time.time()))
+    try:
+        os.makedirs(SESSOES_DIR, exist_ok=True)
+        temporario = caminho + ".tmp"
+        fd = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(sal + token)
+        os.replace(temporario, caminho)
+        return True
+    except OSError as e:
+        log_error(f"Não foi possível gravar a sessão de {portal}: {e}")
+        return False
+
+def carregar(portal: str, usuario: str, ttl_min: float = TTL_PADRAO_MIN) -> Optional[Dict]:
+    """storage_state guardado, ou None se não existe, expirou ou não decifra com a chave atual."""
+    if not disponivel() or not usuario:
+        return None
+    caminho = _caminho(portal, usuario)
+    try:
+        with open(caminho, "rb") as f:
+            dados = f.read()
+    except OSError:
+        return None
+    sal, token = dados[:TAMANHO_SAL], dados[TAMANHO_SAL:]
+    try:
+        claro = _fernet(sal).decrypt_at_time(token, int(ttl_min * 60), int(time.time()))
+        return json.loads(claro)
+    except (InvalidToken, ValueError):
+        descartar(portal, usuario)
+        return None
+
+def descartar(portal: str, usuario: str) -> None:
+    try:
+        os.remove(_caminho(portal, usuario))
+    except OSError:
+        pass
+
+# --- Integração com o Playwright ---
+
+def restaurar(contexto, portal: str, usuario: str, url_sonda: str,
+              sessao_valida: Callable[[str, str], bool], ttl_min: float = TTL_PADRAO_MIN) -> bool:
+    """Aplica os cookies guardados em `contexto` e confirma a sessão com um GET em `url_sonda`.
+
+    `sessao_valida(url_final, corpo)` decide se a resposta é de uma área logada.
+    A sonda usa contexto.request (mesmos cookies, sem abrir página). Se a
+    sessão não vale mais, os cookies aplicados são removidos e o arquivo apagado.
+    """
+    estado = carregar(portal, usuario, ttl_min)
+    if not estado or not estado.get("cookies"):
+        return False
+    try:
+        contexto.add_cookies(estado["cookies"])
+        with controle_hosts.slot(url_sonda) as medicao:
+            resposta = contexto.request.get(url_sonda, timeout=15000)
+            medicao.resposta(resposta.status, resposta.headers)
+        if resposta.ok and sessao_valida(resposta.url, resposta.text()):
+            log_info(f"Sessão guardada de {portal} reaproveitada; login dispensado.")
+            return True
+        log_info(f"Sessão guardada de {portal} não é mais aceita pelo portal. Fazendo login.")
+    except Exception as e:
+        log_error(f"Falha ao validar a sessão guardada de {portal}: {e}")
+    descartar(portal, usuario)
+    try:
+        contexto.clear_cookies()
+    except Exception:
+        pass
+    return False
+
+def guardar(contexto, portal: str, usuario: str) -> None:
+    """Grava o storage_state atual do contexto (chamar depois do login e ao fim de uma execução bem-sucedida)."""
+    try:
+        if salvar(portal, usuario, contexto.storage_state()):
+            log_info(f"Sessão de {portal} guardada para as próximas execuções.")
+    except Exception as e:
+        log_error(f"Não foi possível guardar a sessão de {portal}: {e}")
@@ -10,20 +10,38 @@ except Exception:
 
 import requests
 try:
-    from requests_pkcs12 import Pkcs12Adapter
+    from modulos import cache_certificados
 except Exception:
-    Pkcs12Adapter = None
+    cache_certificados = None
+
+class _AdaptadorSSLContext(requests.adapters.HTTPAdapter):
+    """Adapter sobre um SSLContext já decifrado (o do cache de certificados)."""
+    def __init__(self, ssl_context, **kwargs):
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super().proxy_manager_for(*args, **kwargs)
 
 def make_zeep_client(wsdl_path: str, pfx_path: Optional[str]=None, pfx_password: Optional[str]=None, timeout: int=60):
     if Client is None:
         return None
 
+    # Sessão própria: o Transport do zeep altera a sessão (User-Agent, adapter file://),
+    # então só o SSLContext decifrado vem do cache compartilhado com o capturador
     session = requests.Session()
-    if pfx_path and pfx_password and Pkcs12Adapter is not None:
+    if pfx_path and pfx_password and cache_certificados is not None:
         try:
-            session.mount('https://', Pkcs12Adapter(pkcs12_filename=pfx_path, pkcs12_password=pfx_password))
+            ssl_context = cache_certificados.obter_ssl_context(pfx_path, pfx_password)
         except Exception:
-            pass
+            ssl_context = None
+        if ssl_context is not None:
+            session.mount('https://', _AdaptadorSSLContext(ssl_context))
 
     transport = Transport(session=session, timeout=timeout)
     settings = Settings(strict=False, xml_huge_tree=True)
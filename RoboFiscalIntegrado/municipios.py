@@ -15,6 +15,7 @@ import unicodedata
 
 MUNICIPIOS_LIST: List[str] = [
     "Taubaté",
+    "São José dos Campos",
     "São Paulo",
     "Campinas",
     "Santo André",
@@ -36,6 +37,7 @@ MUNICIPIOS_LIST: List[str] = [
 # Os nomes aqui devem coincidir (após normalização) com valores de `MUNICIPIOS_LIST`.
 MUNICIPIO_MODELS = {
     "taubate": "taubate",  # uso do módulo específico para Taubaté
+    "sao jose dos campos": "sjc",  # captador do portal de SJC (modulos/captador_SJC_login_patch.py)
     "sao paulo": "sao_paulo_municipal",
     "campinas": "campinas",
     "rio de janeiro": "rio_de_janeiro",
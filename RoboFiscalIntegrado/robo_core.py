@@ -1,17 +1,28 @@
 #--------------------------------------------------------------------------
-# robo_core.py - v1.4 CORREÇÃO DEFINITIVA DA ROTINA COMPLETA
+# robo_core.py - v1.7 GOVERNADOR CONFIGURADO UMA VEZ POR TAREFA
 #--------------------------------------------------------------------------
 import os
 import re
 import time
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 
-from modulos import logger, capturador_nf_taubate, portal_livros_taubate
+import gestor_config as config
+import municipios
+from modulos import logger, capturador_nf_taubate, portal_livros_taubate, controle_hosts, downloader_pdf
+from modulos import captador_SJC_login_patch
 
 _FORBIDDEN = r'<>:"/\\|?*\0'
 
+# Clientes sem município cadastrado (anteriores à coluna 'municipio') seguem a rotina de Taubaté
+MODELO_PADRAO = "taubate"
+NOMES_MODELOS = {"taubate": "Taubaté", "sjc": "São José dos Campos"}
+# Intervalo em que o progresso dos grupos é mesclado no status da tarefa
+INTERVALO_MESCLA_S = 0.5
+
 def _update_status(status_obj: Dict, progress: int, message: str, is_done: bool = False, has_error: bool = False):
     if not status_obj: return
     status_obj['progress'] = progress
@@ -19,7 +30,121 @@ def _update_status(status_obj: Dict, progress: int, message: str, is_done: bool
     status_obj['is_done'] = is_done
     status_obj['has_error'] = has_error
 
-def run_baixa_livros(clientes_selecionados: List[Dict], config_geral: Dict, competencia: str, download_dir: str, headful_mode: bool, status_obj: Optional[Dict] = None, part_of_routine: bool = False):
+def _configurar_execucao(config_geral: Dict):
+    """Governador de hosts e downloader de PDFs da tarefa; uma vez, antes de qualquer grupo começar.
+
+    `controle_hosts.configurar` descarta os governadores existentes, então chamá-lo com
+    outro grupo em andamento zeraria as taxas e as vagas que ele está usando.
+    """
+    controle_hosts.configurar(
+        max_por_host=config.get_int(config_geral, 'captura_max_por_host'),
+        taxa_inicial=config.get_float(config_geral, 'governador_taxa_inicial'),
+        taxa_min=config.get_float(config_geral, 'governador_taxa_min'),
+        taxa_max=config.get_float(config_geral, 'governador_taxa_max'),
+        latencia_alvo_s=config.get_float(config_geral, 'governador_latencia_alvo_s'),
+    )
+    downloader_pdf.configurar(config.get_int(config_geral, 'pdf_max_concorrencia'), config.get_int(config_geral, 'pdf_tentativas'))
+
+def agrupar_por_modelo(clientes_selecionados: List[Dict]) -> Dict[str, List[Dict]]:
+    """Clientes agrupados pelo modelo de integração do município, na ordem em que foram selecionados."""
+    grupos: Dict[str, List[Dict]] = {}
+    for cliente in clientes_selecionados:
+        municipio = cliente.get('municipio')
+        modelo = municipios.get_model_for_municipio(municipio) if municipio else MODELO_PADRAO
+        grupos.setdefault(modelo, []).append(cliente)
+    return grupos
+
+def _mesclar_status(status_obj: Optional[Dict], status_grupos: Dict[str, Dict], is_done: bool = False):
+    """Progresso único da tarefa: média dos grupos e a mensagem de cada um lado a lado."""
+    if status_obj is None or not status_grupos:
+        return
+    grupos = list(status_grupos.values())
+    progress = sum(g.get('progress', 0) for g in grupos) // len(grupos)
+    if len(grupos) == 1:
+        message = grupos[0].get('message', '')
+    else:
+        message = " | ".join(f"{g['municipio']}: {g.get('message', '')}" for g in grupos)
+    _update_status(status_obj, 100 if is_done else progress, message, is_done=is_done,
+                   has_error=any(g.get('has_error') for g in grupos))
+
+def _executar_por_municipio(clientes_selecionados: List[Dict], config_geral: Dict, pipelines: Dict[str, Callable[[List[Dict], Dict], None]],
+                            descricao: str, status_obj: Optional[Dict] = None) -> Dict[str, Dict]:
+    """Roda a pipeline de cada modelo de município no seu próprio worker, todos ao mesmo tempo.
+
+    Cada pipeline recebe os clientes do grupo e um status próprio (status_obj['grupos'][modelo]);
+    o status da tarefa é a mescla deles. Clientes de municípios sem pipeline ficam como erro.
+    """
+    if not clientes_selecionados:
+        _update_status(status_obj, 100, "Nenhum cliente selecionado.", is_done=True)
+        return {}
+
+    grupos = agrupar_por_modelo(clientes_selecionados)
+    status_grupos: Dict[str, Dict] = {
+        modelo: {"municipio": NOMES_MODELOS.get(modelo, modelo), "clientes_total": len(lista),
+                 "progress": 0, "message": "Aguardando...", "is_done": False, "has_error": False}
+        for modelo, lista in grupos.items()
+    }
+    if status_obj is not None:
+        status_obj['grupos'] = status_grupos
+
+    for modelo in grupos.keys() - pipelines.keys():
+        ids = ", ".join(str(c.get('id')) for c in grupos[modelo])
+        logger.log_error(f"Sem rotina de {descricao} para o modelo '{modelo}'; clientes ignorados: {ids}")
+        _update_status(status_grupos[modelo], 100, f"Sem rotina de {descricao} para este município.", is_done=True, has_error=True)
+
+    suportados = [modelo for modelo in grupos if modelo in pipelines]
+    paralelo = len(suportados) if config.get_bool(config_geral, 'despacho_municipios_paralelo') else 1
+    logger.log_info(f"{descricao.capitalize()}: " + ", ".join(f"{status_grupos[m]['municipio']} ({len(grupos[m])})" for m in grupos)
+                    + (f"; {len(suportados)} grupo(s) em paralelo." if paralelo > 1 else "."))
+
+    def _rodar(modelo: str):
+        sub = status_grupos[modelo]
+        inicio = time.monotonic()
+        try:
+            pipelines[modelo](grupos[modelo], sub)
+            if not sub.get('is_done'):
+                _update_status(sub, 100, sub.get('message', ''), is_done=True, has_error=sub.get('has_error', False))
+        except Exception as e:
+            logger.log_error(f"Erro na rotina de {sub['municipio']}: {e}", exc_info=sys.exc_info())
+            _update_status(sub, 100, f"Erro: {e}", is_done=True, has_error=True)
+        finally:
+            sub['duracao_s'] = round(time.monotonic() - inicio, 1)
+            logger.log_info(f"Grupo {sub['municipio']} finalizado em {sub['duracao_s']} s.")
+
+    if suportados:
+        _configurar_execucao(config_geral)
+        with ThreadPoolExecutor(max_workers=max(1, paralelo), thread_name_prefix="municipio") as executor:
+            pendentes = {executor.submit(_rodar, modelo) for modelo in suportados}
+            while pendentes:
+                _, pendentes = wait(pendentes, timeout=INTERVALO_MESCLA_S)
+                _mesclar_status(status_obj, status_grupos)
+
+    _mesclar_status(status_obj, status_grupos, is_done=True)
+    return status_grupos
+
+def _rotina_sjc(clientes: List[Dict], config_geral: Dict, competencia: str, headful_mode: bool, status_obj: Dict):
+    """Livros, talão e XML do portal de São José dos Campos para a competência (ou intervalo)."""
+    total_clientes = len(clientes)
+    # O captador faz um login só, com as credenciais do primeiro cliente; sem elas, usa as do escritório
+    usuario = clientes[0].get('sjc_usuario') or config_geral.get('sjc_usuario')
+    senha = clientes[0].get('sjc_senha') or config_geral.get('sjc_senha')
+    if not (usuario and senha):
+        raise ValueError("Login do portal de São José dos Campos não configurado (sjc_usuario/sjc_senha).")
+    clientes = [dict(c, sjc_usuario=usuario, sjc_senha=senha) for c in clientes]
+
+    _update_status(status_obj, 5, f"Iniciando captura de São José dos Campos para {total_clientes} cliente(s)...")
+    captador_SJC_login_patch.executar_captura_sjc(clientes, config_geral, competencia, headful_mode, status_obj=status_obj)
+
+    progresso = status_obj.get('sjc') or {}
+    falhos = [cid for cid, info in progresso.items() if info.get('estado') != "concluido"]
+    if falhos or not progresso:
+        error_message = f"Captura de São José dos Campos finalizada com falha em {len(falhos) or total_clientes} de {total_clientes} cliente(s)" \
+                        + (f": {', '.join(falhos)}" if falhos else ".")
+        _update_status(status_obj, 100, error_message, is_done=True, has_error=True)
+        return
+    _update_status(status_obj, 100, "Captura de São José dos Campos concluída com sucesso!", is_done=True)
+
+def _baixa_livros_taubate(clientes_selecionados: List[Dict], config_geral: Dict, competencia: str, download_dir: str, headful_mode: bool, status_obj: Optional[Dict] = None, part_of_routine: bool = False):
     total_clientes = len(clientes_selecionados)
     if not part_of_routine:
         _update_status(status_obj, 5, f"Iniciando baixa de livros para {total_clientes} cliente(s)...")
@@ -39,46 +164,102 @@ def run_baixa_livros(clientes_selecionados: List[Dict], config_geral: Dict, comp
         logger.log_error(error_message, exc_info=sys.exc_info())
         _update_status(status_obj, 100, error_message, is_done=True, has_error=True)
 
-def run_captura_nf_both(clientes_selecionados: List[Dict], config_geral: Dict, data_inicio_str: str, data_fim_str: str, pasta_saida: str, status_obj: Optional[Dict] = None, part_of_routine: bool = False):
+def _capturar_cliente(cliente: Dict, config_geral: Dict, data_inicio, data_fim, pasta_saida: str, on_tipo_concluido) -> Dict[str, int]:
+    """Roda PRESTADAS e TOMADAS do mesmo cliente em paralelo e devolve o total salvo de cada uma."""
+    tarefas = {
+        "prestadas": capturador_nf_taubate.capturar_notas,
+        "tomadas": capturador_nf_taubate.capturar_notas_tomadas,
+    }
+    resultado, erros = {}, []
+    with ThreadPoolExecutor(max_workers=len(tarefas), thread_name_prefix=f"captura-{cliente.get('id')}") as executor:
+        futuros = {tipo: executor.submit(func, cliente, config_geral, data_inicio, data_fim, pasta_saida) for tipo, func in tarefas.items()}
+        for tipo, futuro in futuros.items():
+            try:
+                resultado[tipo] = futuro.result()
+            except Exception as e:
+                erros.append(f"{tipo.upper()}: {e}")
+            on_tipo_concluido(tipo, resultado.get(tipo))
+    if erros:
+        raise Exception("; ".join(erros))
+    return resultado
+
+def _captura_nf_taubate(clientes_selecionados: List[Dict], config_geral: Dict, data_inicio_str: str, data_fim_str: str, pasta_saida: str, status_obj: Optional[Dict] = None, part_of_routine: bool = False):
     total_clientes = len(clientes_selecionados)
     start_progress = 50 if part_of_routine else 0
+    progress_span = 50 if part_of_routine else 95
     _update_status(status_obj, start_progress, f"Iniciando captura de notas para {total_clientes} cliente(s)...")
-    
+    if not clientes_selecionados:
+        if not part_of_routine:
+            _update_status(status_obj, 100, "Nenhum cliente selecionado.", is_done=True)
+        return
+
     final_pasta_saida = pasta_saida or config_geral.get('pasta_saida_padrao') or os.getcwd()
-    
-    for i, cliente in enumerate(clientes_selecionados):
+    data_inicio = datetime.strptime(data_inicio_str, "%d/%m/%Y").date()
+    data_fim = datetime.strptime(data_fim_str, "%d/%m/%Y").date()
+
+    max_clientes = max(1, config.get_int(config_geral, 'captura_max_clientes'))
+    logger.log_info(f"Captura de notas: {total_clientes} cliente(s), até {max_clientes} em paralelo.")
+
+    lock = threading.Lock()
+    progresso_clientes: Dict[str, Dict] = {str(c.get('id')): {"estado": "pendente"} for c in clientes_selecionados}
+    if status_obj is not None:
+        status_obj['clientes'] = progresso_clientes
+    contagem = {"concluidos": 0, "falhas": 0}
+
+    def _publicar(mensagem: str):
+        progress = start_progress + int((contagem["concluidos"] / total_clientes) * progress_span)
+        _update_status(status_obj, progress, mensagem)
+
+    def _processar(cliente: Dict):
+        id_cliente = str(cliente.get('id'))
+        with lock:
+            progresso_clientes[id_cliente]["estado"] = "executando"
+            _publicar(f"({contagem['concluidos']}/{total_clientes}) Capturando notas de {id_cliente}...")
+
+        def _on_tipo_concluido(tipo: str, total: Optional[int]):
+            with lock:
+                progresso_clientes[id_cliente][tipo] = total if total is not None else "erro"
+
         try:
-            progress_slice = int(((i + 1) / total_clientes) * 50)
-            progress = start_progress + progress_slice
-            
-            _update_status(status_obj, progress - 5, f"({i+1}/{total_clientes}) Capturando PRESTADAS de {cliente.get('id')}...")
-            capturador_nf_taubate.capturar_notas(cliente, config_geral, datetime.strptime(data_inicio_str, "%d/%m/%Y").date(), datetime.strptime(data_fim_str, "%d/%m/%Y").date(), final_pasta_saida)
-            
-            _update_status(status_obj, progress, f"({i+1}/{total_clientes}) Capturando TOMADAS de {cliente.get('id')}...")
-            capturador_nf_taubate.capturar_notas_tomadas(cliente, config_geral, datetime.strptime(data_inicio_str, "%d/%m/%Y").date(), datetime.strptime(data_fim_str, "%d/%m/%Y").date(), final_pasta_saida)
+            _capturar_cliente(cliente, config_geral, data_inicio, data_fim, final_pasta_saida, _on_tipo_concluido)
+            with lock:
+                progresso_clientes[id_cliente]["estado"] = "concluido"
         except Exception as e:
-            error_message = f"Erro ao processar cliente {cliente.get('id')}: {e}"
-            logger.log_error(error_message, exc_info=sys.exc_info())
-            _update_status(status_obj, 100, error_message, is_done=True, has_error=True)
-            return
+            logger.log_error(f"Erro ao processar cliente {id_cliente}: {e}", exc_info=sys.exc_info())
+            with lock:
+                progresso_clientes[id_cliente]["estado"] = "erro"
+                progresso_clientes[id_cliente]["erro"] = str(e)
+                contagem["falhas"] += 1
+        finally:
+            with lock:
+                contagem["concluidos"] += 1
+                _publicar(f"({contagem['concluidos']}/{total_clientes}) Cliente {id_cliente} finalizado.")
+
+    with ThreadPoolExecutor(max_workers=max_clientes, thread_name_prefix="captura-cliente") as executor:
+        list(executor.map(_processar, clientes_selecionados))
+
+    if contagem["falhas"]:
+        falhos = [cid for cid, info in progresso_clientes.items() if info.get("estado") == "erro"]
+        error_message = f"Captura de notas finalizada com falha em {contagem['falhas']} de {total_clientes} cliente(s): {', '.join(falhos)}"
+        logger.log_error(error_message)
+        _update_status(status_obj, 100, error_message, is_done=True, has_error=True)
+        return
 
     if not part_of_routine:
         _update_status(status_obj, 100, "Captura de notas concluída com sucesso!", is_done=True)
 
-def run_full_routine(clientes_selecionados: List[Dict], config_geral: Dict, competencia: str, data_inicio_str: str, data_fim_str: str, pasta_saida: str, headful_mode: bool, status_obj: Optional[Dict] = None):
-    logger.log_info(f"\n{'='*20}\n--- INICIANDO ROTINA COMPLETA ---\n{'='*20}")
-    
+def _rotina_completa_taubate(clientes_selecionados: List[Dict], config_geral: Dict, competencia: str, data_inicio_str: str, data_fim_str: str, pasta_saida: str, headful_mode: bool, status_obj: Optional[Dict] = None):
     try:
         _update_status(status_obj, 0, "Iniciando Etapa 1: Baixa de Livros...")
         time.sleep(1)
-        run_baixa_livros(clientes_selecionados, config_geral, competencia, pasta_saida, headful_mode, status_obj, part_of_routine=True)
+        _baixa_livros_taubate(clientes_selecionados, config_geral, competencia, pasta_saida, headful_mode, status_obj, part_of_routine=True)
         if status_obj and status_obj.get('has_error'):
             return
 
         _update_status(status_obj, 50, "Etapa 1 concluída. Iniciando Etapa 2: Captura de Notas...")
         time.sleep(1)
 
-        run_captura_nf_both(clientes_selecionados, config_geral, data_inicio_str, data_fim_str, pasta_saida, status_obj, part_of_routine=True)
+        _captura_nf_taubate(clientes_selecionados, config_geral, data_inicio_str, data_fim_str, pasta_saida, status_obj, part_of_routine=True)
         if status_obj and status_obj.get('has_error'):
             return
 
@@ -88,4 +269,39 @@ def run_full_routine(clientes_selecionados: List[Dict], config_geral: Dict, comp
         logger.log_error(error_message, exc_info=sys.exc_info())
         _update_status(status_obj, 100, error_message, is_done=True, has_error=True)
 
+# --- Pontos de entrada: cada um despacha os clientes selecionados pelo município ---
+
+def run_baixa_livros(clientes_selecionados: List[Dict], config_geral: Dict, competencia: str, download_dir: str, headful_mode: bool, status_obj: Optional[Dict] = None, part_of_routine: bool = False):
+    if part_of_routine:
+        _configurar_execucao(config_geral)
+        return _baixa_livros_taubate(clientes_selecionados, config_geral, competencia, download_dir, headful_mode, status_obj, part_of_routine=True)
+    pipelines = {
+        "taubate": lambda grupo, st: _baixa_livros_taubate(grupo, config_geral, competencia, download_dir, headful_mode, st),
+        "sjc": lambda grupo, st: _rotina_sjc(grupo, config_geral, competencia, headful_mode, st),
+    }
+    _executar_por_municipio(clientes_selecionados, config_geral, pipelines, "baixa de livros", status_obj)
+
+def run_captura_nf_both(clientes_selecionados: List[Dict], config_geral: Dict, data_inicio_str: str, data_fim_str: str, pasta_saida: str, status_obj: Optional[Dict] = None, part_of_routine: bool = False):
+    if part_of_routine:
+        _configurar_execucao(config_geral)
+        return _captura_nf_taubate(clientes_selecionados, config_geral, data_inicio_str, data_fim_str, pasta_saida, status_obj, part_of_routine=True)
+    # A captura por período (webservice) só existe para Taubaté; o portal de SJC trabalha por competência
+    pipelines = {
+        "taubate": lambda grupo, st: _captura_nf_taubate(grupo, config_geral, data_inicio_str, data_fim_str, pasta_saida, st),
+    }
+    _executar_por_municipio(clientes_selecionados, config_geral, pipelines, "captura de notas por período", status_obj)
+
+def run_full_routine(clientes_selecionados: List[Dict], config_geral: Dict, competencia: str, data_inicio_str: str, data_fim_str: str, pasta_saida: str, headful_mode: bool, status_obj: Optional[Dict] = None):
+    logger.log_info(f"\n{'='*20}\n--- INICIANDO ROTINA COMPLETA ---\n{'='*20}")
+    pipelines = {
+        "taubate": lambda grupo, st: _rotina_completa_taubate(grupo, config_geral, competencia, data_inicio_str, data_fim_str, pasta_saida, headful_mode, st),
+        "sjc": lambda grupo, st: _rotina_sjc(grupo, config_geral, competencia, headful_mode, st),
+    }
+    try:
+        _executar_por_municipio(clientes_selecionados, config_geral, pipelines, "rotina completa", status_obj)
+    except Exception as e:
+        error_message = f"Erro fatal na rotina completa: {e}"
+        logger.log_error(error_message, exc_info=sys.exc_info())
+        _update_status(status_obj, 100, error_message, is_done=True, has_error=True)
+
     logger.log_info(f"\n{'='*20}\n--- ROTINA COMPLETA FINALIZADA ---\n{'='*20}")
\ No newline at end of file
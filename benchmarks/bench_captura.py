@@ -0,0 +1,131 @@
+#--------------------------------------------------------------------------
+# benchmarks/bench_captura.py - Vazão da captura de NFS-e ponta a ponta
+# Sobe o servidor simulado (servidor_simulado.py), aponta o capturador para
+# ele e roda run_captura_nf_both (capturar_notas + capturar_notas_tomadas)
+# para N clientes. Mede notas/s, bytes/s e p50/p95 das páginas SOAP e dos PDFs.
+#
+# Uso:  python benchmarks/bench_captura.py [--clientes 4] [--dias 31] [--notas-por-dia 20]
+#                                          [--latencia-soap-ms 150] [--taxa-erro 0.02] ...
+#--------------------------------------------------------------------------
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'RoboFiscalIntegrado'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import servidor_simulado
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p / 100.0
+    baixo = int(k)
+    alto = min(baixo + 1, len(ordenados) - 1)
+    return ordenados[baixo] + (ordenados[alto] - ordenados[baixo]) * (k - baixo)
+
+class _Cronometro:
+    """Acumula durações de chamadas (em segundos) de várias threads."""
+    def __init__(self):
+        self.duracoes = []
+        self._lock = threading.Lock()
+
+    def envolver(self, funcao):
+        def medida(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.duracoes.append(time.perf_counter() - t0)
+        return medida
+
+    def resumo(self) -> str:
+        return (f"{len(self.duracoes):>6} chamadas  p50 {1000 * _percentil(self.duracoes, 50):8.1f} ms  "
+                f"p95 {1000 * _percentil(self.duracoes, 95):8.1f} ms  máx {1000 * max(self.duracoes or [0]):8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta da captura de NFS-e contra o servidor simulado.")
+    parser.add_argument("--clientes", type=int, default=4)
+    parser.add_argument("--dias", type=int, default=31, help="tamanho do período capturado")
+    parser.add_argument("--max-clientes", type=int, default=4, help="captura_max_clientes")
+    parser.add_argument("--max-por-host", type=int, default=8, help="captura_max_por_host")
+    parser.add_argument("--workers-pdf", type=int, default=4, help="captura_workers_pdf")
+    parser.add_argument("--janelas", type=int, default=3, help="captura_janelas_paralelas")
+    parser.add_argument("--taxa-inicial", type=float, default=200.0, help="governador_taxa_inicial (req/s)")
+    parser.add_argument("--taxa-max", type=float, default=1000.0, help="governador_taxa_max (req/s)")
+    parser.add_argument("--extra", action="append", default=[], metavar="CHAVE=VALOR",
+                        help="outras chaves de configuração (pode repetir)")
+    servidor_simulado.adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    with servidor_simulado.ServidorSimulado(servidor_simulado.cenario_de(args)) as servidor:
+        # Precisa estar no ambiente antes de importar o capturador
+        os.environ["TAUBATE_ABRASF_ENDPOINT"] = servidor.endpoint
+        os.environ["TAUBATE_NFE_VER_URL"] = servidor.url_nfe_ver
+
+        import robo_core
+        from modulos import capturador_nf_taubate, downloader_pdf, indice_notas, controle_hosts, hedge_requisicoes
+
+        trabalho = Path(tempfile.mkdtemp(prefix="bench_captura_"))
+        indice_notas.DB_PATH = str(trabalho / "indice_notas.db")
+        pasta_saida = trabalho / "saida"
+
+        soap, pdf = _Cronometro(), _Cronometro()
+        capturador_nf_taubate.CapturadorTaubate._send_request = soap.envolver(capturador_nf_taubate.CapturadorTaubate._send_request)
+        downloader_pdf.DownloaderPDF.baixar = pdf.envolver(downloader_pdf.DownloaderPDF.baixar)
+
+        config_geral = {
+            "pasta_saida_padrao": str(pasta_saida),
+            "captura_incremental": False,
+            "captura_max_clientes": args.max_clientes,
+            "captura_max_por_host": args.max_por_host,
+            "captura_workers_pdf": args.workers_pdf,
+            "captura_janelas_paralelas": args.janelas,
+            "governador_taxa_inicial": args.taxa_inicial,
+            "governador_taxa_max": args.taxa_max,
+        }
+        for item in args.extra:
+            chave, _, valor = item.partition("=")
+            config_geral[chave.strip()] = valor.strip()
+        clientes = [{"id": f"B{i:03d}", "razao_social": f"CLIENTE BENCH {i}", "cnpj": f"{i:014d}", "ccm": str(1000 + i)}
+                    for i in range(1, args.clientes + 1)]
+        data_fim = date.today() - timedelta(days=1)
+        data_inicio = data_fim - timedelta(days=args.dias - 1)
+
+        status = {}
+        t0 = time.perf_counter()
+        robo_core.run_captura_nf_both(clientes, config_geral, data_inicio.strftime("%d/%m/%Y"), data_fim.strftime("%d/%m/%Y"),
+                                      str(pasta_saida), status_obj=status)
+        decorrido = time.perf_counter() - t0
+
+        xmls = list(pasta_saida.rglob("*.xml"))
+        pdfs = list(pasta_saida.rglob("*.pdf"))
+        total_bytes = sum(f.stat().st_size for f in xmls + pdfs)
+        esperado = 2 * args.clientes * args.dias * args.notas_por_dia
+
+        print(f"Cenário: {args.clientes} cliente(s) x {args.dias} dia(s) x {args.notas_por_dia} notas/dia (prestadas + tomadas), "
+              f"SOAP {args.latencia_soap_ms:.0f} ms, PDF {args.latencia_pdf_ms:.0f} ms, erro {args.taxa_erro:.0%}")
+        print(f"  Tempo total     {decorrido:8.2f} s   ({status.get('message', '')})")
+        print(f"  Notas (XML)     {len(xmls):8d} de {esperado}   {len(xmls) / decorrido:8.1f} notas/s")
+        print(f"  PDFs            {len(pdfs):8d}")
+        print(f"  Bytes gravados  {total_bytes / 1e6:8.2f} MB  {total_bytes / 1e6 / decorrido:8.2f} MB/s")
+        print(f"  Páginas SOAP    {soap.resumo()}")
+        print(f"  PDFs (nota)     {pdf.resumo()}")
+        print(f"  Servidor        {servidor.requisicoes}")
+        for g in controle_hosts.estatisticas():
+            print(f"  Governador      {g}")
+        for operacao, h in hedge_requisicoes.estatisticas().items():
+            print(f"  Hedge           {operacao}: {h}")
+        shutil.rmtree(trabalho, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#--------------------------------------------------------------------------
+# benchmarks/bench_parser_abrasf.py - Comparação do parser ABRASF
+# Caminho antigo (_parse_response_tolerant + XPath sobre a árvore inteira)
+# contra o caminho em streaming (iterar_resposta), numa página sintética de
+# notas tomadas com 50 CompNfse completos (o máximo que o portal devolve).
+# O pico de memória do streaming acompanha CHUNK_PARSER, não o tamanho da
+# página; --chunk permite comparar outros tamanhos de bloco.
+#
+# Uso:  python benchmarks/bench_parser_abrasf.py [--notas 50] [--repeticoes 30] [--chunk 8192]
+#--------------------------------------------------------------------------
+import argparse
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'RoboFiscalIntegrado'))
+
+from lxml import etree
+from modulos import capturador_nf_taubate as cap
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def _comp_nfse(numero: int) -> str:
+    discriminacao = "Prestação de serviços de consultoria contábil e fiscal referente ao mês. " * 8
+    return (
+        f'<CompNfse><Nfse versao="2.04"><InfNfse Id="nfse{numero}">'
+        f'<Numero>{numero}</Numero><CodigoVerificacao>AB{numero:06d}CD</CodigoVerificacao>'
+        f'<DataEmissao>2025-01-{(numero % 28) + 1:02d}T10:15:00</DataEmissao>'
+        f'<LinkNota>https://taubateiss.meumunicipio.digital/taubateiss/contribuinte/nfe/nfe_ver.php?id={numero}</LinkNota>'
+        '<ValoresNfse><BaseCalculo>1500.00</BaseCalculo><Aliquota>2.00</Aliquota><ValorIss>30.00</ValorIss>'
+        '<ValorLiquidoNfse>1470.00</ValorLiquidoNfse></ValoresNfse>'
+        '<PrestadorServico><IdentificacaoPrestador><CpfCnpj><Cnpj>12345678000195</Cnpj></CpfCnpj>'
+        '<InscricaoMunicipal>000123</InscricaoMunicipal></IdentificacaoPrestador>'
+        '<RazaoSocial>EMPRESA PRESTADORA EXEMPLO LTDA</RazaoSocial></PrestadorServico>'
+        '<DeclaracaoPrestacaoServico><InfDeclaracaoPrestacaoServico><Competencia>2025-01-01</Competencia>'
+        f'<Servico><Valores><ValorServicos>1500.00</ValorServicos></Valores><ItemListaServico>17.19</ItemListaServico>'
+        f'<Discriminacao>{discriminacao}</Discriminacao><CodigoMunicipio>3554102</CodigoMunicipio></Servico>'
+        '</InfDeclaracaoPrestacaoServico></DeclaracaoPrestacaoServico>'
+        '</InfNfse></Nfse></CompNfse>'
+    )
+
+def gerar_pagina(total_notas: int) -> str:
+    inner = (
+        f'<?xml version="1.0" encoding="UTF-8"?><ConsultarNfseServicoTomadoResposta xmlns="{cap.ABRASF_NS}">'
+        '<ListaNfse>' + ''.join(_comp_nfse(i) for i in range(1, total_notas + 1)) + '</ListaNfse>'
+        '</ConsultarNfseServicoTomadoResposta>'
+    )
+    escaped = inner.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope xmlns:SOAP-ENV="{cap.SOAP_NS}"><SOAP-ENV:Body>'
+        f'<ns1:ConsultarNfseServicoTomadoResponse xmlns:ns1="{cap.TNAMESPACE}"><outputXML>{escaped}</outputXML>'
+        '</ns1:ConsultarNfseServicoTomadoResponse></SOAP-ENV:Body></SOAP-ENV:Envelope>'
+    )
+
+def caminho_antigo(xml: str) -> int:
+    ns = {'ns': cap.ABRASF_NS}
+    root = cap._parse_response_tolerant(xml)
+    total = 0
+    for node in root.xpath('//ns:CompNfse', namespaces=ns):
+        node.findtext('.//ns:Numero', namespaces=ns)
+        total += len(etree.tostring(node))
+    return total
+
+def caminho_streaming(xml: str) -> int:
+    ns = {'ns': cap.ABRASF_NS}
+    total = 0
+    for tipo, node in cap.iterar_resposta(xml):
+        if tipo == 'nfse':
+            node.findtext('.//ns:Numero', namespaces=ns)
+            total += len(etree.tostring(node))
+    return total
+
+CAMINHOS = {"antigo": caminho_antigo, "streaming": caminho_streaming}
+
+def _medir(nome: str, notas: int, repeticoes: int, chunk: int) -> dict:
+    cap.CHUNK_PARSER = chunk
+    xml = gerar_pagina(notas)
+    func = CAMINHOS[nome]
+
+    # Memória medida na primeira execução, antes de qualquer aquecimento elevar o pico do processo
+    rss_antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    tracemalloc.start()
+    func(xml)
+    _, pico_py = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_depois = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+
+    func(xml)  # aquecimento
+    t0 = time.perf_counter()
+    for _ in range(repeticoes):
+        func(xml)
+    decorrido = time.perf_counter() - t0
+    return {
+        "caminho": nome,
+        "tamanho_kb": len(xml) // 1024,
+        "ms_por_pagina": 1000 * decorrido / repeticoes,
+        "paginas_por_s": repeticoes / decorrido,
+        "pico_python_kb": pico_py // 1024,
+        "pico_rss_kb": max(0, rss_depois - rss_antes),  # inclui memória do libxml2 (Linux: KB)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara o parser ABRASF antigo com o parser em streaming.")
+    parser.add_argument("--notas", type=int, default=50)
+    parser.add_argument("--repeticoes", type=int, default=30)
+    parser.add_argument("--chunk", type=int, default=cap.CHUNK_PARSER, help="caracteres por bloco no streaming")
+    parser.add_argument("--caminho", choices=sorted(CAMINHOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caminho:
+        r = _medir(args.caminho, args.notas, args.repeticoes, args.chunk)
+        print(";".join(f"{k}={v}" for k, v in r.items()))
+        return
+
+    # Cada caminho roda num processo novo para que o pico de RSS de um não contamine o outro
+    print(f"Página sintética com {args.notas} CompNfse, {args.repeticoes} repetições, blocos de {args.chunk} caracteres")
+    for nome in ("antigo", "streaming"):
+        saida = subprocess.run([sys.executable, __file__, "--caminho", nome, "--notas", str(args.notas),
+                                "--repeticoes", str(args.repeticoes), "--chunk", str(args.chunk)], capture_output=True, text=True, check=True)
+        dados = dict(item.split("=", 1) for item in saida.stdout.strip().split(";"))
+        print(f"  {nome:<10} {float(dados['ms_por_pagina']):8.2f} ms/página  {float(dados['paginas_por_s']):8.1f} páginas/s  "
+              f"pico Python {dados['pico_python_kb']:>6} KB  pico RSS +{dados['pico_rss_kb']:>6} KB  (página {dados['tamanho_kb']} KB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#--------------------------------------------------------------------------
+# benchmarks/servidor_simulado.py - Servidor local no lugar do ABRASF/Taubaté
+# Responde ConsultarNfseServicoPrestado/Tomado (SOAP) com páginas sintéticas
+# de CompNfse e o fluxo nfe_ver.php -> nfe_imp.php -> PDF, com latência,
+# cauda de latência e taxa de erro configuráveis.
+#
+# Uso isolado:  python benchmarks/servidor_simulado.py --porta 8765 --notas-por-dia 20
+# Depois aponte o robô para ele:
+#   TAUBATE_ABRASF_ENDPOINT=http://127.0.0.1:8765/ws/nfs
+#   TAUBATE_NFE_VER_URL=http://127.0.0.1:8765/contribuinte/nfe/nfe_ver.php
+#--------------------------------------------------------------------------
+import argparse
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlsplit
+
+ABRASF_NS  = "http://www.abrasf.org.br/nfse.xsd"
+SOAP_NS    = "http://schemas.xmlsoap.org/soap/envelope/"
+TNAMESPACE = "https://abrasftaubate.meumunicipio.online/ws/nfs"
+TAMANHO_PAGINA = 50
+
+@dataclass
+class Cenario:
+    notas_por_dia: int = 20
+    latencia_soap_ms: float = 150.0
+    latencia_pdf_ms: float = 80.0
+    dispersao: float = 0.5        # sigma do lognormal aplicado à latência (cauda longa)
+    taxa_erro: float = 0.0        # fração das requisições respondidas com 503
+    tamanho_pdf_kb: int = 60
+    semente: int = 42
+
+class _Estado:
+    def __init__(self, cenario: Cenario):
+        self.cenario = cenario
+        self.rng = random.Random(cenario.semente)
+        self.lock = threading.Lock()
+        self.requisicoes = {"soap": 0, "nfe_ver": 0, "nfe_imp": 0, "erros": 0}
+        self.pdf = b"%PDF-1.4\n" + b"0" * (cenario.tamanho_pdf_kb * 1024) + b"\n%%EOF"
+
+    def sortear(self, latencia_ms: float) -> Tuple[float, bool]:
+        with self.lock:
+            atraso = latencia_ms * self.rng.lognormvariate(0, self.cenario.dispersao) / 1000.0
+            erro = self.rng.random() < self.cenario.taxa_erro
+            if erro:
+                self.requisicoes["erros"] += 1
+        return atraso, erro
+
+    def contar(self, chave: str):
+        with self.lock:
+            self.requisicoes[chave] += 1
+
+def _comp_nfse(numero: int, dia: date, base_url: str) -> str:
+    return (
+        f'<CompNfse><Nfse versao="2.04"><InfNfse Id="nfse{numero}">'
+        f'<Numero>{numero}</Numero><CodigoVerificacao>AB{numero % 1000000:06d}CD</CodigoVerificacao>'
+        f'<DataEmissao>{dia.isoformat()}T10:15:00</DataEmissao>'
+        f'<LinkNota>{base_url}/contribuinte/nfe/nfe_ver.php?id={numero}</LinkNota>'
+        '<ValoresNfse><BaseCalculo>1500.00</BaseCalculo><Aliquota>2.00</Aliquota><ValorIss>30.00</ValorIss></ValoresNfse>'
+        '<PrestadorServico><IdentificacaoPrestador><CpfCnpj><Cnpj>12345678000195</Cnpj></CpfCnpj></IdentificacaoPrestador>'
+        '<RazaoSocial>EMPRESA PRESTADORA EXEMPLO LTDA</RazaoSocial></PrestadorServico>'
+        '<DeclaracaoPrestacaoServico><InfDeclaracaoPrestacaoServico><Servico><Valores><ValorServicos>1500.00</ValorServicos></Valores>'
+        f'<Discriminacao>{"Prestação de serviços de consultoria contábil. " * 6}</Discriminacao></Servico>'
+        '</InfDeclaracaoPrestacaoServico></DeclaracaoPrestacaoServico>'
+        '</InfNfse></Nfse></CompNfse>'
+    )
+
+def gerar_resposta(operacao: str, data_inicial: date, data_final: date, pagina: int, notas_por_dia: int, base_url: str) -> str:
+    """Página `pagina` da consulta: `notas_por_dia` notas em cada dia do período."""
+    total = max(0, ((data_final - data_inicial).days + 1) * notas_por_dia)
+    inicio = (pagina - 1) * TAMANHO_PAGINA
+    notas = []
+    for k in range(inicio, min(total, inicio + TAMANHO_PAGINA)):
+        dia = data_inicial + timedelta(days=k // notas_por_dia)
+        notas.append(_comp_nfse(dia.toordinal() * 1000 + k % notas_por_dia, dia, base_url))
+    if notas:
+        inner = f'<{operacao}Resposta xmlns="{ABRASF_NS}"><ListaNfse>{"".join(notas)}</ListaNfse></{operacao}Resposta>'
+    else:
+        inner = (f'<{operacao}Resposta xmlns="{ABRASF_NS}"><ListaMensagemRetorno><MensagemRetorno><Codigo>E016</Codigo>'
+                 '<Mensagem>Nenhuma NFS-e encontrada.</Mensagem></MensagemRetorno></ListaMensagemRetorno>'
+                 f'</{operacao}Resposta>')
+    escapado = inner.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return (f'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope xmlns:SOAP-ENV="{SOAP_NS}"><SOAP-ENV:Body>'
+            f'<ns1:{operacao}Response xmlns:ns1="{TNAMESPACE}"><outputXML>{escapado}</outputXML></ns1:{operacao}Response>'
+            '</SOAP-ENV:Body></SOAP-ENV:Envelope>')
+
+def _campo(corpo: str, tag: str) -> str:
+    m = re.search(rf'<{tag}>([^<]*)</{tag}>', corpo)
+    return m.group(1) if m else ""
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    estado: _Estado = None
+    base_url = ""
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status: int, tipo: str, corpo: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _atrasar(self, latencia_ms: float) -> bool:
+        atraso, erro = self.estado.sortear(latencia_ms)
+        time.sleep(atraso)
+        if erro:
+            self._responder(503, "text/plain", b"Servico indisponivel")
+        return erro
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8", "replace")
+        self.estado.contar("soap")
+        if self._atrasar(self.estado.cenario.latencia_soap_ms):
+            return
+        operacao = (self.headers.get("SOAPAction") or "").split("#")[-1].strip('"') or "ConsultarNfseServicoPrestado"
+        try:
+            di = date.fromisoformat(_campo(corpo, "DataInicial"))
+            df = date.fromisoformat(_campo(corpo, "DataFinal"))
+            pagina = int(_campo(corpo, "Pagina") or 1)
+        except ValueError:
+            self._responder(500, "text/plain", b"Requisicao invalida")
+            return
+        xml = gerar_resposta(operacao, di, df, pagina, self.estado.cenario.notas_por_dia, self.base_url)
+        self._responder(200, "text/xml; charset=utf-8", xml.encode("utf-8"))
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        id_nota = (parse_qs(partes.query).get("id") or [""])[0]
+        if partes.path.endswith("nfe_ver.php"):
+            self.estado.contar("nfe_ver")
+            if self._atrasar(self.estado.cenario.latencia_pdf_ms):
+                return
+            html = f'<html><body><a href="nfe_imp.php?id={id_nota}&amp;via=1">Imprimir</a></body></html>'
+            self._responder(200, "text/html; charset=utf-8", html.encode("utf-8"))
+        elif partes.path.endswith("nfe_imp.php"):
+            self.estado.contar("nfe_imp")
+            if self._atrasar(self.estado.cenario.latencia_pdf_ms):
+                return
+            self._responder(200, "application/pdf", self.estado.pdf)
+        else:
+            self._responder(404, "text/plain", b"Nao encontrado")
+
+class ServidorSimulado:
+    """Sobe o servidor numa thread; `endpoint` e `url_nfe_ver` vão para as variáveis de ambiente do robô."""
+    def __init__(self, cenario: Cenario, host: str = "127.0.0.1", porta: int = 0):
+        self.estado = _Estado(cenario)
+        handler = type("Handler", (_Handler,), {"estado": self.estado})
+        self.httpd = ThreadingHTTPServer((host, porta), handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_port}"
+        handler.base_url = self.base_url
+        self.endpoint = f"{self.base_url}/ws/nfs"
+        self.url_nfe_ver = f"{self.base_url}/contribuinte/nfe/nfe_ver.php"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="servidor-simulado", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def requisicoes(self) -> dict:
+        with self.estado.lock:
+            return dict(self.estado.requisicoes)
+
+def adicionar_argumentos(parser: argparse.ArgumentParser) -> None:
+    padrao = Cenario()
+    parser.add_argument("--notas-por-dia", type=int, default=padrao.notas_por_dia)
+    parser.add_argument("--latencia-soap-ms", type=float, default=padrao.latencia_soap_ms)
+    parser.add_argument("--latencia-pdf-ms", type=float, default=padrao.latencia_pdf_ms)
+    parser.add_argument("--dispersao", type=float, default=padrao.dispersao, help="sigma lognormal da latência (cauda)")
+    parser.add_argument("--taxa-erro", type=float, default=padrao.taxa_erro, help="fração de respostas 503")
+    parser.add_argument("--tamanho-pdf-kb", type=int, default=padrao.tamanho_pdf_kb)
+    parser.add_argument("--semente", type=int, default=padrao.semente)
+
+def cenario_de(args) -> Cenario:
+    return Cenario(notas_por_dia=args.notas_por_dia, latencia_soap_ms=args.latencia_soap_ms, latencia_pdf_ms=args.latencia_pdf_ms,
+                   dispersao=args.dispersao, taxa_erro=args.taxa_erro, tamanho_pdf_kb=args.tamanho_pdf_kb, semente=args.semente)
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que simula o webservice ABRASF e os PDFs de Taubaté.")
+    parser.add_argument("--porta", type=int, default=8765)
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+    with ServidorSimulado(cenario_de(args), porta=args.porta) as servidor:
+        print(f"TAUBATE_ABRASF_ENDPOINT={servidor.endpoint}")
+        print(f"TAUBATE_NFE_VER_URL={servidor.url_nfe_ver}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import bloqueio_recursos
+
+
+class _Rota:
+    def __init__(self, url, tipo):
+        self.request = SimpleNamespace(url=url, resource_type=tipo)
+        self.resultado = None
+
+    def continue_(self):
+        self.resultado = "continua"
+
+    def abort(self, motivo):
+        self.resultado = motivo
+
+
+def test_bloqueia_por_tipo_e_host_mas_libera_captcha():
+    rotas = {}
+    contexto = SimpleNamespace(route=lambda padrao, handler: rotas.setdefault(padrao, handler))
+    config = {"bloqueio_tipos_taubate": "image, font", "bloqueio_permitir_taubate": "imagem.php"}
+    assert bloqueio_recursos.aplicar(contexto, "taubate", config)
+    rota = rotas["**/*"]
+
+    casos = {
+        ("https://portal/taubateiss/contador/imagem.php?x=1", "image"): "continua",
+        ("https://portal/taubateiss/img/logo.png", "image"): "blockedbyclient",
+        ("https://portal/fonts/a.woff2", "font"): "blockedbyclient",
+        ("https://www.google-analytics.com/analytics.js", "script"): "blockedbyclient",
+        ("https://portal/taubateiss/contador/main.php", "document"): "continua",
+    }
+    for (url, tipo), esperado in casos.items():
+        r = _Rota(url, tipo)
+        rota(r)
+        assert r.resultado == esperado, url
+
+    c = bloqueio_recursos.estatisticas()["taubate"]
+    assert c["requisicoes"] == 3 and c["image"] == 1 and c["script"] == 1 and c["bytes_estimados"] > 0
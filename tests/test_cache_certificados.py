@@ -0,0 +1,24 @@
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import cache_certificados
+
+
+def test_sessao_reservada_nao_e_despejada_enquanto_a_captura_usa():
+    cache_certificados.limpar()
+    try:
+        em_uso = cache_certificados.reservar_sessao(None, ttl_ocioso_s=0)
+        time.sleep(0.01)
+        # Outro cliente dispara a varredura de ociosos: a sessão reservada continua no cache
+        assert cache_certificados.obter_sessao(None, ttl_ocioso_s=0) is em_uso
+
+        cache_certificados.liberar_sessao(em_uso)
+        time.sleep(0.01)
+        assert cache_certificados.obter_sessao(None, ttl_ocioso_s=0) is not em_uso
+    finally:
+        cache_certificados.limpar()
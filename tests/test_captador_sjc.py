@@ -0,0 +1,23 @@
+import os
+import sys
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import captador_SJC, controle_hosts
+
+
+def test_pausa_de_acomodacao_vem_antes_do_governador(monkeypatch):
+    eventos = []
+    monkeypatch.setattr(captador_SJC, "time", SimpleNamespace(sleep=lambda s: eventos.append(("pausa", s))))
+    monkeypatch.setattr(controle_hosts, "aguardar", lambda url: eventos.append(("governador", url)) or 0.0)
+    pagina = SimpleNamespace(url=captador_SJC.URL_LIVROS_FISCAIS)
+
+    captador_SJC._acomodar(pagina, captador_SJC.PAUSA_ENTRE_PREENCHIMENTOS_S)
+    captador_SJC._acomodar(pagina, captador_SJC.PAUSA_NOVA_TENTATIVA_S, captador_SJC.URL_SELECIONA_CADASTRO)
+
+    (_, primeira), governador1, segunda, governador2 = eventos
+    assert 1.0 <= primeira <= 1.5 and governador1 == ("governador", captador_SJC.URL_LIVROS_FISCAIS)
+    assert segunda == ("pausa", 2.0) and governador2 == ("governador", captador_SJC.URL_SELECIONA_CADASTRO)
@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+
+from PIL import Image, ImageDraw
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import captcha_taubate
+
+
+def _captcha(texto: str, deslocamento: int = 0) -> bytes:
+    img = Image.new('L', (12 * len(texto) + 8, 20), 230)
+    desenho = ImageDraw.Draw(img)
+    for i, digito in enumerate(texto):
+        desenho.text((4 + 12 * i + deslocamento, 4), digito, fill=20)
+    img = img.resize((img.width * 3, img.height * 3), Image.NEAREST)
+    saida = io.BytesIO()
+    img.save(saida, format='PNG')
+    return saida.getvalue()
+
+
+def test_solucionador_aprende_com_login_bem_sucedido(tmp_path, monkeypatch):
+    monkeypatch.setattr(captcha_taubate, '_tesseract', lambda imagem: "")
+    solucionador = captcha_taubate.SolucionadorCaptcha(str(tmp_path / 'modelos.json'))
+
+    sem_modelos = solucionador.resolver(_captcha("4821"))
+    assert sem_modelos.confianca == 0.0
+    assert len(sem_modelos.glifos) == 4
+
+    treino = captcha_taubate.ResultadoCaptcha("0123456789", 1.0, "tesseract", captcha_taubate.extrair_glifos(_captcha("0123456789")))
+    assert solucionador.treinar(treino)
+
+    # Modelos persistidos e reutilizados por uma nova instância
+    novo = captcha_taubate.SolucionadorCaptcha(str(tmp_path / 'modelos.json'))
+    resultado = novo.resolver(_captcha("4821", deslocamento=1))
+    assert resultado.metodo == "modelos"
+    assert resultado.texto == "4821"
+    assert resultado.confianca > 0
+
+
+def test_modelo_parcial_cai_para_o_tesseract_e_aprende_os_digitos_que_faltam(tmp_path, monkeypatch):
+    monkeypatch.setattr(captcha_taubate, '_tesseract', lambda imagem: "6650")
+    solucionador = captcha_taubate.SolucionadorCaptcha(str(tmp_path / 'modelos.json'))
+    solucionador.treinar(captcha_taubate.ResultadoCaptcha("4821", 1.0, "tesseract", captcha_taubate.extrair_glifos(_captcha("4821"))))
+
+    resultado = solucionador.resolver(_captcha("6650", deslocamento=1))
+    assert resultado.metodo == "tesseract" and resultado.texto == "6650"
+    assert resultado.confianca == 0.0
+
+    assert solucionador.treinar(resultado)
+    assert solucionador.total_modelos == 7
+
+
+def test_glifo_longe_de_todos_os_modelos_tem_confianca_zero(tmp_path):
+    solucionador = captcha_taubate.SolucionadorCaptcha(str(tmp_path / 'modelos.json'))
+    solucionador.treinar(captcha_taubate.ResultadoCaptcha("0123456789", 1.0, "tesseract", captcha_taubate.extrair_glifos(_captcha("0123456789"))))
+
+    assert solucionador.classificar(0)[1] == 0.0
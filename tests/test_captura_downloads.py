@@ -0,0 +1,61 @@
+import os
+import sys
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import captura_downloads
+
+
+class _PaginaFalsa:
+    """Sem eventos do Playwright: cada espera curta 'termina' um arquivo na pasta."""
+    def __init__(self, ao_esperar):
+        self.ouvintes = {}
+        self.context = SimpleNamespace(on=lambda *a: None, remove_listener=lambda *a: None)
+        self._ao_esperar = ao_esperar
+
+    def on(self, evento, funcao):
+        self.ouvintes.setdefault(evento, []).append(funcao)
+
+    def remove_listener(self, evento, funcao):
+        self.ouvintes[evento].remove(funcao)
+
+    def wait_for_timeout(self, ms):
+        self._ao_esperar()
+
+
+def _baixar_em_etapas(pasta):
+    etapas = iter([
+        lambda: (pasta / "livro.pdf.crdownload").write_bytes(b"%PDF-parcial"),
+        lambda: (pasta / "livro.pdf.crdownload").rename(pasta / "livro.pdf"),
+    ])
+    return lambda: next(etapas, lambda: None)()
+
+
+def test_espera_ignora_temporario_e_devolve_arquivo_concluido(tmp_path):
+    (tmp_path / "antigo.pdf").write_bytes(b"%PDF-velho")
+    pagina = _PaginaFalsa(_baixar_em_etapas(tmp_path))
+    with captura_downloads.EsperaDownload(pagina, tmp_path) as espera:
+        assert pagina.ouvintes["download"]
+        assert espera.resultado(5000) == tmp_path / "livro.pdf"
+    assert pagina.ouvintes["download"] == []
+
+
+def test_varredura_sem_inotify(tmp_path, monkeypatch):
+    monkeypatch.setattr(captura_downloads, '_libc', lambda: None)
+    (tmp_path / "antigo.pdf").write_bytes(b"%PDF-velho")
+    pagina = _PaginaFalsa(_baixar_em_etapas(tmp_path))
+    with captura_downloads.EsperaDownload(pagina, tmp_path) as espera:
+        assert isinstance(espera._observador, captura_downloads.ObservadorVarredura)
+        assert espera.resultado(5000) == tmp_path / "livro.pdf"
+
+
+def test_evento_do_playwright_tem_prioridade(tmp_path):
+    pagina = _PaginaFalsa(lambda: None)
+    download = SimpleNamespace(failure=lambda: None, path=lambda: str(tmp_path / "uuid-123"),
+                               suggested_filename="livro.pdf")
+    with captura_downloads.EsperaDownload(pagina, tmp_path) as espera:
+        pagina.ouvintes["download"][0](download)
+        assert espera.resultado(1000) == tmp_path / "uuid-123"
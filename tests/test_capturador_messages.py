@@ -29,3 +29,49 @@ def test_extrair_mensagens_retorno_e_sem_notas():
 
     nodes = cap.extrair_nfse_nodes(sample_response)
     assert nodes == []
+
+
+def test_extrair_nfse_nodes_com_namespace_abrasf():
+    inner = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<ConsultarNfseServicoPrestadoResposta xmlns="http://www.abrasf.org.br/nfse.xsd"><ListaNfse>'
+        '<CompNfse><Nfse><InfNfse><Numero>101</Numero><DataEmissao>2025-01-02T10:00:00</DataEmissao></InfNfse></Nfse></CompNfse>'
+        '<CompNfse><Nfse><InfNfse><Numero>102</Numero><DataEmissao>2025-01-03T10:00:00</DataEmissao></InfNfse></Nfse></CompNfse>'
+        '</ListaNfse></ConsultarNfseServicoPrestadoResposta>'
+    )
+    escaped = inner.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    sample_response = (
+        '<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/"><SOAP-ENV:Body>'
+        '<ns1:ConsultarNfseServicoPrestadoResponse xmlns:ns1="https://abrasftaubate.meumunicipio.online/ws/nfs">'
+        f'<outputXML>{escaped}</outputXML>'
+        '</ns1:ConsultarNfseServicoPrestadoResponse></SOAP-ENV:Body></SOAP-ENV:Envelope>'
+    )
+
+    nodes = cap.extrair_nfse_nodes(sample_response)
+    ns = {'ns': cap.ABRASF_NS}
+    assert [n.findtext('.//ns:Numero', namespaces=ns) for n in nodes] == ['101', '102']
+    assert cap.extrair_mensagens_retorno(sample_response) == []
+
+    # No modo streaming cada nó é liberado depois de consumido
+    numeros = [dado.findtext('.//ns:Numero', namespaces=ns) for tipo, dado in cap.iterar_resposta(sample_response) if tipo == 'nfse']
+    assert numeros == ['101', '102']
+
+
+def test_streaming_com_blocos_pequenos_corta_entidades_e_declaracao(monkeypatch):
+    # Blocos de 7 caracteres partem entidades (&lt;), a declaração <?xml?> e o conteúdo das notas
+    monkeypatch.setattr(cap, 'CHUNK_PARSER', 7)
+    inner = (
+        '  <?xml version="1.0" encoding="UTF-8"?>'
+        '<ConsultarNfseServicoPrestadoResposta xmlns="http://www.abrasf.org.br/nfse.xsd"><ListaNfse>'
+        + ''.join(f'<CompNfse><Nfse><InfNfse><Numero>{n}</Numero><Discriminacao>A &amp; B</Discriminacao>'
+                  f'</InfNfse></Nfse></CompNfse>' for n in range(1, 6))
+        + '</ListaNfse></ConsultarNfseServicoPrestadoResposta>'
+    )
+    duplo = inner.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    ns = {'ns': cap.ABRASF_NS}
+    # Escape simples, escape duplo e CDATA (este último pelo parser do envelope)
+    for conteudo in (duplo, duplo.replace('&', '&amp;'), f'<![CDATA[{inner}]]>'):
+        resposta = f'<Envelope><Body><outputXML>{conteudo}</outputXML></Body></Envelope>'
+        notas = [(n.findtext('.//ns:Numero', namespaces=ns), n.findtext('.//ns:Discriminacao', namespaces=ns))
+                 for n in cap.extrair_nfse_nodes(resposta)]
+        assert notas == [(str(n), 'A & B') for n in range(1, 6)]
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import competencias, portal_livros_taubate as livros
+
+
+def test_expande_itens_intervalos_e_formatos():
+    assert competencias.expandir_competencias("2024-09") == ["2024-09"]
+    assert competencias.expandir_competencias("2024-11..2025-02") == ["2024-11", "2024-12", "2025-01", "2025-02"]
+    assert competencias.expandir_competencias("03/2024, 2024-1;2024-03") == ["2024-01", "2024-03"]
+    assert competencias.expandir_competencias(["2024-02", "2024-01..2024-02"]) == ["2024-01", "2024-02"]
+    assert competencias.de_formulario("2024-01", "2024-03") == "2024-01..2024-03"
+    assert competencias.de_formulario("2024-01", "") == "2024-01"
+    for invalida in ("2024-13", "2024-05..2024-01", "", "setembro"):
+        with pytest.raises(ValueError):
+            competencias.expandir_competencias(invalida)
+
+
+def test_livros_acessam_a_empresa_uma_vez_por_cliente(tmp_path, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(livros, 'acessar_empresa_via_link', lambda page, cnpj, ccm, base: chamadas.append("empresa"))
+    monkeypatch.setattr(livros, 'ir_para_movimento', lambda page: None)
+    monkeypatch.setattr(livros, 'selecionar_competencia', lambda page, comp: chamadas.append(comp))
+    monkeypatch.setattr(livros, 'encerrar_escrituracao', lambda page, comp: None)
+
+    def _baixar(page, tipo, comp, *args, **kwargs):
+        if comp == "2024-02":
+            raise RuntimeError("portal fora do ar")
+    monkeypatch.setattr(livros, 'baixar_livro_mensal_pdf', _baixar)
+
+    cliente = {"id": "7", "cnpj": "1", "ccm": "2"}
+    with pytest.raises(Exception, match="2024-02: portal fora do ar"):
+        livros._processar_cliente(None, "base", cliente, ["2024-01", "2024-02", "2024-03"], tmp_path)
+    assert chamadas == ["empresa", "2024-01", "2024-02", "2024-03"]
@@ -0,0 +1,28 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import controle_hosts
+
+
+def test_governador_aimd_reage_a_erros_e_respostas_boas():
+    controle_hosts.configurar(max_por_host=2, taxa_inicial=2.0, taxa_min=0.5, taxa_max=4.0, latencia_alvo_s=1.0)
+    gov = controle_hosts.governador("https://portal.exemplo/ws")
+
+    gov.registrar(0.1, status=200)
+    assert gov.taxa > 2.0
+
+    taxa_antes = gov.taxa
+    gov.registrar(0.1, status=503)
+    assert gov.taxa == taxa_antes * controle_hosts.FATOR_REDUCAO
+    # Um segundo erro na mesma rajada não derruba a taxa de novo
+    gov.registrar(0.1, status=429)
+    assert gov.taxa == taxa_antes * controle_hosts.FATOR_REDUCAO
+
+    with controle_hosts.slot("https://portal.exemplo/outra") as medicao:
+        medicao.resposta(200)
+    assert controle_hosts.governador("https://PORTAL.exemplo/x") is gov
+    assert gov.requisicoes == 1
@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+import robo_core
+from modulos import captador_SJC_login_patch, controle_hosts, downloader_pdf
+
+
+CLIENTES = [
+    {"id": "T1", "municipio": "Taubaté"},
+    {"id": "S1", "municipio": "São José dos Campos"},
+    {"id": "L1", "municipio": ""},
+    {"id": "S2", "municipio": "sao jose dos campos"},
+]
+
+
+def test_agrupa_por_modelo_e_sem_municipio_vai_para_taubate():
+    grupos = robo_core.agrupar_por_modelo(CLIENTES + [{"id": "C1", "municipio": "Curitiba"}])
+    assert {m: [c["id"] for c in lista] for m, lista in grupos.items()} == {
+        "taubate": ["T1", "L1"], "sjc": ["S1", "S2"], "generic": ["C1"]}
+
+
+def test_grupos_rodam_ao_mesmo_tempo_e_status_e_mesclado(monkeypatch):
+    barreira = threading.Barrier(2, timeout=5)
+    recebidos = {}
+
+    def _taubate(clientes, config_geral, competencia, data_inicio, data_fim, pasta, headful, status_obj):
+        recebidos["taubate"] = [c["id"] for c in clientes]
+        barreira.wait()          # só passa se o grupo de SJC estiver rodando junto
+        robo_core._update_status(status_obj, 100, "Rotina completa finalizada com sucesso!", is_done=True)
+
+    def _sjc(clientes, config_geral, competencia, headful, status_obj):
+        recebidos["sjc"] = [(c["id"], c["sjc_usuario"]) for c in clientes]
+        barreira.wait()
+        status_obj["sjc"] = {"S1": {"estado": "concluido"}, "S2": {"estado": "erro", "erro": "timeout"}}
+
+    monkeypatch.setattr(robo_core, "_rotina_completa_taubate", _taubate)
+    monkeypatch.setattr(captador_SJC_login_patch, "executar_captura_sjc", _sjc)
+
+    status = {}
+    config = {"sjc_usuario": "escritorio", "sjc_senha": "x", "despacho_municipios_paralelo": True}
+    robo_core.run_full_routine(CLIENTES, config, "2025-01", "01/01/2025", "31/01/2025", "", False, status_obj=status)
+
+    assert recebidos == {"taubate": ["T1", "L1"], "sjc": [("S1", "escritorio"), ("S2", "escritorio")]}
+    assert status["is_done"] and status["has_error"] and status["progress"] == 100
+    assert not status["grupos"]["taubate"]["has_error"]
+    assert status["grupos"]["sjc"]["has_error"] and "S2" in status["grupos"]["sjc"]["message"]
+    assert status["message"].startswith("Taubaté: Rotina completa finalizada") and "São José dos Campos:" in status["message"]
+
+
+def test_municipio_sem_rotina_fica_como_erro_sem_parar_os_demais(monkeypatch):
+    chamados = []
+    monkeypatch.setattr(robo_core, "_captura_nf_taubate",
+                        lambda clientes, *a, **kw: chamados.extend(c["id"] for c in clientes))
+
+    status = {}
+    robo_core.run_captura_nf_both(CLIENTES, {"despacho_municipios_paralelo": False}, "01/01/2025", "31/01/2025", "", status_obj=status)
+
+    assert chamados == ["T1", "L1"]
+    assert status["grupos"]["sjc"]["has_error"] and not status["grupos"]["taubate"]["has_error"]
+    assert status["is_done"] and status["has_error"]
+
+
+def test_governador_configurado_uma_vez_antes_dos_grupos(monkeypatch):
+    eventos = []
+    monkeypatch.setattr(controle_hosts, "configurar", lambda **kw: eventos.append("governador"))
+    monkeypatch.setattr(downloader_pdf, "configurar", lambda *a: eventos.append("downloader"))
+    monkeypatch.setattr(robo_core.portal_livros_taubate, "executar_baixa_livros",
+                        lambda clientes, *a, **kw: eventos.append("livros"))
+    monkeypatch.setattr(robo_core, "_captura_nf_taubate", lambda clientes, *a, **kw: eventos.append("notas"))
+    monkeypatch.setattr(robo_core, "time", SimpleNamespace(sleep=lambda s: None, monotonic=time.monotonic))
+    monkeypatch.setattr(captador_SJC_login_patch, "executar_captura_sjc", lambda *a, **kw: eventos.append("sjc"))
+
+    config = {"sjc_usuario": "escritorio", "sjc_senha": "x", "despacho_municipios_paralelo": False}
+    robo_core.run_full_routine(CLIENTES, config, "2025-01", "01/01/2025", "31/01/2025", "", False, status_obj={})
+
+    assert eventos[:2] == ["governador", "downloader"]
+    assert eventos.count("governador") == 1 and eventos.count("downloader") == 1
+    assert sorted(eventos[2:]) == ["livros", "notas", "sjc"]
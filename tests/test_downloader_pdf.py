@@ -0,0 +1,81 @@
+import os
+import sys
+import threading
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+import requests
+from modulos import controle_hosts, downloader_pdf
+
+
+class _Servidor:
+    def __init__(self):
+        self.requisicoes = {}
+        servidor = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def log_message(self, *a): pass
+
+            def do_GET(self):
+                servidor.requisicoes[self.path] = servidor.requisicoes.get(self.path, 0) + 1
+                if self.path == "/503":
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                elif self.path == "/truncado":
+                    # Anuncia 1000 bytes e fecha a conexão depois de 10
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/pdf")
+                    self.send_header("Content-Length", "1000")
+                    self.end_headers()
+                    self.wfile.write(b"%PDF-1.4\n\n")
+                    self.close_connection = True
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.http.server_address[1]}"
+
+
+@pytest.fixture
+def servidor():
+    s = _Servidor()
+    yield s
+    s.http.shutdown()
+    s.http.server_close()
+
+
+def test_cada_falha_e_repetida_numa_camada_so_e_a_espera_libera_o_semaforo(servidor, tmp_path, monkeypatch):
+    controle_hosts.configurar(taxa_inicial=1000.0, taxa_max=1000.0)
+    dl = downloader_pdf.DownloaderPDF(max_concorrencia=1, tentativas=3, backoff_s=0)
+    livre_na_espera = []
+
+    def _dormir(_s):
+        livre = dl._semaforo.acquire(blocking=False)
+        livre_na_espera.append(livre)
+        if livre:
+            dl._semaforo.release()
+    monkeypatch.setattr(downloader_pdf, "time", SimpleNamespace(sleep=_dormir))
+
+    # Corpo truncado: só o laço de baixar() repete
+    with pytest.raises(requests.exceptions.RequestException):
+        dl.baixar(f"{servidor.url}/truncado", tmp_path / "a.pdf")
+    assert servidor.requisicoes["/truncado"] == 3
+    assert livre_na_espera == [True, True]
+    assert not list(tmp_path.iterdir())
+
+    # 5xx: também só o laço de baixar() repete, e cada 503 chega ao governador
+    status = []
+    resposta_original = controle_hosts.Medicao.resposta
+    monkeypatch.setattr(controle_hosts.Medicao, "resposta",
+                        lambda self, st, headers=None: (status.append(st), resposta_original(self, st, headers))[1])
+    with pytest.raises(requests.exceptions.HTTPError):
+        dl.baixar(f"{servidor.url}/503", tmp_path / "b.pdf")
+    assert servidor.requisicoes["/503"] == 3
+    assert status == [503, 503, 503]
+    assert livre_na_espera == [True] * 4
@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import fila_trabalho
+
+
+def test_fila_distribui_itens_e_sobrevive_a_worker_que_nao_abre():
+    threads_por_recurso = {}
+    lock = threading.Lock()
+
+    @contextmanager
+    def abrir(indice):
+        if indice == 1:
+            raise RuntimeError("login recusado")
+        yield indice
+
+    def processar(recurso, item):
+        with lock:
+            # O recurso é sempre usado pela thread que o abriu
+            threads_por_recurso.setdefault(recurso, set()).add(threading.get_ident())
+        if item == 7:
+            raise ValueError("cliente com problema")
+
+    resultado = fila_trabalho.executar(list(range(20)), 3, abrir, processar, nome="teste")
+
+    assert sorted(resultado.concluidos) == [i for i in range(20) if i != 7]
+    assert resultado.falhas == [7]
+    assert resultado.pendentes == []
+    assert resultado.erros_workers == ["login recusado"]
+    assert all(len(ts) == 1 for ts in threads_por_recurso.values())
+
+
+def test_fila_devolve_pendentes_quando_nenhum_worker_abre():
+    @contextmanager
+    def abrir(indice):
+        raise RuntimeError("portal fora do ar")
+        yield
+
+    resultado = fila_trabalho.executar(["a", "b"], 2, abrir, lambda r, i: None)
+    assert sorted(resultado.pendentes) == ["a", "b"]
+    assert len(resultado.erros_workers) == 2
+
+
+def test_worker_renova_o_recurso_entre_itens_quando_pedido():
+    abertos, fechados = [], []
+    atendidos = {"n": 0}
+
+    @contextmanager
+    def abrir(indice):
+        recurso = len(abertos)
+        abertos.append(recurso)
+        try:
+            yield recurso
+        finally:
+            fechados.append(recurso)
+
+    def processar(recurso, item):
+        atendidos["n"] += 1
+
+    envolvidos = []
+    resultado = fila_trabalho.executar(list(range(5)), 1, abrir, processar,
+                                       envolver_worker=lambda corpo: envolvidos.append(1) or corpo(),
+                                       renovar_recurso=lambda: atendidos["n"] % 2 == 0)
+
+    assert sorted(resultado.concluidos) == list(range(5))
+    assert abertos == fechados == [0, 1, 2]     # renovado depois do 2º e do 4º item
+    assert len(envolvidos) == 3
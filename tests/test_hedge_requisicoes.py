@@ -0,0 +1,77 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+import requests
+from modulos import hedge_requisicoes
+
+
+def test_original_roda_na_thread_chamadora_e_fila_nao_conta_na_latencia():
+    threads = []
+
+    def _funcao(tentativa):
+        threads.append(threading.get_ident())
+        time.sleep(0.3)          # espera pela vaga do governador
+        tentativa.iniciar()
+        return "ok"
+
+    assert hedge_requisicoes.executar("teste_fila", _funcao) == "ok"
+    rastreador, _ = hedge_requisicoes._estado("teste_fila")
+    assert threads == [threading.get_ident()]
+    assert rastreador.percentil(50) < 0.2
+
+
+def test_copia_vence_e_interrompe_a_original():
+    chamadas = []
+
+    class _Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a): pass
+
+        def do_GET(self):
+            chamadas.append(self.path)
+            if len(chamadas) == 1:
+                time.sleep(5)    # a primeira fica presa na cauda lenta
+            corpo = f"resposta {len(chamadas)}".encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+            except OSError:
+                pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/pagina"
+    sessao = requests.Session()
+    hedge_requisicoes.preparar_sessao(sessao)
+    rastreador, orcamento = hedge_requisicoes._estado("teste_copia")
+    for _ in range(hedge_requisicoes.MINIMO_AMOSTRAS):
+        rastreador.registrar(0.01)
+
+    def _funcao(tentativa):
+        tentativa.iniciar()
+        try:
+            return sessao.get(url, timeout=30).text
+        except requests.exceptions.RequestException:
+            if tentativa.cancelada:
+                raise hedge_requisicoes.Cancelada() from None
+            raise
+
+    try:
+        inicio = time.monotonic()
+        resultado = hedge_requisicoes.executar("teste_copia", _funcao, fracao_orcamento=1.0)
+        decorrido = time.monotonic() - inicio
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+    assert resultado == "resposta 2"
+    assert decorrido < 3
+    assert orcamento.copias == 1 and orcamento.vitorias_copia == 1
@@ -0,0 +1,86 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import captador_SJC_login_patch as sjc
+from modulos import sessoes_portal
+
+
+class _Loc:
+    def __init__(self, itens):
+        self.itens = itens
+
+    def count(self):
+        return len(self.itens)
+
+    @property
+    def first(self):
+        return self.itens[0]
+
+
+class _Linha:
+    def __init__(self, texto):
+        self.texto = texto
+
+    def inner_text(self):
+        return self.texto
+
+    def locator(self, css):
+        return _Loc([self])
+
+    def count(self):
+        return 1
+
+
+class _Grid:
+    """Grid do PrimeFaces com 1000 linhas já visíveis."""
+    def __init__(self, cnpjs):
+        self.cnpjs = cnpjs
+        self.varreduras = 0
+
+    def evaluate(self, js):
+        self.varreduras += 1
+        return [[str(i), c] for i, c in enumerate(self.cnpjs)]
+
+    def locator(self, css):
+        if css == ":scope > tr[data-ri]":
+            return _Loc(self.cnpjs)
+        ri = int(css.split("'")[1])
+        return _Loc([_Linha(f"Empresa {self.cnpjs[ri]}")] if ri < len(self.cnpjs) else [])
+
+
+class _Pagina:
+    def wait_for_url(self, *a, **k):
+        pass
+
+
+def test_indice_le_o_grid_uma_vez_e_persiste(tmp_path, monkeypatch):
+    monkeypatch.setattr(sessoes_portal, 'SESSOES_DIR', str(tmp_path))
+    monkeypatch.setattr(sessoes_portal, 'ITERACOES_PBKDF2', 1000)
+    monkeypatch.setenv('ROBO_CHAVE_SESSOES', 'chave-de-teste')
+
+    grid = _Grid(["11111111000111", "22222222000122"])
+    selecionadas = []
+    monkeypatch.setattr(sjc, '_resolver_grid_empresas', lambda pagina: (grid, None))
+    monkeypatch.setattr(sjc, '_definir_rpp_1000', lambda pagina: None)
+    monkeypatch.setattr(sjc, '_esperar_overlay_sumir', lambda *a: None)
+    monkeypatch.setattr(sjc, '_esperar_ajax_quieto', lambda *a: None)
+    monkeypatch.setattr(sjc, '_safe_click', lambda pagina, loc, desc: selecionadas.append(loc.texto))
+    monkeypatch.setattr(sjc.controle_hosts, 'navegar', lambda *a, **k: None)
+
+    indice = sjc.IndiceEmpresas("usuario", 60)
+    sjc.selecionar_empresa(_Pagina(), "22.222.222/0001-22", indice)
+    sjc.selecionar_empresa(_Pagina(), "11.111.111/0001-11", indice)
+    assert grid.varreduras == 1
+    assert selecionadas == ["Empresa 22222222000122", "Empresa 11111111000111"]
+
+    # Nova execução: índice vem do disco; grid mudou de ordem -> relê uma vez
+    grid.cnpjs.reverse()
+    outro = sjc.IndiceEmpresas("usuario", 60)
+    assert outro.linha("22222222000122") == 1
+    sjc.selecionar_empresa(_Pagina(), "22222222000122", outro)
+    assert grid.varreduras == 2 and outro.linha("22222222000122") == 0
+    assert selecionadas[-1] == "Empresa 22222222000122"
@@ -0,0 +1,47 @@
+import os
+import sys
+from datetime import date
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import indice_notas
+
+
+def test_indice_registra_notas_e_marca_dagua(tmp_path, monkeypatch):
+    monkeypatch.setattr(indice_notas, 'DB_PATH', str(tmp_path / 'indice.db'))
+
+    indice_notas.registrar_nota('10', 'tomadas', 'p1', '123', '2025-01-05T10:00:00', 'h1', 'a.xml')
+    indice_notas.registrar_pdf('10', 'tomadas', 'p1', '123', '2025-01-05T10:00:00', 'a.pdf')
+    notas = indice_notas.carregar_notas('10', 'tomadas', 'p1')
+    assert notas[('123', '2025-01-05T10:00:00')]['caminho_pdf'] == 'a.pdf'
+
+    # XML com conteúdo diferente invalida o PDF registrado
+    indice_notas.registrar_nota('10', 'tomadas', 'p1', '123', '2025-01-05T10:00:00', 'h2', 'a.xml')
+    assert indice_notas.carregar_notas('10', 'tomadas', 'p1')[('123', '2025-01-05T10:00:00')]['caminho_pdf'] is None
+
+    assert indice_notas.obter_marca('10', 'tomadas', 'p1') is None
+    indice_notas.avancar_marca('10', 'tomadas', 'p1', date(2025, 1, 1), date(2025, 1, 31))
+    indice_notas.avancar_marca('10', 'tomadas', 'p1', date(2025, 2, 1), date(2025, 2, 28))
+    assert indice_notas.obter_marca('10', 'tomadas', 'p1') == (date(2025, 1, 1), date(2025, 2, 28))
+
+    # Um período antigo e desconectado não faz a marca recuar
+    indice_notas.avancar_marca('10', 'tomadas', 'p1', date(2024, 6, 1), date(2024, 6, 30))
+    assert indice_notas.obter_marca('10', 'tomadas', 'p1') == (date(2025, 1, 1), date(2025, 2, 28))
+
+
+def test_marca_e_notas_valem_so_para_a_pasta_e_arquivos_presentes(tmp_path, monkeypatch):
+    monkeypatch.setattr(indice_notas, 'DB_PATH', str(tmp_path / 'indice.db'))
+    xml = tmp_path / 'NF_1.xml'
+    xml.write_bytes(b'<x/>')
+    indice_notas.registrar_nota('10', 'tomadas', 'p1', '1', '2025-01-31T23:00:00', 'h', str(xml))
+    indice_notas.avancar_marca('10', 'tomadas', 'p1', date(2025, 1, 1), date(2025, 1, 31))
+
+    assert indice_notas.obter_marca('10', 'tomadas', 'outra') is None
+    assert indice_notas.carregar_notas('10', 'tomadas', 'outra') == {}
+    assert indice_notas.contar_xml_ausentes('10', 'tomadas', 'p1', date(2025, 1, 1), date(2025, 1, 31)) == 0
+    xml.unlink()
+    assert indice_notas.contar_xml_ausentes('10', 'tomadas', 'p1', date(2025, 1, 1), date(2025, 1, 31)) == 1
+    assert indice_notas.contar_xml_ausentes('10', 'tomadas', 'p1', date(2025, 1, 1), date(2025, 1, 30)) == 0
+
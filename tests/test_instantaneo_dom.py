@@ -0,0 +1,53 @@
+import os
+import sys
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import instantaneo_dom
+from modulos import captador_SJC_login_patch as sjc
+
+
+def _bruto(ref, id_=None, visivel=True, marcado=False, texto="", relativos=None, **atributos):
+    return {"ref": ref, "tag": "div", "visivel": visivel, "marcado": marcado, "texto": texto,
+            "atributos": dict(id=id_, **atributos), "relativos": relativos or {}}
+
+
+class _PaginaFalsa:
+    def __init__(self, resposta):
+        self.resposta = resposta
+        self.evaluates = []
+
+    def evaluate(self, script, consultas):
+        self.evaluates.append(consultas)
+        return {nome: self.resposta.get(nome, []) for nome in consultas}
+
+    def locator(self, seletor):
+        return SimpleNamespace(first=seletor)
+
+
+def test_um_evaluate_por_lote_e_locator_estavel():
+    pagina = _PaginaFalsa({"botoes": [_bruto("1", visivel=False), _bruto("2", id_="form:btn")]})
+    achados = instantaneo_dom.capturar(pagina, {
+        "botoes": instantaneo_dom.consulta(css="button", texto=True),
+        "links": instantaneo_dom.consulta(xpath="//a"),
+    })
+    assert len(pagina.evaluates) == 1
+    assert pagina.evaluates[0]["botoes"]["atributos"] == ["id"]
+    assert achados["links"] == []
+    assert instantaneo_dom.primeiro(achados, "links", "botoes").locator(pagina) == "[data-robo-ref='1']"
+    assert instantaneo_dom.primeiro(achados, "links", "botoes", visivel=True).locator(pagina) == "[id='form:btn']"
+
+
+def test_checkbox_do_rotulo_resolvido_numa_consulta():
+    rotulo = _bruto("7", relativos={
+        "oculto": _bruto("8", id_="j_idt92:sit:1", marcado=True),
+        "caixa_td": _bruto("9"),
+        "td_input": None,
+    }, **{"for": "j_idt92:sit:1"})
+    pagina = _PaginaFalsa({"span": [rotulo]})
+    clicavel, oculto, marcado = sjc._find_checkbox_elements(pagina, "Cancelada")
+    assert len(pagina.evaluates) == 1
+    assert (clicavel, oculto, marcado) == ("[data-robo-ref='9']", "[id='j_idt92:sit:1']", True)
@@ -0,0 +1,127 @@
+import os
+import sys
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import controle_hosts, portal_livros_taubate as livros
+
+BASE = "https://taubateiss.meumunicipio.digital/taubateiss/contador"
+CGI = "https://taubateiss.meumunicipio.digital/taubateiss/cgi-local/contribuinte"
+
+
+class _PortalFalso(BaseAdapter):
+    """Responde as páginas do portal do contador com HTML mínimo e registra as chamadas."""
+    def __init__(self, botao='<input type="submit" name="acao" value="Encerrar">', aceita_encerramento=True):
+        super().__init__()
+        self.chamadas = []
+        self.encerrados = set()
+        self.botao = botao
+        self.aceita_encerramento = aceita_encerramento
+
+    def _pagina(self, metodo, url, corpo):
+        partes = urlsplit(url)
+        caminho = partes.path
+        if caminho.endswith("/main.php"):
+            return ('<html><frameset><frame id="main" src="inicio.php"></frameset>'
+                    '<table><tr><td class="menu" onclick="parent.main.location=\'movimento.php\'">'
+                    'Movimento (Contribuinte)</td></tr></table></html>')
+        if caminho.endswith("/inicio.php"):
+            return "<html><body>Bem-vindo</body></html>"
+        if caminho.endswith("/movimento.php") and metodo == "GET":
+            return ('<html><body><form method="post" action="movimento.php">'
+                    '<select name="mes"><option value="1">Janeiro</option><option value="2">Fevereiro</option></select>'
+                    '<input name="ano" value=""><button name="btnOk" value="ok">OK</button></form></body></html>')
+        if caminho.endswith("/movimento.php"):
+            dados = parse_qs(corpo)
+            assert dados["mes"] == ["2"] and dados["ano"] == ["2025"] and dados["btnOk"] == ["ok"]
+            quadros = "".join(
+                f'<table id="tableEncerra_{t}"><tr><td><a href="encerra.php?t={t}">'
+                f'{"Escrituração encerrada" if t in self.encerrados else "Encerrar Escrituração"}</a></td></tr></table>'
+                for t in "pt")
+            return f"<html><body>Serviços Prestados {quadros}</body></html>"
+        if caminho.endswith("/encerra.php") and metodo == "GET":
+            t = parse_qs(partes.query)["t"][0]
+            return (f'<html><body><form method="post" action="encerra.php?t={t}">'
+                    f'{self.botao}</form></body></html>')
+        if caminho.endswith("/encerra.php"):
+            if self.aceita_encerramento:
+                self.encerrados.add(parse_qs(partes.query)["t"][0])
+            return "<html><body>Encerrado</body></html>"
+        raise AssertionError(f"URL inesperada: {url}")
+
+    def send(self, request, **kwargs):
+        corpo = request.body.decode() if isinstance(request.body, bytes) else (request.body or "")
+        self.chamadas.append((request.method, request.url))
+        resp = requests.Response()
+        resp.url = request.url
+        resp.request = request
+        if "livro_fiscal_mensal" in request.url:
+            resp.status_code, resp._content = 200, b"%PDF-1.4 livro"
+            resp.headers["Content-Type"] = "application/pdf"
+        else:
+            resp.status_code = 200
+            resp._content = self._pagina(request.method, request.url, corpo).encode("utf-8")
+            resp.headers["Content-Type"] = "text/html; charset=utf-8"
+        return resp
+
+    def close(self):
+        pass
+
+
+def test_fluxo_http_encerra_e_baixa_os_livros_sem_navegador(tmp_path):
+    controle_hosts.configurar(taxa_inicial=1000.0, taxa_max=1000.0)
+    portal = _PortalFalso()
+    sessao = requests.Session()
+    sessao.mount("https://", portal)
+
+    cliente = {"id": "42", "cnpj": "12345678000195", "ccm": "999"}
+    livros._processar_cliente_http(sessao, BASE, cliente, ["2025-02"], tmp_path, {})
+
+    assert portal.encerrados == {"p", "t"}
+    assert ("POST", f"{BASE}/encerra.php?t=p") in portal.chamadas
+    pdfs = sorted((tmp_path / "LIVROS").iterdir())
+    assert ["PRESTADOS" in p.name for p in pdfs] == [True, False]
+    assert all(p.read_bytes().startswith(b"%PDF") for p in pdfs)
+
+
+@pytest.mark.parametrize("portal", [
+    _PortalFalso(botao='<input type="button" value="Encerrar" onclick="confirma(this.form)">'),
+    _PortalFalso(aceita_encerramento=False),
+], ids=["botao_javascript", "post_ignorado"])
+def test_encerramento_nao_confirmado_volta_para_o_navegador(tmp_path, portal):
+    controle_hosts.configurar(taxa_inicial=1000.0, taxa_max=1000.0)
+    sessao = requests.Session()
+    sessao.mount("https://", portal)
+
+    competencias = ["2025-02"]
+    with pytest.raises(livros.FluxoHTTPIndisponivel):
+        livros._processar_cliente_http(sessao, BASE, {"id": "42", "cnpj": "12345678000195", "ccm": "999"},
+                                       competencias, tmp_path, {})
+    assert competencias == ["2025-02"] and not portal.encerrados
+    assert not (tmp_path / "LIVROS").exists()
+
+
+def test_login_pausa_entre_tentativas_e_avisa_o_governador(monkeypatch):
+    pausas, erros = [], []
+    monkeypatch.setattr(livros, "time", SimpleNamespace(sleep=pausas.append))
+    monkeypatch.setattr(controle_hosts, "navegar", lambda pagina, url, **kw: None)
+    monkeypatch.setattr(controle_hosts, "aguardar", lambda url: 0.0)
+    monkeypatch.setattr(controle_hosts, "registrar", lambda url, **kw: erros.append(kw))
+
+    def _sem_formulario(timeout):
+        raise livros.PWTimeoutError("campo do CRC não apareceu")
+    pagina = SimpleNamespace(url=BASE + "/login.php",
+                             locator=lambda seletor: SimpleNamespace(wait_for=_sem_formulario))
+
+    with pytest.raises(livros.PWTimeoutError):
+        livros.login_contador(pagina, BASE + "/login.php", "crc", "senha")
+    assert pausas == [livros.PAUSA_LOGIN_ERRO_S] * 2
+    assert erros == [{"erro": True}] * 2
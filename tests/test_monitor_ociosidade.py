@@ -0,0 +1,50 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import monitor_ociosidade
+
+
+OCIOSA = {"ocioso": True, "ms": 12.0, "espera": {"ajax": 10.0}}
+
+
+class _PaginaFalsa:
+    def __init__(self, respostas):
+        self.respostas = list(respostas)
+        self.chamadas = []
+
+    def evaluate(self, script, arg=None):
+        self.chamadas.append("esperar" if arg is not None else "instalar")
+        if arg is None:
+            return None
+        resposta = self.respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    def wait_for_load_state(self, estado, timeout=None):
+        self.chamadas.append("carregar")
+
+
+def test_espera_instala_monitor_em_pagina_antiga():
+    pagina = _PaginaFalsa([None, OCIOSA])
+    assert monitor_ociosidade.esperar(pagina, 1000) == OCIOSA
+    assert pagina.chamadas == ["esperar", "instalar", "esperar"]
+
+
+def test_espera_sobrevive_a_navegacao():
+    pagina = _PaginaFalsa([Exception("Execution context was destroyed"), OCIOSA])
+    assert monitor_ociosidade.esperar(pagina, 1000) == OCIOSA
+    assert pagina.chamadas == ["esperar", "carregar", "esperar"]
+
+
+def test_latencia_por_clique_acumula_motivos():
+    monitor_ociosidade._latencias.clear()
+    monitor_ociosidade.registrar("Gerar", 300.0, {"ocioso": True, "espera": {"ajax": 250.0, "dom": 30.0}})
+    monitor_ociosidade.registrar("Gerar", 100.0, {"ocioso": False, "espera": {"ajax": 90.0}})
+    m = monitor_ociosidade.estatisticas()["Gerar"]
+    assert m["cliques"] == 2 and m["max_ms"] == 300.0 and m["sem_ocioso"] == 1
+    assert m["espera_ajax_ms"] == 340.0 and m["espera_dom_ms"] == 30.0
@@ -0,0 +1,58 @@
+import os
+import sys
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import perfil_enxuto, sessoes_portal
+
+
+def test_poda_cache_respeita_intervalo_e_preserva_estado(tmp_path):
+    perfil = tmp_path / "perfil"
+    (perfil / "Default" / "Cache" / "Cache_Data").mkdir(parents=True)
+    (perfil / "Default" / "Cache" / "Cache_Data" / "f_000001").write_bytes(b"x" * 1000)
+    (perfil / "Default" / "Code Cache" / "js").mkdir(parents=True)
+    (perfil / "Default" / "Local Storage").mkdir(parents=True)
+    (perfil / "Default" / "Cookies").write_bytes(b"cookies")
+
+    assert perfil_enxuto.podar_cache(perfil, 24) == 1000
+    assert not (perfil / "Default" / "Cache").exists() and not (perfil / "Default" / "Code Cache").exists()
+    assert (perfil / "Default" / "Local Storage").exists() and (perfil / "Default" / "Cookies").exists()
+
+    (perfil / "Default" / "Cache").mkdir()
+    assert perfil_enxuto.podar_cache(perfil, 24) == 0          # podado há pouco
+    assert (perfil / "Default" / "Cache").exists()
+
+
+def test_perfil_enxuto_semeia_do_snapshot_e_regrava(tmp_path, monkeypatch):
+    monkeypatch.setattr(sessoes_portal, 'SESSOES_DIR', str(tmp_path / 'sessoes'))
+    monkeypatch.setattr(sessoes_portal, 'ITERACOES_PBKDF2', 1000)
+    monkeypatch.setenv('ROBO_CHAVE_SESSOES', 'chave-de-teste')
+
+    estado = {"cookies": [{"name": "JSESSIONID", "value": "1", "domain": "portal", "path": "/"}],
+              "origins": [{"origin": "https://portal", "localStorage": [{"name": "tema", "value": "claro"}]}]}
+    sessoes_portal.salvar("perfil_sjc", str(tmp_path / "perfil"), estado)
+
+    pastas = []
+
+    class _Contexto:
+        def __init__(self, pasta):
+            pastas.append(pasta)
+            self.cookies, self.scripts = [], []
+        def add_cookies(self, cookies): self.cookies.extend(cookies)
+        def add_init_script(self, script): self.scripts.append(script)
+        def storage_state(self): return {"cookies": self.cookies + [{"name": "novo", "value": "2", "domain": "portal", "path": "/"}], "origins": []}
+        def close(self): pass
+
+    playwright = SimpleNamespace(chromium=SimpleNamespace(launch_persistent_context=lambda pasta, **kw: _Contexto(pasta)))
+    config = {"perfil_enxuto": True, "perfil_podar_cache_horas": 0}
+    with perfil_enxuto.contexto_persistente(playwright, tmp_path / "perfil", "sjc", config, headless=True) as ctx:
+        assert ctx.cookies == estado["cookies"]
+        assert '"tema", "claro"' in ctx.scripts[0]
+        assert os.path.isdir(pastas[0]) and pastas[0] != str(tmp_path / "perfil")
+
+    assert not os.path.exists(pastas[0])
+    regravado = sessoes_portal.carregar("perfil_sjc", str(tmp_path / "perfil"))
+    assert [c["name"] for c in regravado["cookies"]] == ["JSESSIONID", "novo"]
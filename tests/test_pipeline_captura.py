@@ -0,0 +1,32 @@
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos.pipeline_captura import Pipeline
+
+
+def test_estatisticas_guardam_a_fila_observada_e_a_vazao_da_fonte():
+    def fonte(emitir):
+        for i in range(20):
+            time.sleep(0.005)
+            emitir(i)
+
+    def lento(item):
+        time.sleep(0.02)
+        return [item]
+
+    pipeline = Pipeline("teste").adicionar_estagio("lento", lento, workers=1, tamanho_fila=5)
+    pipeline.adicionar_estagio("rapido", lambda item: None, workers=2)
+    pipeline.executar(fonte)
+
+    fonte_, lento_, rapido = pipeline.estatisticas()
+    assert fonte_["estagio"] == "fonte" and fonte_["processados"] == 20
+    assert fonte_["itens_por_s"] > 0 and 0 < fonte_["ocupacao"] < 1
+    # A fila do estágio lento encheu durante a execução, mesmo vazia no fim
+    assert lento_["fila_max"] == 5 and lento_["fila_media"] > 1
+    assert rapido["fila_max"] <= 1
+    assert pipeline.gargalo() == "lento"
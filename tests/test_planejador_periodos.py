@@ -0,0 +1,28 @@
+import os
+import sys
+from datetime import date, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos.planejador_periodos import PlanejadorPeriodos
+
+
+def test_janelas_cobrem_o_periodo_e_se_adaptam_a_densidade():
+    planejador = PlanejadorPeriodos(date(2024, 1, 1), date(2024, 12, 31), janela_inicial_dias=31, notas_por_janela=100)
+
+    primeira = planejador.proxima_janela()
+    assert primeira == (date(2024, 1, 1), date(2024, 1, 31))
+    # 20 notas por dia -> próximas janelas de 5 dias
+    planejador.registrar(primeira, 620)
+    segunda = planejador.proxima_janela()
+    assert segunda == (date(2024, 2, 1), date(2024, 2, 5))
+
+    janelas = [primeira, segunda]
+    while (janela := planejador.proxima_janela()) is not None:
+        janelas.append(janela)
+    # Janelas consecutivas, sem lacunas nem sobreposição
+    for anterior, atual in zip(janelas, janelas[1:]):
+        assert atual[0] == anterior[1] + timedelta(days=1)
+    assert janelas[-1][1] == date(2024, 12, 31)
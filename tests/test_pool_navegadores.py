@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+import playwright.sync_api
+from modulos import pool_navegadores
+
+
+class _BrowserFalso:
+    lancados = 0
+
+    def __init__(self):
+        _BrowserFalso.lancados += 1
+        self.conectado = True
+        self.version = "1.0"
+        self.contexts = []
+        self.thread = threading.get_ident()
+
+    def is_connected(self):
+        return self.conectado
+
+    def new_context(self, **opcoes):
+        assert threading.get_ident() == self.thread
+        ctx = SimpleNamespace(opcoes=opcoes, close=lambda: None)
+        self.contexts.append(ctx)
+        return ctx
+
+    def close(self):
+        self.conectado = False
+
+
+@contextmanager
+def _sync_playwright_falso():
+    yield SimpleNamespace(chromium=SimpleNamespace(launch=lambda **kw: _BrowserFalso()))
+
+
+def test_pool_roda_tarefas_na_thread_do_navegador_e_recicla(tmp_path, monkeypatch):
+    monkeypatch.setattr(playwright.sync_api, 'sync_playwright', _sync_playwright_falso)
+    monkeypatch.setattr(pool_navegadores, 'POOL_DIR', str(tmp_path))
+    _BrowserFalso.lancados = 0
+
+    pool = pool_navegadores.PoolNavegadores(tamanho=1, vida_max_s=3600, reciclar_apos_clientes=3)
+    pool.iniciar()
+    try:
+        def tarefa(nav):
+            assert pool_navegadores.atual() is nav
+            ctx = nav.novo_contexto(locale="pt-BR")
+            assert ctx.opcoes["accept_downloads"] is True
+            nav.registrar_clientes(2)
+            return nav.browser
+
+        primeiro = pool.executar(tarefa)
+        assert pool.executar(tarefa) is primeiro          # 2 clientes: ainda abaixo do limite
+        assert pool.executar(tarefa) is not primeiro      # 4 clientes: reciclado antes da terceira tarefa
+        assert pool_navegadores.atual() is None
+
+        primeiro_nav = []
+        pool.executar(lambda nav: primeiro_nav.append(nav) or setattr(nav.browser, 'conectado', False))
+        assert pool.executar(lambda nav: nav) is not primeiro_nav[0]   # navegador caído é substituído
+        assert pool.estatisticas()[0]["tarefas"] == 5
+    finally:
+        pool.encerrar()
+
+
+def test_fila_longa_devolve_o_navegador_para_reciclar_entre_clientes(tmp_path, monkeypatch):
+    from modulos import fila_trabalho
+    monkeypatch.setattr(playwright.sync_api, 'sync_playwright', _sync_playwright_falso)
+    monkeypatch.setattr(pool_navegadores, 'POOL_DIR', str(tmp_path))
+    _BrowserFalso.lancados = 0
+
+    pool = pool_navegadores.PoolNavegadores(tamanho=1, vida_max_s=3600, reciclar_apos_clientes=2)
+    pool.iniciar()
+    monkeypatch.setattr(pool_navegadores, '_pool', pool)
+    try:
+        navegadores = []
+
+        @contextmanager
+        def abrir(indice):
+            yield pool_navegadores.atual()
+
+        def processar(nav, item):
+            navegadores.append(nav.browser)
+            nav.registrar_clientes()
+
+        resultado = fila_trabalho.executar(list(range(5)), 1, abrir, processar,
+                                           envolver_worker=pool_navegadores.envolvedor(headless=True),
+                                           renovar_recurso=pool_navegadores.deve_renovar)
+        assert sorted(resultado.concluidos) == list(range(5))
+        # Uma única fila, mas no máximo 2 clientes por Chromium
+        assert [len([b for b in navegadores if b is n]) for n in dict.fromkeys(navegadores)] == [2, 2, 1]
+        assert _BrowserFalso.lancados == 3
+    finally:
+        pool.encerrar()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import sessoes_portal
+
+
+def test_sessao_cifrada_expira_e_depende_da_chave(tmp_path, monkeypatch):
+    monkeypatch.setattr(sessoes_portal, 'SESSOES_DIR', str(tmp_path / 'sessoes'))
+    monkeypatch.setattr(sessoes_portal, 'ITERACOES_PBKDF2', 1000)
+    monkeypatch.setenv('ROBO_CHAVE_SESSOES', 'chave-de-teste')
+
+    estado = {"cookies": [{"name": "PHPSESSID", "value": "abc123", "domain": "portal", "path": "/"}], "origins": []}
+    assert sessoes_portal.salvar('taubate_contador', '1SP123456', estado)
+
+    arquivo = sessoes_portal._caminho('taubate_contador', '1SP123456')
+    with open(arquivo, 'rb') as f:
+        conteudo = f.read()
+    assert b'abc123' not in conteudo and b'1SP123456' not in conteudo
+
+    assert sessoes_portal.carregar('taubate_contador', '1SP123456', ttl_min=60) == estado
+    assert sessoes_portal.carregar('taubate_contador', 'outro', ttl_min=60) is None
+
+    # Passado o TTL a sessão é descartada
+    agora = sessoes_portal.time.time()
+    monkeypatch.setattr(sessoes_portal.time, 'time', lambda: agora + 61 * 60)
+    assert sessoes_portal.carregar('taubate_contador', '1SP123456', ttl_min=60) is None
+    assert not os.path.exists(arquivo)
+
+    # Com outra chave mestre o arquivo não decifra
+    monkeypatch.setattr(sessoes_portal.time, 'time', lambda: agora)
+    sessoes_portal.salvar('sjc', 'usuario', estado)
+    monkeypatch.setenv('ROBO_CHAVE_SESSOES', 'outra-chave')
+    assert sessoes_portal.carregar('sjc', 'usuario') is None
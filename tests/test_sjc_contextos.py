@@ -0,0 +1,55 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import captador_SJC_login_patch as sjc
+
+
+def test_clientes_distribuidos_com_pasta_de_downloads_por_contexto(tmp_path, monkeypatch):
+    abertos = []
+
+    @contextmanager
+    def _contexto_falso(config_geral, headful, perfil_dir, downloads_dir):
+        abertos.append((perfil_dir, downloads_dir))
+        contexto = SimpleNamespace(new_page=lambda: SimpleNamespace(thread=threading.get_ident()),
+                                   add_init_script=lambda script: None)
+        yield contexto, downloads_dir
+
+    logins = []
+    processados = {}
+    barreira = threading.Barrier(2, timeout=5)
+
+    def _processar_falso(pagina, cli, config_geral, competencia, perfil_dir, pasta, indice=None):
+        assert pagina.thread == threading.get_ident()
+        if cli["id"] in ("A", "B"):
+            barreira.wait()           # os dois primeiros clientes rodam ao mesmo tempo
+        processados[cli["id"]] = pasta
+        if cli["id"] == "C":
+            raise RuntimeError("empresa não encontrada")
+
+    monkeypatch.setattr(sjc, '_contexto_sjc', _contexto_falso)
+    monkeypatch.setattr(sjc, '_processar_cliente_sjc', _processar_falso)
+    monkeypatch.setattr(sjc, 'login_sjc', lambda pagina, u, s: logins.append(u))
+    monkeypatch.setattr(sjc, '_limpar_sessao', lambda contexto: None)
+    monkeypatch.setattr(sjc.bloqueio_recursos, 'aplicar', lambda *a: None)
+    monkeypatch.setattr(sjc.controle_hosts, 'observar_pagina', lambda pagina: None)
+    monkeypatch.setattr(sjc.pool_navegadores, 'obter', lambda: None)
+
+    clientes = [{"id": i, "cnpj": "1", "sjc_usuario": "u", "sjc_senha": "s"} for i in "ABCD"]
+    config = {"sjc_contextos": "2", "sessoes_reutilizar": False, "sjc_indice_empresas": False,
+              "downloads_tmp_dir": str(tmp_path / "dl"), "perfil_sjc_dir": str(tmp_path / "sjc")}
+    status = {}
+    sjc.executar_captura_sjc(clientes, config, "2024-09", headful=False, status_obj=status)
+
+    assert len(logins) == 2
+    assert sorted(p.name for p, _ in abertos) == ["sjc", "sjc_1"]
+    assert {d for _, d in abertos} == {tmp_path / "dl", tmp_path / "dl" / "contexto_1"}
+    assert processados["A"] != processados["B"]
+    assert {k: v["estado"] for k, v in status["sjc"].items()} == \
+        {"A": "concluido", "B": "concluido", "C": "erro", "D": "concluido"}
@@ -0,0 +1,100 @@
+import io
+import os
+import sys
+from urllib.parse import parse_qs
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+from modulos import controle_hosts, captador_SJC_login_patch as sjc
+
+PAGINA = """<html><body><form id="j_idt92" name="j_idt92" method="post" action="/notafiscal/paginas/exportacaonota/exportacaoNota.jsf">
+<input type="hidden" name="j_idt92" value="j_idt92">
+<input name="j_idt92:j_idt96:idStart_input" value=""><input name="j_idt92:j_idt96:idEnd_input" value="">
+<input name="j_idt92:j_idt109:idStart_input" value="01/01/2024"><input name="j_idt92:j_idt109:idEnd_input" value="31/01/2024">
+<table id="j_idt92:sit"><tr>
+<td><input id="j_idt92:sit:0" name="j_idt92:sit" type="checkbox" value="A" checked><label for="j_idt92:sit:0">Ativa</label></td>
+<td><input id="j_idt92:sit:1" name="j_idt92:sit" type="checkbox" value="C"><label for="j_idt92:sit:1">Cancelada</label></td>
+<td><input id="j_idt92:sit:2" name="j_idt92:sit" type="checkbox" value="S" checked><label for="j_idt92:sit:2">Substituida</label></td>
+</tr></table>
+<input id="j_idt92:serv:0" name="j_idt92:serv" type="radio" value="E" checked><label for="j_idt92:serv:0">Emitidas</label>
+<input id="j_idt92:serv:1" name="j_idt92:serv" type="radio" value="R"><label for="j_idt92:serv:1">Recebidas</label>
+<button id="j_idt92:j_idt160" name="j_idt92:j_idt160" type="button"><span>Gerar Relação Notas</span></button>
+<div class="ui-dialog">Deseja Realmente Confirmar? <a id="j_idt92:j_idt173:btnDownload" href="#">Download</a></div>
+<input type="hidden" name="javax.faces.ViewState" value="vs-0">
+</form></body></html>"""
+
+
+class _PortalJSF(BaseAdapter):
+    def __init__(self, sem_notas=()):
+        super().__init__()
+        self.sem_notas = sem_notas
+        self.postbacks = []
+        self.viewstate = 0
+
+    def send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.url, resp.request, resp.status_code = request.url, request, 200
+        if request.method == "GET":
+            resp._content = PAGINA.encode("utf-8")
+            resp.headers["Content-Type"] = "text/html; charset=utf-8"
+            return resp
+        dados = parse_qs(request.body if isinstance(request.body, str) else request.body.decode(), keep_blank_values=True)
+        assert dados["javax.faces.ViewState"] == [f"vs-{self.viewstate}"]
+        assert dados["j_idt92:j_idt96:idStart_input"] == ["09/2024"] and dados["j_idt92:j_idt109:idStart_input"] == [""]
+        assert sorted(dados["j_idt92:sit"]) == ["A", "C"]
+        servico = dados["j_idt92:serv"][0]
+        self.postbacks.append((servico, "ajax" if "javax.faces.partial.ajax" in dados else "download"))
+        if "javax.faces.partial.ajax" in dados:
+            assert request.headers["Faces-Request"] == "partial/ajax"
+            self.viewstate += 1
+            aviso = "Nenhuma nota fiscal foi encontrada com o filtro informado" if servico in self.sem_notas else ""
+            resp._content = (f'<?xml version="1.0"?><partial-response><changes><update id="j_idt92:msgs"><![CDATA[{aviso}]]></update>'
+                             f'<update id="j_idt92:javax.faces.ViewState:0"><![CDATA[vs-{self.viewstate}]]></update>'
+                             '</changes></partial-response>').encode("utf-8")
+            resp.headers["Content-Type"] = "text/xml; charset=utf-8"
+        else:
+            assert dados["j_idt92:j_idt173:btnDownload"]
+            resp.raw = io.BytesIO(b"PK\x03\x04zip-" + servico.encode())
+            resp.headers["Content-Type"] = "application/octet-stream"
+            resp.headers["Content-Disposition"] = 'attachment; filename="notas.zip"'
+        return resp
+
+    def close(self):
+        pass
+
+
+def test_exporta_xml_por_postback_acompanhando_o_viewstate(tmp_path):
+    controle_hosts.configurar(taxa_inicial=1000.0, taxa_max=1000.0)
+    portal = _PortalJSF(sem_notas=("R",))
+    sessao = requests.Session()
+    sessao.mount("https://", portal)
+
+    servicos = ["Emitidas", "Recebidas"]
+    sjc.baixar_xmls_http(sessao, "2024-09", "77", tmp_path, servicos)
+
+    assert servicos == []
+    assert portal.postbacks == [("E", "ajax"), ("E", "download"), ("R", "ajax")]
+    assert (tmp_path / "77_XML_Emitidas_AtivaCancelada_09-2024.zip").read_bytes() == b"PK\x03\x04zip-E"
+    assert "Nenhuma nota" in (tmp_path / "77_XML_Recebidas_AtivaCancelada_09-2024_SEM_REGISTRO.txt").read_text(encoding="utf-8")
+    assert not list(tmp_path.glob(".*.parcial"))
+
+
+def test_pagina_sem_viewstate_volta_para_o_navegador(tmp_path):
+    class _Outra(_PortalJSF):
+        def send(self, request, **kwargs):
+            resp = super().send(request, **kwargs)
+            resp._content = b"<html><body><form></form></body></html>"
+            return resp
+
+    sessao = requests.Session()
+    sessao.mount("https://", _Outra())
+    servicos = ["Emitidas", "Recebidas"]
+    with pytest.raises(sjc.FluxoHTTPIndisponivel):
+        sjc.baixar_xmls_http(sessao, "2024-09", "77", tmp_path, servicos)
+    assert servicos == ["Emitidas", "Recebidas"]
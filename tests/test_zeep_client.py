@@ -0,0 +1,26 @@
+import os
+import ssl
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RP = os.path.join(ROOT, 'RoboFiscalIntegrado')
+sys.path.insert(0, RP)
+
+import requests
+from modulos import zeep_client, cache_certificados
+
+
+def test_transport_do_zeep_nao_altera_a_sessao_do_cache(monkeypatch):
+    compartilhada = requests.Session()
+    user_agent = compartilhada.headers['User-Agent']
+    contexto = ssl.create_default_context()
+    monkeypatch.setattr(cache_certificados, 'obter_sessao', lambda *a, **kw: compartilhada)
+    monkeypatch.setattr(cache_certificados, 'obter_ssl_context', lambda *a, **kw: contexto)
+    monkeypatch.setattr(zeep_client, 'Client', lambda wsdl, transport, settings: transport)
+
+    transport = zeep_client.make_zeep_client("servico.wsdl", "cert.pfx", "senha")
+
+    assert transport.session is not compartilhada
+    assert transport.session.get_adapter('https://x').ssl_context is contexto
+    assert compartilhada.headers['User-Agent'] == user_agent
+    assert 'file://' not in compartilhada.adapters